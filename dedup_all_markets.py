@@ -7,15 +7,18 @@
 """
 
 import os
+import sys
 import pandas as pd
 import numpy as np
 from dotenv import load_dotenv
-from supabase import create_client
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "scripts"))
+from supabase_clients import supabase_client
 
 load_dotenv()
 SUPABASE_URL = os.getenv('SUPABASE_URL')
 SUPABASE_KEY = os.getenv('SUPABASE_SERVICE_ROLE_KEY')
-supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
+supabase = supabase_client(SUPABASE_URL, SUPABASE_KEY)
 
 
 def fetch_all(table, date):
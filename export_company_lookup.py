@@ -5,11 +5,14 @@ Export company_list + latest share_a_market metrics to JSON for UI search.
 
 import json
 import os
+import sys
 from datetime import datetime
 
 import pandas as pd
 from dotenv import load_dotenv
-from supabase import create_client
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "scripts"))
+from supabase_clients import supabase_client
 
 
 def fetch_all_for_date(client, table, date_str, columns):
@@ -60,7 +63,7 @@ def main():
     if not url or not key:
         raise RuntimeError("SUPABASE_URL or SUPABASE_SERVICE_ROLE_KEY not set")
 
-    client = create_client(url, key)
+    client = supabase_client(url, key)
 
     # Latest download_date in share_a_market
     latest = (
@@ -5,12 +5,16 @@ Calculates market-level aggregates for all available dates.
 """
 
 import os
+import sys
 import json
 import pandas as pd
 import numpy as np
 import math
 from dotenv import load_dotenv
-from supabase import create_client, Client
+from supabase import Client
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "scripts"))
+from supabase_clients import supabase_client
 
 load_dotenv()
 SUPABASE_URL = os.getenv('SUPABASE_URL')
@@ -264,7 +268,7 @@ def calc_finance_industry_summary(df):
     return summary
 
 def main():
-    supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
+    supabase: Client = supabase_client(SUPABASE_URL, SUPABASE_KEY)
     
     # Time series data for overview
     time_series = {'us': {}, 'hk': {}, 'cn': {}}
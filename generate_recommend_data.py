@@ -10,12 +10,17 @@ Generates data for each available date with next-period market cap comparison.
 """
 
 import os
+import sys
 import json
 import pandas as pd
 import numpy as np
 import math
 from dotenv import load_dotenv
-from supabase import create_client, Client
+from supabase import Client
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "scripts"))
+from asof_lookup import AsOfResolver
+from supabase_clients import supabase_client
 
 load_dotenv()
 SUPABASE_URL = os.getenv('SUPABASE_URL')
@@ -187,7 +192,7 @@ def format_date_label(date_str):
     return f"{months[d.month-1]} {d.year}"
 
 def main():
-    supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
+    supabase: Client = supabase_client(SUPABASE_URL, SUPABASE_KEY)
     
     recommendations = {}
     
@@ -208,12 +213,8 @@ def main():
         dates = sorted(df['download_date'].unique())
         print(f"  📅 Available dates: {dates}")
         
-        # Build market cap lookup for each date
-        mkt_cap_by_date = {}
-        for date in dates:
-            df_date = df[df['download_date'] == date].copy()
-            df_date['market_capitalization'] = pd.to_numeric(df_date['market_capitalization'], errors='coerce')
-            mkt_cap_by_date[date] = dict(zip(df_date['symbol'], df_date['market_capitalization']))
+        # Market cap by (symbol, date); next-period lookups match the next date exactly
+        mkt_caps = AsOfResolver.from_frame(df, 'download_date', 'market_capitalization', key_col='symbol')
         
         # Process each date
         by_date = {}
@@ -223,21 +224,24 @@ def main():
             df_date = df[df['download_date'] == date].copy()
             df_date = calculate_metrics(df_date)
             
-            # Get next date's market cap for comparison
             next_date = dates[i + 1] if i + 1 < len(dates) else None
-            next_mkt_cap_map = mkt_cap_by_date.get(next_date, {}) if next_date else {}
             
             # Filter recommendations
             df_filtered, has_ema_data = filter_recommendations(df_date)
             ema_note = "" if has_ema_data else " (no EMA/SMA data)"
             print(f"    ✅ Found {len(df_filtered)} stocks meeting criteria{ema_note}")
             
+            # Get next date's market cap for comparison
+            if next_date:
+                next_mkt_caps = mkt_caps.values_at([next_date] * len(df_filtered), keys=df_filtered['symbol'],
+                                                   tolerance=pd.Timedelta(0))
+            else:
+                next_mkt_caps = np.full(len(df_filtered), np.nan)
+            
             # Build records
             stocks = []
-            for _, row in df_filtered.iterrows():
-                symbol = row['symbol']
-                next_mkt_cap = next_mkt_cap_map.get(symbol)
-                rec = build_recommendation_record(row, next_mkt_cap)
+            for (_, row), next_mkt_cap in zip(df_filtered.iterrows(), next_mkt_caps):
+                rec = build_recommendation_record(row, None if pd.isna(next_mkt_cap) else float(next_mkt_cap))
                 stocks.append(rec)
             
             # Get unique sectors and industries
@@ -6,12 +6,16 @@ import argparse
 import json
 import os
 import re
+import sys
 from typing import Dict, List, Tuple, Optional
 
 import numpy as np
 import pandas as pd
 from dotenv import load_dotenv
-from supabase import create_client
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "scripts"))
+from batch_uploader import upload_table
+from supabase_clients import supabase_client
 
 
 CSV_DEFAULTS = {
@@ -182,15 +186,10 @@ def clean_record(record: Dict) -> Dict:
 
 
 def batch_insert(supabase, table: str, records: List[Dict], batch_size: int = 500) -> int:
-    inserted = 0
-    for i in range(0, len(records), batch_size):
-        batch = [clean_record(r) for r in records[i:i + batch_size]]
-        res = supabase.table(table).insert(batch).execute()
-        if res.data is None:
-            raise RuntimeError(f"{table} 插入失败: {res}")
-        inserted += len(batch)
-        print(f"{table}: 已插入 {inserted}/{len(records)}")
-    return inserted
+    """自适应并发插入（多个批次同时在途，429/5xx 时只重试失败的批次），有失败批次时抛出异常"""
+    result = upload_table(supabase, table, [clean_record(r) for r in records], batch_size=batch_size)
+    print(f"{table}: 已插入 {result['uploaded']}/{len(records)}（{result['batches']} 批，重试 {result['retries']} 次）")
+    return result["uploaded"]
 
 
 def is_us_preferred(symbol: str) -> bool:
@@ -451,7 +450,7 @@ def main() -> None:
     if not url or not key:
         raise RuntimeError("缺少 SUPABASE_URL 或 SUPABASE_SERVICE_ROLE_KEY")
 
-    supabase = create_client(url, key)
+    supabase = supabase_client(url, key)
 
     markets = ["us", "hk", "cn"] if args.market == "all" else [args.market]
     temp_date = None
@@ -1,9 +1,13 @@
 import pandas as pd
-import httpx
 import os
+import sys
 from dotenv import load_dotenv
 import numpy as np
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "scripts"))
+from batch_uploader import upload_records
+from supabase_clients import http_client
+
 def import_data():
     # Load credentials
     load_dotenv(dotenv_path='.env')
@@ -31,9 +35,8 @@ def import_data():
     df['unit'] = 'bn'
     df['currency'] = 'cny'
 
-    # 3. Add 'id' column (8-digit padded sequential index)
-    df = df.reset_index()
-    df['id'] = (df['index'] + 1).apply(lambda x: str(x).zfill(8))
+    # 3. Add 'id' column ({symbol}_{date}, same as scripts/upload_stock_data.py)
+    df['id'] = df['symbol'] + '_' + df['date'].astype(str)
 
     # 4. Prepare columns for database (Note the case-sensitive "Market_cap")
     df = df.rename(columns={'mkt_cap_billion_cny': 'Market_cap'})
@@ -54,22 +57,18 @@ def import_data():
         "Prefer": "resolution=merge-duplicates"
     }
 
-    url = f"{SUPABASE_URL}/rest/v1/{table_name}"
-
-    success_count = 0
-    for i in range(0, len(records), batch_size):
-        batch = records[i:i + batch_size]
-        try:
-            response = httpx.post(url, json=batch, headers=headers, timeout=60.0)
-            if response.status_code in [200, 201]:
-                success_count += len(batch)
-                print(f"Successfully inserted batch {i//batch_size + 1}")
-            else:
-                print(f"Error in batch {i//batch_size + 1}: {response.status_code} - {response.text}")
-                break
-        except Exception as e:
-            print(f"Exception in batch {i//batch_size + 1}: {e}")
-            break
+    # Upsert on the natural key (symbol, date) so re-runs update existing rows
+    url = f"{SUPABASE_URL}/rest/v1/{table_name}?on_conflict=symbol,date"
+
+    def send(batch):
+        response = http_client().post(url, json=batch, headers=headers, timeout=60.0)
+        response.raise_for_status()
+
+    # Several batches in flight; batch size adapts to latency, 429/5xx retries only the failed batch
+    result = upload_records(send, records, table_name, batch_size=batch_size)
+    success_count = result["uploaded"]
+    for err in result["errors"]:
+        print(f"Error: {err}")
 
     print(f"\nTotal records successfully processed: {success_count}/{len(records)}")
 
@@ -4,11 +4,14 @@ Migrate temp market data into production tables after confirmation.
 """
 import argparse
 import os
+import sys
 from typing import List
 
-import httpx
 from dotenv import load_dotenv
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "scripts"))
+from supabase_clients import http_client
+
 
 TABLE_MAP = {
     "us": {"temp": "us_market_temp", "prod": "us_market"},
@@ -57,7 +60,7 @@ def execute_sql(url: str, key: str, sql: str) -> None:
         "apikey": key,
         "Authorization": f"Bearer {key}",
     }
-    resp = httpx.post(endpoint, json=payload, headers=headers, timeout=60.0)
+    resp = http_client().post(endpoint, json=payload, headers=headers, timeout=60.0)
     if resp.status_code not in (200, 201, 204):
         raise RuntimeError(f"SQL 执行失败: {resp.status_code} - {resp.text}")
 
@@ -1,15 +1,36 @@
 import json
 import modal
 import os
+import sys
 import pandas as pd
-import akshare as ak
 import datetime as dt
 from typing import Dict, Any, List, Optional
 from fastapi.responses import StreamingResponse
 
+# 本地部署时从 scripts/ 引入共享模块；容器内这些模块被放在 app.py 同目录
+SCRIPTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "scripts")
+if os.path.isdir(SCRIPTS_DIR):
+    sys.path.insert(0, SCRIPTS_DIR)
+
+# AKShare 调用经过录制/回放缓存（AKSHARE_CACHE_MODE 控制，默认直连）
+from akshare_cache import ak
+# 股票代码 -> 交易所从 company_list 快照解析（容器存活期间按 TTL 复用）
+from company_list_cache import lookup_company
+# 上传走自适应并发批量写入（429/5xx 退避后只重试失败的批次）
+from batch_uploader import upload_table
+# Supabase 客户端在容器内共用（连接池 + keep-alive，同一容器的后续请求复用连接）
+from supabase_clients import supabase_client
+
 # Define Modal image
-image = modal.Image.debian_slim().pip_install(
-    "akshare", "pandas", "supabase", "python-dotenv", "fastapi", "pydantic"
+image = (
+    modal.Image.debian_slim()
+    .pip_install("akshare", "pandas", "supabase", "python-dotenv", "fastapi", "pydantic", "orjson", "h2")
+    .add_local_file(os.path.join(SCRIPTS_DIR, "akshare_cache.py"), "/root/akshare_cache.py")
+    .add_local_file(os.path.join(SCRIPTS_DIR, "trace_spans.py"), "/root/trace_spans.py")
+    .add_local_file(os.path.join(SCRIPTS_DIR, "company_list_cache.py"), "/root/company_list_cache.py")
+    .add_local_file(os.path.join(SCRIPTS_DIR, "batch_uploader.py"), "/root/batch_uploader.py")
+    .add_local_file(os.path.join(SCRIPTS_DIR, "rest_transport.py"), "/root/rest_transport.py")
+    .add_local_file(os.path.join(SCRIPTS_DIR, "supabase_clients.py"), "/root/supabase_clients.py")
 )
 
 app = modal.App("stock-data-fetcher")
@@ -72,8 +93,6 @@ def scale_to_billion(v: Any) -> Any:
 @app.function(image=image, secrets=[modal.Secret.from_name("supabase-secrets")], timeout=600)
 @modal.web_endpoint(method="POST")
 def fetch_stock_data(item: dict):
-    from supabase import create_client
-    
     symbol = normalize_symbol(item.get("symbol", ""))
     if not symbol:
         return {"error": "Missing symbol"}
@@ -82,18 +101,18 @@ def fetch_stock_data(item: dict):
         try:
             url = os.environ["SUPABASE_URL"]
             key = os.environ["SUPABASE_SERVICE_ROLE_KEY"]
-            supabase = create_client(url, key)
+            supabase = supabase_client(url, key)
 
             # Step 1: Verify Market
             yield f"data: {json.dumps({'step': 1, 'status': 'running', 'message': '验证股票代码市场...'})}\n\n"
-            resp = supabase.table("company_list").select("exchange,description").eq("symbol", symbol).limit(1).execute()
+            company = lookup_company(symbol)
             
-            if not resp.data:
+            if not company:
                 yield f"data: {json.dumps({'step': 1, 'status': 'error', 'message': f'股票代码 {symbol} 不在公司列表中'})}\n\n"
                 return
 
-            exchange = str(resp.data[0].get("exchange") or "").upper()
-            company_name = resp.data[0].get("description")
+            exchange = str(company.get("exchange") or "").upper()
+            company_name = company.get("description")
             market = "SH" if exchange == "SSE" else "SZ" if exchange == "SZSE" else None
             
             if exchange not in ["SSE", "SZSE"]:
@@ -232,19 +251,17 @@ def fetch_stock_data(item: dict):
             # Step 8: Upload to Supabase
             yield f"data: {json.dumps({'step': 8, 'status': 'running', 'message': '正在将数据上传到 Supabase...'})}\n\n"
             
-            if bs_records:
-                supabase.table("cn_balance_sheet_10y").upsert(bs_records, on_conflict="symbol,report_date").execute()
-            if is_records:
-                supabase.table("cn_income_statement_10y").upsert(is_records, on_conflict="symbol,report_date").execute()
-            if cf_records:
-                supabase.table("cn_cash_flow_10y").upsert(cf_records, on_conflict="symbol,report_date").execute()
-            if mc_records:
-                for i in range(0, len(mc_records), 1000):
-                    supabase.table("cn_mkt_cap_10y").upsert(mc_records[i:i+1000], on_conflict="symbol,trade_date").execute()
-            if holder_records:
-                supabase.table("cn_top10_shareholders_10y").upsert(holder_records, on_conflict="symbol,report_date,rank").execute()
-            if hc_records:
-                supabase.table("cn_holder_count_concentration_10y").upsert(hc_records, on_conflict="symbol,report_date").execute()
+            uploads = [
+                ("cn_balance_sheet_10y", bs_records, "symbol,report_date"),
+                ("cn_income_statement_10y", is_records, "symbol,report_date"),
+                ("cn_cash_flow_10y", cf_records, "symbol,report_date"),
+                ("cn_mkt_cap_10y", mc_records, "symbol,trade_date"),
+                ("cn_top10_shareholders_10y", holder_records, "symbol,report_date,rank"),
+                ("cn_holder_count_concentration_10y", hc_records, "symbol,report_date"),
+            ]
+            for table, records, on_conflict in uploads:
+                if records:
+                    upload_table(supabase, table, records, method="upsert", on_conflict=on_conflict, symbol=symbol)
 
             yield f"data: {json.dumps({'step': 8, 'status': 'done', 'message': '所有数据同步完成！', 'final': True})}\n\n"
 
@@ -7,9 +7,12 @@
 import os
 import sys
 from dotenv import load_dotenv
-from supabase import create_client
 from typing import List, Dict, Any
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "scripts"))
+from batch_uploader import upload_table
+from supabase_clients import supabase_client
+
 # 加载环境变量
 load_dotenv()
 
@@ -124,18 +127,13 @@ def batch_insert_records(supabase, records: List[Dict[str, Any]], batch_size: in
     total_records = len(records)
     print(f"\n🔄 准备插入 {total_records} 条记录到 stock_index 表...")
     
-    inserted_count = 0
-    
-    for i in range(0, total_records, batch_size):
-        batch = records[i:i + batch_size]
-        
-        try:
-            response = supabase.table('stock_index').insert(batch).execute()
-            inserted_count += len(batch)
-            print(f"   ✅ 已插入 {inserted_count}/{total_records} 条记录")
-        except Exception as e:
-            print(f"   ❌ 插入第 {i}-{i+len(batch)} 条记录时出错: {e}")
-            raise
+    # 多个批次同时在途，批次大小按延迟自动调整，429/5xx 时只重试失败的批次
+    try:
+        result = upload_table(supabase, 'stock_index', records, batch_size=batch_size)
+    except Exception as e:
+        print(f"   ❌ 插入记录时出错: {e}")
+        raise
+    inserted_count = result['uploaded']
     
     print(f"   ✅ 成功插入所有 {inserted_count} 条记录")
 
@@ -151,7 +149,7 @@ def main():
     try:
         # 连接 Supabase
         print("\n🔄 连接 Supabase...")
-        supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
+        supabase = supabase_client(SUPABASE_URL, SUPABASE_KEY)
         print("   ✅ 连接成功!")
 
         all_stock_index_records = []
@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""AKShare 调用的录制/回放缓存
+
+用法：把 `import akshare as ak` 换成 `from akshare_cache import ak`，调用方式不变。
+
+缓存是按内容寻址的磁盘存储：键为 (函数名, 参数) 的 sha256，
+文件位于 {AKSHARE_CACHE_DIR}/{函数名}/{sha256}.pkl。
+
+模式（configure_akshare_cache 或环境变量 AKSHARE_CACHE_MODE）:
+  off    直接调用 akshare，不读写缓存（默认）
+  record 命中且未过期则读缓存，否则联网并写入缓存（每个接口有各自的 TTL）
+  replay 只读缓存，忽略 TTL，从不联网；未录制的调用抛出 AkshareCacheMiss
+"""
+import os
+import json
+import time
+import pickle
+import hashlib
+import threading
+from typing import Any, Dict, Optional
+
+from trace_spans import span
+
+
+CACHE_MODES = ("off", "record", "replay")
+
+DEFAULT_CACHE_DIR = os.path.join("outputs", "cache", "akshare")
+
+# 每个接口的缓存有效期（秒）
+ENDPOINT_TTLS = {
+    "stock_balance_sheet_by_report_em": 24 * 3600,
+    "stock_profit_sheet_by_report_em": 24 * 3600,
+    "stock_cash_flow_sheet_by_report_em": 24 * 3600,
+    "stock_main_stock_holder": 24 * 3600,
+    "stock_hold_num_cninfo": 6 * 3600,
+    "stock_value_em": 3600,
+}
+DEFAULT_TTL = 3600
+
+
+class AkshareCacheMiss(RuntimeError):
+    """回放模式下请求了未录制的调用"""
+
+
+_config = {
+    "mode": os.getenv("AKSHARE_CACHE_MODE", "off").strip().lower() or "off",
+    "cache_dir": os.getenv("AKSHARE_CACHE_DIR", DEFAULT_CACHE_DIR),
+}
+_stats = {"hits": 0, "misses": 0, "stored": 0}
+_stats_lock = threading.Lock()
+_key_locks: Dict[str, threading.Lock] = {}
+_key_locks_guard = threading.Lock()
+
+
+def configure_akshare_cache(mode: Optional[str] = None, cache_dir: Optional[str] = None) -> None:
+    if mode is not None:
+        mode = mode.strip().lower()
+        if mode not in CACHE_MODES:
+            raise ValueError(f"未知缓存模式: {mode}（可选 {', '.join(CACHE_MODES)}）")
+        _config["mode"] = mode
+    if cache_dir is not None:
+        _config["cache_dir"] = cache_dir
+
+
+def cache_mode_from_argv(argv) -> Optional[str]:
+    """解析脚本通用参数 --replay / --cache，未指定时返回 None（沿用环境变量）"""
+    if "--replay" in argv:
+        return "replay"
+    if "--cache" in argv:
+        return "record"
+    return None
+
+
+def cache_stats() -> Dict[str, int]:
+    with _stats_lock:
+        return dict(_stats)
+
+
+def cache_key(fn_name: str, args: tuple, kwargs: Dict[str, Any]) -> str:
+    payload = json.dumps(
+        {"fn": fn_name, "args": list(args), "kwargs": dict(sorted(kwargs.items()))},
+        ensure_ascii=False,
+        default=str,
+        sort_keys=True,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def cache_path(fn_name: str, key: str) -> str:
+    return os.path.join(_config["cache_dir"], fn_name, f"{key}.pkl")
+
+
+def _key_lock(key: str) -> threading.Lock:
+    with _key_locks_guard:
+        if key not in _key_locks:
+            _key_locks[key] = threading.Lock()
+        return _key_locks[key]
+
+
+def _count(name: str) -> None:
+    with _stats_lock:
+        _stats[name] += 1
+
+
+def _load_akshare():
+    import akshare
+    return akshare
+
+
+def cached_call(fn_name: str, *args, **kwargs) -> Any:
+    """按当前模式调用 akshare.{fn_name}"""
+    mode = _config["mode"]
+    if mode == "off":
+        return getattr(_load_akshare(), fn_name)(*args, **kwargs)
+
+    key = cache_key(fn_name, args, kwargs)
+    path = cache_path(fn_name, key)
+    with _key_lock(key):
+        if os.path.exists(path):
+            ttl = ENDPOINT_TTLS.get(fn_name, DEFAULT_TTL)
+            if mode == "replay" or time.time() - os.path.getmtime(path) < ttl:
+                try:
+                    with open(path, "rb") as f:
+                        result = pickle.load(f)
+                    _count("hits")
+                    return result
+                except Exception:
+                    if mode == "replay":
+                        raise
+        _count("misses")
+        if mode == "replay":
+            raise AkshareCacheMiss(f"回放模式下缺少缓存: {fn_name}(args={args}, kwargs={kwargs})")
+
+        result = getattr(_load_akshare(), fn_name)(*args, **kwargs)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "wb") as f:
+                pickle.dump(result, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, path)
+            _count("stored")
+        except Exception:
+            pass
+        return result
+
+
+class _CachedAkshare:
+    """akshare 模块的代理：函数属性经过缓存包装，其它属性原样返回"""
+
+    def __getattr__(self, name: str) -> Any:
+        if name.startswith("_"):
+            raise AttributeError(name)
+        if _config["mode"] != "replay":
+            attr = getattr(_load_akshare(), name)
+            if not callable(attr):
+                return attr
+
+        def call(*args, **kwargs):
+            with span("akshare", endpoint=name, symbol=kwargs.get("symbol", args[0] if args else None)) as s:
+                result = cached_call(name, *args, **kwargs)
+                if hasattr(result, "shape"):
+                    s["rows"] = len(result)
+                return result
+
+        call.__name__ = name
+        call.__qualname__ = name
+        return call
+
+
+ak = _CachedAkshare()
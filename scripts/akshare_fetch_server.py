@@ -1,13 +1,16 @@
 #!/usr/bin/env python3
 import json
 import os
-import subprocess
 import sys
 from http.server import SimpleHTTPRequestHandler, HTTPServer
 from urllib.parse import urlparse
 
 
 ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, os.path.join(ROOT_DIR, "scripts"))
+
+from stock_pipeline import run_pipeline
+from symbol_format_memo import save_memo
 
 
 class AkshareHandler(SimpleHTTPRequestHandler):
@@ -43,18 +46,22 @@ class AkshareHandler(SimpleHTTPRequestHandler):
             return
 
         try:
-            fetch_cmd = [sys.executable, os.path.join(ROOT_DIR, "scripts", "fetch_stock_data.py"), f"--symbol={symbol}"]
-            upload_cmd = [sys.executable, os.path.join(ROOT_DIR, "scripts", "upload_stock_data.py"), f"--symbol={symbol}"]
-
-            subprocess.run(fetch_cmd, cwd=ROOT_DIR, check=True, capture_output=True, text=True)
-            subprocess.run(upload_cmd, cwd=ROOT_DIR, check=True, capture_output=True, text=True)
+            # 同一进程内下载并上传：每个数据集下载完成后直接上传，不再经过中间文件
+            try:
+                result = run_pipeline(symbol)
+            finally:
+                # 服务常驻运行，每次请求后写回学到的代码格式，重启后不必重新探测
+                save_memo()
+            if result["errors"]:
+                self._set_headers(500)
+                self.wfile.write(json.dumps({"error": "; ".join(result["errors"])}).encode("utf-8"))
+                return
 
             self._set_headers(200)
             self.wfile.write(json.dumps({"message": f"下载并上传完成: {symbol}"}).encode("utf-8"))
-        except subprocess.CalledProcessError as err:
-            msg = err.stderr.strip() if err.stderr else (err.stdout.strip() if err.stdout else str(err))
+        except Exception as err:
             self._set_headers(500)
-            self.wfile.write(json.dumps({"error": msg}).encode("utf-8"))
+            self.wfile.write(json.dumps({"error": str(err)}).encode("utf-8"))
 
 
 def main():
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""按日期的 as-of 查找：取给定日期当日或之前最近一个观测值（市值、价格等）
+
+  resolver = AsOfResolver.from_frame(mkt_cap_df, "date", "mkt_cap_billion_cny")
+  resolver.values_at(report_dates)                      # 单一序列：一次 searchsorted
+
+  resolver = AsOfResolver.from_frame(snapshots, "download_date", "market_capitalization", key_col="symbol")
+  resolver.values_at(dates, keys=symbols)               # 按股票分组：一次 merge_asof(by=key)
+
+观测按日期稳定排序，同一日期（同一股票）有多条时取最后一条；tolerance 限制观测值相对查询日期的
+最大滞后（pd.Timedelta(0) 即只取同一天）。查不到、查询日期为空时返回 NaN。
+"""
+from typing import Any, Iterable, Optional
+
+import numpy as np
+import pandas as pd
+
+
+def _datetimes(values: Iterable[Any]) -> np.ndarray:
+    """日期字符串 / Timestamp / DatetimeIndex -> datetime64[ns] 数组，无法解析的为 NaT"""
+    index = values if isinstance(values, pd.Index) else pd.Index(list(values))
+    return np.asarray(pd.to_datetime(index, errors="coerce"), dtype="datetime64[ns]")
+
+
+def _keys(values: Iterable[Any]) -> np.ndarray:
+    return np.asarray([str(v) for v in values], dtype=object)
+
+
+class AsOfResolver:
+    """已排序的 (日期[, 键], 值) 观测序列，供批量 as-of 查询"""
+
+    def __init__(self, dates: Iterable[Any], values: Iterable[Any], keys: Optional[Iterable[Any]] = None):
+        frame = pd.DataFrame({
+            "date": _datetimes(dates),
+            "value": pd.to_numeric(pd.Series(np.asarray(values)), errors="coerce").to_numpy(dtype=float),
+        })
+        if keys is not None:
+            frame["key"] = _keys(keys)
+        frame = frame[frame["date"].notna()].sort_values("date", kind="mergesort").reset_index(drop=True)
+        self.keyed = keys is not None
+        self._frame = frame
+        self._dates = frame["date"].to_numpy(dtype="datetime64[ns]")
+        self._values = frame["value"].to_numpy()
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame, date_col: str, value_col: str,
+                   key_col: Optional[str] = None) -> "AsOfResolver":
+        return cls(df[date_col], df[value_col], df[key_col] if key_col else None)
+
+    def __len__(self) -> int:
+        return len(self._frame)
+
+    def values_at(self, dates: Iterable[Any], keys: Optional[Iterable[Any]] = None,
+                  tolerance: Optional[pd.Timedelta] = None) -> np.ndarray:
+        """每个查询日期（及键）当日或之前最近的观测值，与查询同序的 float 数组"""
+        query = _datetimes(dates)
+        if self.keyed:
+            if keys is None:
+                raise ValueError("按键分组的 AsOfResolver 查询时需要 keys")
+            return self._keyed_values(query, keys, tolerance)
+        out = np.full(len(query), np.nan)
+        valid = ~np.isnat(query)
+        pos = np.searchsorted(self._dates, query[valid], side="right") - 1
+        found = pos >= 0
+        if tolerance is not None:
+            found &= query[valid] - self._dates[np.maximum(pos, 0)] <= np.timedelta64(pd.Timedelta(tolerance))
+        values = np.full(len(pos), np.nan)
+        values[found] = self._values[pos[found]]
+        out[valid] = values
+        return out
+
+    def _keyed_values(self, query: np.ndarray, keys: Iterable[Any], tolerance: Optional[pd.Timedelta]) -> np.ndarray:
+        left = pd.DataFrame({"date": query, "key": _keys(keys)})
+        left["pos"] = np.arange(len(left))
+        left = left[left["date"].notna()].sort_values("date", kind="mergesort")
+        out = np.full(len(query), np.nan)
+        if left.empty or self._frame.empty:
+            return out
+        merged = pd.merge_asof(left, self._frame, on="date", by="key", direction="backward",
+                               tolerance=None if tolerance is None else pd.Timedelta(tolerance))
+        out[merged["pos"].to_numpy()] = merged["value"].to_numpy(dtype=float)
+        return out
+
+    def value_at(self, date: Any, key: Any = None, tolerance: Optional[pd.Timedelta] = None) -> float:
+        """单个日期的 as-of 值（批量查询请用 values_at）"""
+        return float(self.values_at([date], None if key is None else [key], tolerance)[0])
@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+"""Supabase 批量写入：每张表多个批次并发、按观测延迟与请求体大小自动调整批次
+
+  uploader = BatchUploader(send, table="company_financials_long", symbol="002508")
+  result = uploader.upload(records)   # {"uploaded", "failed", "batches", "retries", "batch_size", "errors"}
+
+send(batch) 负责发送一批（已清洗的）记录，失败时抛出异常；BatchUploader 负责：
+  - 同时保持 workers 个批次在途（默认 4）
+  - 每批成功后按 延迟 / 目标延迟 调整下一批行数，并保证请求体不超过 max_bytes
+  - 413（请求体过大）：该批拆成两半重试，之后的批次上限减半
+  - 429 / 5xx / 连接超时：指数退避（优先使用 Retry-After）后只重试失败的这一批
+  - 其他错误（如唯一键冲突）不重试，记入 errors，由调用方决定是否抛出
+on_batch(batch) 在每批写入成功后调用（在工作线程中，需自行加锁），可用于按批统计新增 / 更新。
+传入 journal（upload_journal.UploadJournal）时按日志批次跳过已提交的记录，并在日志批次全部写入后记录。
+"""
+import random
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from rest_transport import clean_record, encode_records
+from trace_spans import span
+
+
+DEFAULT_WORKERS = 4
+DEFAULT_BATCH_SIZE = 1000
+MIN_BATCH_SIZE = 50
+MAX_BATCH_SIZE = 5000
+# 单批目标耗时：过短时请求开销占比高，过长容易触发网关 / statement 超时
+TARGET_SECONDS = 1.5
+# Supabase 网关默认请求体上限较宽，这里留足余量
+MAX_PAYLOAD_BYTES = 4_000_000
+MAX_RETRIES = 5
+BACKOFF_BASE_SECONDS = 0.5
+BACKOFF_MAX_SECONDS = 30.0
+
+# PostgREST / Postgres 错误码中可重试的（按 5xx 处理）
+RETRYABLE_API_CODES = {
+    "PGRST000", "PGRST001", "PGRST002", "PGRST003",  # 数据库连接 / 连接池超时
+    "57014",  # statement timeout，同时缩小批次
+    "40001", "40P01",  # 序列化失败 / 死锁
+    "53300",  # 连接数过多
+}
+
+
+def error_status(exc: BaseException) -> Optional[int]:
+    """从异常中取出 HTTP 状态码；连接类错误和可重试的数据库错误按 503 处理，无法判断时返回 None"""
+    response = getattr(exc, "response", None)
+    status = getattr(response, "status_code", None)
+    if isinstance(status, int):
+        return status
+    code = getattr(exc, "code", None)
+    if code is not None:
+        code = str(code)
+        if code.isdigit() and len(code) == 3:
+            return int(code)  # postgrest 无法解析错误体时以 HTTP 状态码作为 code
+        if code == "57014":
+            return 504
+        if code in RETRYABLE_API_CODES:
+            return 503
+        return None
+    text = str(exc)
+    if "413" in text or "Payload Too Large" in text or "Request Entity Too Large" in text:
+        return 413
+    if isinstance(exc, (TimeoutError, ConnectionError)) or type(exc).__name__ in (
+        "ConnectError", "ConnectTimeout", "ReadTimeout", "WriteTimeout", "PoolTimeout",
+        "RemoteProtocolError", "ReadError", "WriteError", "ConnectionError", "Timeout",
+    ):
+        return 503
+    return None
+
+
+def retry_after_seconds(exc: BaseException) -> Optional[float]:
+    headers = getattr(getattr(exc, "response", None), "headers", None)
+    if not headers:
+        return None
+    try:
+        return float(headers.get("Retry-After"))
+    except (TypeError, ValueError):
+        return None
+
+
+def estimate_bytes(batch: List[Dict[str, Any]], sample: int = 20) -> int:
+    """按前 sample 行的 JSON 大小估算整批请求体大小"""
+    if not batch:
+        return 0
+    head = batch[:sample]
+    size = len(encode_records(head))
+    return int(size * len(batch) / len(head))
+
+
+class BatchUploader:
+    """一张表的自适应并发批量写入（线程安全：批次大小由多个工作线程共同调整）"""
+
+    def __init__(self, send: Callable[[List[Dict[str, Any]]], Any], table: str,
+                 workers: int = DEFAULT_WORKERS, batch_size: int = DEFAULT_BATCH_SIZE,
+                 min_batch: int = MIN_BATCH_SIZE, max_batch: int = MAX_BATCH_SIZE,
+                 target_seconds: float = TARGET_SECONDS, max_bytes: int = MAX_PAYLOAD_BYTES,
+                 max_retries: int = MAX_RETRIES,
+                 on_batch: Optional[Callable[[List[Dict[str, Any]]], None]] = None,
+                 journal=None, **span_attrs: Any):
+        self.send = send
+        self.on_batch = on_batch
+        self.journal = journal
+        self.symbol = str(span_attrs.get("symbol") or "")
+        self.table = table
+        self.workers = max(1, workers)
+        self.min_batch = min_batch
+        self.max_batch = max_batch
+        self.batch_size = max(min_batch, min(batch_size, max_batch))
+        self.target_seconds = target_seconds
+        self.max_bytes = max_bytes
+        self.max_retries = max_retries
+        self.span_attrs = span_attrs
+        self._lock = threading.Lock()
+        self._bytes_per_row: Optional[float] = None
+        self.stats = {"uploaded": 0, "failed": 0, "skipped": 0, "batches": 0, "retries": 0, "errors": []}
+        # 断点日志：记录 id -> 日志批次序号，各日志批次剩余未写入的行数、(行数, 哈希)
+        self._unit_of: Dict[int, int] = {}
+        self._unit_left: Dict[int, int] = {}
+        self._unit_info: Dict[int, Tuple[int, str]] = {}
+
+    def next_batch_size(self) -> int:
+        with self._lock:
+            size = self.batch_size
+            if self._bytes_per_row:
+                size = min(size, int(self.max_bytes / self._bytes_per_row))
+            return max(self.min_batch, size)
+
+    def _observe(self, rows: int, seconds: float, payload: int) -> None:
+        """按本批耗时调整批次：每次最多放大 2 倍、缩小一半"""
+        with self._lock:
+            if rows:
+                per_row = payload / rows
+                self._bytes_per_row = per_row if self._bytes_per_row is None else 0.8 * self._bytes_per_row + 0.2 * per_row
+            if rows < self.batch_size * 0.5:
+                return  # 最后一批等小批次的耗时不代表满批
+            factor = self.target_seconds / max(seconds, 1e-3)
+            factor = max(0.5, min(2.0, factor))
+            self.batch_size = max(self.min_batch, min(self.max_batch, int(self.batch_size * factor)))
+
+    def _shrink(self, rows: int) -> None:
+        with self._lock:
+            self.batch_size = max(self.min_batch, min(self.batch_size, rows // 2))
+
+    def _send_batch(self, batch: List[Dict[str, Any]]) -> None:
+        """发送一批，可重试的错误在本线程内退避重试；413 时拆成两半分别发送"""
+        attempt = 0
+        while True:
+            payload = estimate_bytes(batch)
+            t0 = time.perf_counter()
+            try:
+                with span("upload_batch", table=self.table, rows=len(batch), bytes=payload,
+                          attempt=attempt, **self.span_attrs):
+                    self.send(batch)
+            except Exception as e:
+                status = error_status(e)
+                if status == 413 and len(batch) > 1:
+                    self._shrink(len(batch))
+                    with self._lock:
+                        self.stats["retries"] += 1
+                    half = len(batch) // 2
+                    self._send_batch(batch[:half])
+                    self._send_batch(batch[half:])
+                    return
+                retryable = status is not None and (status == 429 or status >= 500)
+                if not retryable or attempt >= self.max_retries:
+                    with self._lock:
+                        self.stats["failed"] += len(batch)
+                        self.stats["errors"].append(str(e)[:200])
+                    return
+                if status in (500, 504):
+                    self._shrink(len(batch))  # 超时类错误多半是批次太大
+                delay = retry_after_seconds(e)
+                if delay is None:
+                    delay = min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * (2 ** attempt))
+                    delay *= random.uniform(0.5, 1.0)
+                with self._lock:
+                    self.stats["retries"] += 1
+                time.sleep(delay)
+                attempt += 1
+                continue
+            self._observe(len(batch), time.perf_counter() - t0, payload)
+            with self._lock:
+                self.stats["uploaded"] += len(batch)
+                self.stats["batches"] += 1
+            if self.journal is not None:
+                self._journal_batch(batch)
+            if self.on_batch is not None:
+                self.on_batch(batch)
+            return
+
+    def _skip_committed(self, records: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """按固定行数切分日志批次，去掉已提交的，返回待上传的记录"""
+        committed = self.journal.committed(self.table, self.symbol)
+        unit_rows = self.journal.unit_rows
+        pending = []
+        for idx, start in enumerate(range(0, len(records), unit_rows)):
+            unit = records[start:start + unit_rows]
+            h = self.journal.batch_hash(unit)
+            if h in committed:
+                self.stats["skipped"] += len(unit)
+                continue
+            self._unit_left[idx] = len(unit)
+            self._unit_info[idx] = (len(unit), h)
+            for r in unit:
+                self._unit_of[id(r)] = idx
+            pending.extend(unit)
+        return pending
+
+    def _journal_batch(self, batch: List[Dict[str, Any]]) -> None:
+        done = []
+        with self._lock:
+            for r in batch:
+                idx = self._unit_of[id(r)]
+                self._unit_left[idx] -= 1
+                if self._unit_left[idx] == 0:
+                    done.append(idx)
+        for idx in done:
+            rows, h = self._unit_info[idx]
+            self.journal.record(self.table, self.symbol, h, rows)
+
+    def upload(self, records: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """按当前批次大小切分并保持 workers 个批次在途，返回统计"""
+        if self.journal is not None:
+            records = self._skip_committed(records)
+        pos = 0
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            in_flight = set()
+            while pos < len(records) or in_flight:
+                while pos < len(records) and len(in_flight) < self.workers:
+                    size = self.next_batch_size()
+                    in_flight.add(executor.submit(self._send_batch, records[pos:pos + size]))
+                    pos += size
+                done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    future.result()
+        result = dict(self.stats)
+        result["batch_size"] = self.batch_size
+        return result
+
+
+def table_sender(client, table: str, method: str = "insert", **options: Any) -> Callable[[List[Dict[str, Any]]], Any]:
+    """写入 supabase 表的 send
+
+    rest_transport.RestClient 走整批编码 + gzip 的传输层；普通 supabase 客户端逐值清洗 NaN 后
+    client.table(table).<method>(batch, **options).execute()。
+    """
+    if hasattr(client, "write"):
+        def send(batch: List[Dict[str, Any]]) -> Any:
+            return client.write(table, batch, method, options.get("on_conflict"))
+        return send
+
+    def send(batch: List[Dict[str, Any]]) -> Any:
+        return getattr(client.table(table), method)([clean_record(r) for r in batch], **options).execute()
+    return send
+
+
+def upload_records(send: Callable[[List[Dict[str, Any]]], Any], records: List[Dict[str, Any]],
+                   table: str, **kwargs: Any) -> Dict[str, Any]:
+    """一次性上传的便捷写法：BatchUploader(send, table, **kwargs).upload(records)"""
+    return BatchUploader(send, table, **kwargs).upload(records)
+
+
+def upload_table(client, table: str, records: List[Dict[str, Any]], method: str = "insert",
+                 on_conflict: Optional[str] = None, **kwargs: Any) -> Dict[str, Any]:
+    """写入 supabase 表；有失败批次时抛出 RuntimeError（其余批次已写入）"""
+    options = {"on_conflict": on_conflict} if on_conflict else {}
+    result = upload_records(table_sender(client, table, method, **options), records, table, **kwargs)
+    if result["failed"]:
+        raise RuntimeError(f"{table}: {result['failed']} 行写入失败 - {result['errors'][0]}")
+    return result
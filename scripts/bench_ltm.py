@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""LTM 换算基准：原逐列逐期 next() 查找 vs 向量化 reindex 实现
+
+构造一个 20 年季度（80 个报告期）的宽表，流量科目取 ACCOUNT_MAPPING 中除时点科目以外的全部列，
+分别用原实现和 calculate_002508_koyfin_metrics.ltm_financials 换算并计时；
+另用随机缺期、缺值、同月多个报告期的小样本核对两者结果逐值一致。
+
+用法:
+  python scripts/bench_ltm.py --years=20 --repeat=5
+"""
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from calculate_002508_koyfin_metrics import ACCOUNT_MAPPING, STATUS_COLS, ltm_financials
+
+
+def legacy_ltm(df_wide: pd.DataFrame, flow_cols) -> pd.DataFrame:
+    """原实现（每列每期线性查找上年年报和上年同期），仅用于对比"""
+    res_ltm = df_wide.copy()
+    for col in flow_cols:
+        if col not in df_wide.columns:
+            continue
+        for dt in df_wide.index:
+            if dt.month == 12:
+                continue
+            p_ye = next((d for d in df_wide.index if d.year == dt.year - 1 and d.month == 12), None)
+            p_p = next((d for d in df_wide.index if d.year == dt.year - 1 and d.month == dt.month), None)
+            if p_ye and p_p:
+                res_ltm.at[dt, col] = df_wide.at[dt, col] + df_wide.at[p_ye, col] - df_wide.at[p_p, col]
+            else:
+                res_ltm.at[dt, col] = np.nan
+    return res_ltm
+
+
+def make_wide(years: int, seed: int = 0, drop: float = 0.0, nan: float = 0.0, extra: int = 0) -> pd.DataFrame:
+    """按季度报告期的宽表：drop 比例的报告期缺失，nan 比例的值为空，extra 个同月的额外报告期"""
+    rng = np.random.default_rng(seed)
+    dates = pd.date_range(end="2025-12-31", periods=years * 4, freq="QE")
+    if drop:
+        dates = dates[rng.random(len(dates)) >= drop]
+    if extra:
+        dates = dates.append(pd.DatetimeIndex(rng.choice(dates, extra) - pd.Timedelta(days=10))).sort_values()
+    columns = sorted(set(ACCOUNT_MAPPING.values()))
+    values = rng.normal(1e9, 3e8, (len(dates), len(columns)))
+    if nan:
+        values[rng.random(values.shape) < nan] = np.nan
+    return pd.DataFrame(values, index=dates, columns=columns)
+
+
+def check_equal(trials: int = 50) -> None:
+    for seed in range(trials):
+        df = make_wide(6, seed, drop=0.2, nan=0.05, extra=seed % 3)
+        flow_cols = [c for c in df.columns if c not in STATUS_COLS]
+        pd.testing.assert_frame_equal(ltm_financials(df, flow_cols), legacy_ltm(df, flow_cols), check_exact=True)
+    print(f"结果核对: {trials} 组随机样本（缺期、缺值、同月多个报告期）逐值一致")
+
+
+def main():
+    years = 20
+    repeat = 5
+    for a in sys.argv[1:]:
+        if a.startswith("--years="):
+            years = int(a.split("=", 1)[1])
+        if a.startswith("--repeat="):
+            repeat = int(a.split("=", 1)[1])
+
+    check_equal()
+
+    df = make_wide(years)
+    flow_cols = [c for c in df.columns if c not in STATUS_COLS]
+    print(f"宽表: {len(df)} 个报告期 x {len(flow_cols)} 个流量科目（{years} 年季度数据）")
+
+    timings = {}
+    for name, fn in (("原实现 next() 逐列逐期", legacy_ltm), ("向量化 reindex", ltm_financials)):
+        best = float("inf")
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            result = fn(df, flow_cols)
+            best = min(best, time.perf_counter() - t0)
+        timings[name] = (best, result)
+    (old_time, old), (new_time, new) = timings.values()
+    pd.testing.assert_frame_equal(new, old, check_exact=True)
+    for name, (t, _) in timings.items():
+        print(f"  {name:<20} {t * 1000:9.1f} ms")
+    print(f"加速 {old_time / new_time:.0f}x，结果一致")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""PostgREST 写入请求体基准：逐值 clean_record + json vs 整批编码（orjson）+ gzip
+
+用 bench_upload_loaders 的虚拟财务长表（含 NaN、numpy 标量）生成记录，按 1000 行一批编码，
+统计每 1000 行的 CPU 时间和请求体字节数（即线上传输的字节数，不含 HTTP 头）：
+  原实现:       clean_record 逐值清洗 + json.dumps（postgrest-py / httpx 的默认路径）
+  整批编码:     rest_transport.encode_records（安装 orjson 时为 orjson，否则回退到原实现）
+  整批编码+gzip: 再以 GZIP_LEVEL 压缩
+
+用法:
+  python scripts/bench_rest_transport.py --rows=100000
+  python scripts/bench_rest_transport.py --rows=100000 --no-orjson   # 未安装 orjson 时的回退路径
+"""
+import gzip
+import json
+import sys
+import time
+from typing import Any, Callable, Dict, List
+
+import numpy as np
+import pandas as pd
+
+from bench_upload_loaders import make_financials
+import rest_transport
+from rest_transport import GZIP_LEVEL, clean_record, encode_records
+from upload_stock_data import financials_records, mkt_cap_records
+
+
+BATCH = 1000
+
+
+def legacy_encode(batch: List[Dict[str, Any]]) -> bytes:
+    """与 httpx 的 json= 编码一致"""
+    return json.dumps([clean_record(r) for r in batch], ensure_ascii=False, separators=(",", ":"),
+                      allow_nan=False).encode("utf-8")
+
+
+def measure(batches: List[List[Dict[str, Any]]], encode: Callable[[List[Dict[str, Any]]], bytes]):
+    rows = sum(len(b) for b in batches)
+    t0 = time.process_time()
+    size = sum(len(encode(b)) for b in batches)
+    cpu = time.process_time() - t0
+    return cpu / rows * BATCH * 1000, size / rows * BATCH
+
+
+def main():
+    n_rows = 100_000
+    for a in sys.argv[1:]:
+        if a.startswith("--rows="):
+            n_rows = int(a.split("=", 1)[1])
+        if a == "--no-orjson":
+            rest_transport.orjson = None
+    orjson = rest_transport.orjson
+
+    datasets = {
+        "company_financials_long": financials_records(make_financials(n_rows)),
+        "stock_valuation_history": mkt_cap_records(pd.DataFrame({
+            "date": pd.date_range("2000-01-03", periods=n_rows, freq="D").strftime("%Y-%m-%d"),
+            "mkt_cap_billion_cny": np.random.default_rng(0).normal(100, 10, n_rows),
+        }), "002508"),
+    }
+    variants = [
+        ("原实现 clean_record + json", legacy_encode),
+        ("整批编码", encode_records),
+        ("整批编码 + gzip", lambda b: gzip.compress(encode_records(b), GZIP_LEVEL)),
+    ]
+
+    print(f"编码器: {'orjson ' + orjson.__version__ if orjson is not None else 'json（未安装 orjson）'}，"
+          f"每批 {BATCH} 行")
+    for table, records in datasets.items():
+        batches = [records[i:i + BATCH] for i in range(0, len(records), BATCH)]
+        assert json.loads(encode_records(batches[0])) == json.loads(legacy_encode(batches[0])), "编码结果不一致"
+        print(f"{table}（{len(records)} 行）:")
+        base = None
+        for name, encode in variants:
+            cpu_ms, size = measure(batches, encode)
+            base = base or (cpu_ms, size)
+            print(f"  {name:<24} CPU {cpu_ms:6.2f} ms / 千行（{base[0] / cpu_ms:4.1f}x）  "
+                  f"请求体 {size / 1024:7.1f} KB / 千行（{size / base[1]:6.1%}）")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+"""上传前加载（CSV -> 记录）基准测试：列式实现 vs 原 iterrows 实现
+
+构造一个约 100k 行的财务长表 CSV（含数字字符串、非数值文本、两种报告日格式、
+未补零的股票代码），分别用原逐行实现和 upload_stock_data 中的列式实现转换为记录并计时；
+同时用小样本核对市值、股东人数、前十大股东三个加载器与原实现的输出一致。
+
+用法:
+  python scripts/bench_upload_loaders.py --rows=100000
+"""
+import os
+import sys
+import time
+import tempfile
+from typing import Any, Dict, List
+
+import numpy as np
+import pandas as pd
+
+from upload_stock_data import (
+    clean_record, financials_records, format_report_date, is_numeric_value,
+    mkt_cap_records, sharehold_records, top10_records,
+)
+
+
+def legacy_financials_records(df: pd.DataFrame) -> List[Dict[str, Any]]:
+    """原实现（逐行 iterrows），仅用于对比"""
+    df = df.copy()
+    df["report_date"] = df["报告日"].apply(format_report_date)
+    df["announcement_date"] = df.get("公告日期", None).apply(format_report_date) if "公告日期" in df.columns else None
+
+    records = []
+    for _, row in df.iterrows():
+        val = row.get("数值")
+        if not is_numeric_value(val):
+            continue
+        raw_symbol = str(row.get("股票代码", "")).strip()
+        formatted_symbol = raw_symbol.zfill(6) if raw_symbol.isdigit() else raw_symbol
+        records.append({
+            "symbol": formatted_symbol,
+            "report_date": row.get("report_date"),
+            "statement_type": row.get("报表类型"),
+            "account": row.get("财务科目"),
+            "value": float(val) if pd.notna(val) and val != "" else None,
+            "data_source": row.get("数据源"),
+            "is_audited": row.get("是否审计"),
+            "announcement_date": row.get("announcement_date"),
+            "currency": row.get("币种"),
+            "report_type": row.get("类型"),
+            "updated_at": format_report_date(row.get("更新日期")),
+        })
+    return records
+
+
+def legacy_mkt_cap_records(df: pd.DataFrame, symbol: str) -> List[Dict[str, Any]]:
+    records = []
+    for _, row in df.iterrows():
+        date = format_report_date(row.get("date"))
+        mkt_cap = row.get("mkt_cap_billion_cny")
+        if pd.isna(mkt_cap):
+            mkt_cap = None
+        records.append({"id": f"{symbol}_{date}", "symbol": symbol, "date": date,
+                        "Market_cap": mkt_cap, "unit": "bn", "currency": "cny"})
+    return records
+
+
+def legacy_sharehold_records(df: pd.DataFrame) -> List[Dict[str, Any]]:
+    records = []
+    for _, row in df.iterrows():
+        raw_symbol = str(row.get("证券代码", "")).strip()
+        formatted_symbol = raw_symbol.zfill(6) if raw_symbol.isdigit() else raw_symbol
+        record = {"symbol": formatted_symbol, "name": row.get("证券简称"),
+                  "report_date": format_report_date(row.get("变动日期"))}
+        for key, col in [("current_holder_count", "本期股东人数"), ("previous_holder_count", "上期股东人数"),
+                         ("holder_count_change_pct", "股东人数增幅"), ("current_avg_shares", "本期人均持股数量"),
+                         ("previous_avg_shares", "上期人均持股数量"), ("avg_shares_change_pct", "人均持股数量增幅")]:
+            record[key] = row.get(col) if pd.notna(row.get(col)) else None
+        record["report_period"] = row.get("报告期")
+        records.append(record)
+    return records
+
+
+def legacy_top10_records(df: pd.DataFrame) -> List[Dict[str, Any]]:
+    records = []
+    for _, row in df.iterrows():
+        if pd.isna(row.get("名次")):
+            continue
+        raw_symbol = str(row.get("股票代码", "")).strip() or row.get("symbol", "")
+        if raw_symbol.upper().startswith(("SZ", "SH", "SS")):
+            raw_symbol = raw_symbol[2:]
+        formatted_symbol = raw_symbol.zfill(6) if raw_symbol.isdigit() else raw_symbol
+        records.append({
+            "symbol": formatted_symbol,
+            "report_date": row.get("报告期"),
+            "rank": int(row.get("名次")),
+            "shareholder_name": row.get("股东名称"),
+            "share_type": row.get("股份类型"),
+            "shares_held": int(row.get("持股数")) if pd.notna(row.get("持股数")) else None,
+            "holding_ratio": row.get("占总股本持股比例") if pd.notna(row.get("占总股本持股比例")) else None,
+            "change_amount": row.get("增减"),
+            "change_ratio": row.get("变动比率") if pd.notna(row.get("变动比率")) else None,
+        })
+    return records
+
+
+def make_financials(n_rows: int) -> pd.DataFrame:
+    """构造与 financials_10y_long_combined 结构一致的长表"""
+    rng = np.random.default_rng(0)
+    dates = pd.date_range("2015-03-31", periods=40, freq="QE")
+    report_dates = np.where(rng.random(n_rows) < 0.5, dates.strftime("%Y%m%d")[rng.integers(0, 40, n_rows)],
+                            dates.strftime("%Y-%m-%d 00:00:00")[rng.integers(0, 40, n_rows)])
+    values = (rng.normal(size=n_rows) * 1e8).astype(object)
+    values[rng.random(n_rows) < 0.1] = None
+    values[rng.random(n_rows) < 0.05] = "1.5e3"
+    values[rng.random(n_rows) < 0.02] = "000001.SZ"
+    return pd.DataFrame({
+        "股票代码": rng.choice(["2508", "002508", "600066"], size=n_rows),
+        "报告日": report_dates,
+        "报表类型": rng.choice(["资产负债表", "利润表", "现金流量表"], size=n_rows),
+        "财务科目": [f"ITEM_{i:03d}" for i in rng.integers(0, 300, n_rows)],
+        "数值": values,
+        "数据源": "EastMoney",
+        "是否审计": rng.choice(["是", None], size=n_rows),
+        "公告日期": "2020-04-30 00:00:00",
+        "币种": "CNY",
+        "类型": None,
+        "更新日期": rng.choice(["2024-01-02", None], size=n_rows),
+    })
+
+
+def same_records(new: List[Dict[str, Any]], old: List[Dict[str, Any]], name: str) -> None:
+    new = [clean_record(r) for r in new]
+    old = [clean_record(r) for r in old]
+    if new != old:
+        diff = next(i for i, (a, b) in enumerate(zip(new, old)) if a != b) if len(new) == len(old) else None
+        raise AssertionError(f"{name} 输出不一致: {len(new)} vs {len(old)} 条，首个差异 {diff}")
+
+
+def check_small_loaders() -> None:
+    dates = pd.date_range("2016-01-01", periods=300, freq="B")
+    mkt = pd.DataFrame({"date": dates.strftime("%Y-%m-%d"), "mkt_cap_billion_cny": np.linspace(10, 20, 300)})
+    mkt.loc[5, "mkt_cap_billion_cny"] = np.nan
+    same_records(mkt_cap_records(mkt, "002508"), legacy_mkt_cap_records(mkt, "002508"), "市值历史")
+
+    holders = pd.DataFrame({
+        "证券代码": ["2508", "002508", "600066"] * 10, "证券简称": ["a", None, "c"] * 10,
+        "变动日期": ["2024-03-31", "20231231", "2023-09-30 00:00:00"] * 10,
+        "本期股东人数": [1.0, np.nan, 3.0] * 10, "上期股东人数": [1, 2, 3] * 10, "股东人数增幅": [0.1, np.nan, 0.3] * 10,
+        "本期人均持股数量": [1.5] * 30, "上期人均持股数量": [np.nan] * 30, "人均持股数量增幅": [0.0] * 30,
+    })
+    same_records(sharehold_records(holders), legacy_sharehold_records(holders), "股东人数")
+
+    top10 = pd.DataFrame({
+        "名次": [1, 2, np.nan, 4], "股东名称": ["a", "b", "c", "d"], "股份类型": ["流通A股", None, "x", "y"],
+        "持股数": [100.0, np.nan, 3.0, 12.7], "占总股本持股比例": [1.0, 0.5, np.nan, 0.1],
+        "增减": ["不变", None, "新进", "1"], "变动比率": [np.nan, 1.0, 2.0, 3.0],
+        "报告期": ["2024-03-31"] * 4, "股票代码": ["SZ002508", "sh600066", "2508", "000001"],
+    })
+    same_records(top10_records(top10), legacy_top10_records(top10), "前十大股东")
+
+
+def main():
+    n_rows = 100_000
+    for a in sys.argv[1:]:
+        if a.startswith("--rows="):
+            n_rows = int(a.split("=", 1)[1])
+
+    check_small_loaders()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "financials_long.csv")
+        make_financials(n_rows).to_csv(path, index=False)
+        size_mb = os.path.getsize(path) / 1e6
+
+        def load(fn):
+            t0 = time.perf_counter()
+            records = fn(pd.read_csv(path, dtype={"股票代码": str}))
+            return records, time.perf_counter() - t0
+
+        old, legacy_time = load(legacy_financials_records)
+        new, new_time = load(financials_records)
+
+    same_records(new, old, "财务长表")
+    print(f"结果一致: {n_rows} 行 CSV（{size_mb:.1f} MB）-> {len(new)} 条记录")
+    print(f"  原实现 iterrows: {legacy_time:.2f}s")
+    print(f"  列式实现:        {new_time:.2f}s")
+    print(f"  加速比:          {legacy_time / new_time:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""wide_to_long 基准测试：列式实现 vs 原 iterrows 实现
+
+模拟一次批量下载：每只股票 3 张报表，每张 40 个报告期 × ~300 个科目，
+其中包含少量文本列和数字字符串列。原实现太慢，默认只在部分股票上计时并线性外推。
+
+用法:
+  python scripts/bench_wide_to_long.py --symbols=5000 --legacy-sample=100
+"""
+import sys
+import time
+from typing import List
+
+import numpy as np
+import pandas as pd
+
+from fetch_stock_data import LONG_EXCLUDE_COLS, META_COLS, REPORT_COL, wide_to_long
+
+
+STATEMENTS = ["资产负债表", "利润表", "现金流量表"]
+
+
+def legacy_wide_to_long(df: pd.DataFrame, symbol: str, statement_type: str) -> pd.DataFrame:
+    """原实现（逐行 iterrows + 逐列判断），仅用于对比"""
+    data_cols = [c for c in df.columns if c not in LONG_EXCLUDE_COLS]
+    rows = []
+    for _, row in df.iterrows():
+        report_date = row.get(REPORT_COL)
+        for col in data_cols:
+            val = row.get(col)
+            if isinstance(val, str) and not val.replace('.', '').replace('-', '').replace('e', '').replace('E', '').isdigit():
+                continue
+            rows.append({
+                "股票代码": symbol,
+                "报告日": report_date,
+                "报表类型": statement_type,
+                "财务科目": col,
+                "数值": val,
+                "数据源": row.get("数据源"),
+                "是否审计": row.get("是否审计"),
+                "公告日期": row.get("公告日期"),
+                "币种": row.get("币种"),
+                "类型": row.get("类型"),
+                "更新日期": row.get("更新日期"),
+            })
+    return pd.DataFrame(rows)
+
+
+def make_statement(seed: int, periods: int = 40, n_cols: int = 300) -> pd.DataFrame:
+    """构造与 with_required_cols 输出结构一致的宽表"""
+    rng = np.random.default_rng(seed)
+    dates = pd.date_range("2015-03-31", periods=periods, freq="QE")
+    df = pd.DataFrame({REPORT_COL: dates.strftime("%Y-%m-%d 00:00:00")})
+    values = rng.normal(size=(periods, n_cols)) * 1e8
+    values[rng.random(size=values.shape) < 0.3] = np.nan
+    data = pd.DataFrame(values, columns=[f"ITEM_{i:03d}" for i in range(n_cols)])
+    data["SECURITY_NAME_ABBR"] = "示例"
+    data["OPINION"] = rng.choice(["标准无保留意见", None], size=periods)
+    data["NUMERIC_STR"] = rng.choice(["1.5e3", "-2.0", "N/A", None], size=periods)
+    df = pd.concat([df, data], axis=1)
+    df["数据源"] = "EastMoney"
+    df["是否审计"] = None
+    df["公告日期"] = "2020-04-30 00:00:00"
+    df["币种"] = "CNY"
+    df["类型"] = None
+    df["更新日期"] = None
+    return df[[REPORT_COL] + [c for c in df.columns if c not in [REPORT_COL] + META_COLS] + META_COLS]
+
+
+def run(fn, frames: List[pd.DataFrame], symbols: List[str]) -> float:
+    t0 = time.perf_counter()
+    for symbol in symbols:
+        for frame, statement in zip(frames, STATEMENTS):
+            fn(frame, symbol, statement)
+    return time.perf_counter() - t0
+
+
+def main():
+    n_symbols = 5000
+    legacy_sample = 100
+    for a in sys.argv[1:]:
+        if a.startswith("--symbols="):
+            n_symbols = int(a.split("=", 1)[1])
+        if a.startswith("--legacy-sample="):
+            legacy_sample = int(a.split("=", 1)[1])
+
+    frames = [make_statement(seed) for seed in range(len(STATEMENTS))]
+    symbols = [f"{i:06d}" for i in range(n_symbols)]
+
+    # 结果一致性检查
+    for frame, statement in zip(frames, STATEMENTS):
+        new = wide_to_long(frame, "000001", statement)
+        old = legacy_wide_to_long(frame, "000001", statement)
+        pd.testing.assert_frame_equal(new, old, check_dtype=False)
+    print(f"结果一致: 每张报表 {len(wide_to_long(frames[0], '000001', STATEMENTS[0]))} 行")
+
+    sample = symbols[:min(legacy_sample, n_symbols)]
+    legacy_time = run(legacy_wide_to_long, frames, sample) * n_symbols / len(sample)
+    new_time = run(wide_to_long, frames, symbols)
+
+    label = "" if len(sample) == n_symbols else f"（按 {len(sample)} 只外推）"
+    print(f"{n_symbols} 只股票 × {len(STATEMENTS)} 张报表")
+    print(f"  原实现 iterrows: {legacy_time:.1f}s{label}")
+    print(f"  列式实现:        {new_time:.1f}s")
+    print(f"  加速比:          {legacy_time / new_time:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,11 @@
 #!/usr/bin/env python3
 import os
 from dotenv import load_dotenv
-from supabase import create_client
+
+from supabase_clients import supabase_client
 
 load_dotenv()
-supabase = create_client(os.getenv("SUPABASE_URL"), os.getenv("SUPABASE_SERVICE_ROLE_KEY"))
+supabase = supabase_client(os.getenv("SUPABASE_URL"), os.getenv("SUPABASE_SERVICE_ROLE_KEY"))
 
 tables = [
     ("company_financials_long", "symbol"),
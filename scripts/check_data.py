@@ -1,12 +1,13 @@
 #!/usr/bin/env python3
 import os
 from dotenv import load_dotenv
-from supabase import create_client
+
+from supabase_clients import supabase_client
 
 load_dotenv()
 url = os.getenv('SUPABASE_URL')
 key = os.getenv('SUPABASE_SERVICE_ROLE_KEY')
-supabase = create_client(url, key)
+supabase = supabase_client(url, key)
 
 print('=== 002594 cn_top10_sharehold 样本 ===')
 result = supabase.table('cn_top10_sharehold').select('*').eq('symbol', '002594').order('report_date', desc=True).limit(3).execute()
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""company_list 本地快照：股票代码 -> 交易所 / 公司名称
+
+整表分页读取一次写入 outputs/cache/company_list.json，在有效期内
+（默认 24 小时，环境变量 COMPANY_LIST_TTL_HOURS 可调）所有查询都在本地完成，
+批量下载几千只股票也不再逐只查询 Supabase。
+
+快照过期且刷新失败时继续使用旧快照；既无快照又无法连接 Supabase 时返回空表。
+快照中查不到的代码在快照超过 10 分钟时触发一次整表刷新。
+"""
+import os
+import json
+import time
+import threading
+from typing import Dict, Optional
+
+from dotenv import load_dotenv
+
+
+SNAPSHOT_PATH = os.path.join("outputs", "cache", "company_list.json")
+DEFAULT_TTL_HOURS = 24
+# 查不到的代码（可能是新上市）最多每 10 分钟触发一次整表刷新
+MISS_REFRESH_SECONDS = 600
+COLUMNS = "symbol,market,exchange,description"
+
+_lock = threading.Lock()
+_snapshot: Dict[str, object] = {}
+# 刷新失败后在此时间之前不再重试，避免每次查询都去连 Supabase
+_retry_after = 0.0
+
+
+def snapshot_ttl() -> float:
+    try:
+        return float(os.getenv("COMPANY_LIST_TTL_HOURS", DEFAULT_TTL_HOURS)) * 3600
+    except ValueError:
+        return DEFAULT_TTL_HOURS * 3600
+
+
+def fetch_company_list() -> Dict[str, Dict[str, Optional[str]]]:
+    """从 Supabase 分页读取整张 company_list"""
+    from supabase_clients import supabase_client
+
+    load_dotenv()
+    url = os.getenv("SUPABASE_URL")
+    key = os.getenv("SUPABASE_SERVICE_ROLE_KEY")
+    if not url or not key:
+        raise RuntimeError("缺少 SUPABASE_URL / SUPABASE_SERVICE_ROLE_KEY，无法加载 company_list")
+    supabase = supabase_client(url, key)
+    companies = {}
+    offset = 0
+    limit = 1000
+    while True:
+        resp = (
+            supabase.table("company_list")
+            .select(COLUMNS)
+            .order("symbol")
+            .range(offset, offset + limit - 1)
+            .execute()
+        )
+        if not resp.data:
+            break
+        for row in resp.data:
+            symbol = str(row.get("symbol") or "").strip()
+            if not symbol:
+                continue
+            # 同一代码出现在多个市场时优先保留 A 股记录
+            if symbol in companies and companies[symbol].get("market") == "cn":
+                continue
+            companies[symbol] = {
+                "market": row.get("market"),
+                "exchange": row.get("exchange"),
+                "description": row.get("description"),
+            }
+        if len(resp.data) < limit:
+            break
+        offset += limit
+    return companies
+
+
+def _read_snapshot_file() -> Dict[str, object]:
+    try:
+        with open(SNAPSHOT_PATH, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        if isinstance(data.get("companies"), dict):
+            return data
+    except Exception:
+        pass
+    return {}
+
+
+def _write_snapshot_file(data: Dict[str, object]) -> None:
+    try:
+        os.makedirs(os.path.dirname(SNAPSHOT_PATH), exist_ok=True)
+        tmp_path = f"{SNAPSHOT_PATH}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp_path, SNAPSHOT_PATH)
+    except Exception:
+        pass
+
+
+def load_company_list(refresh: bool = False) -> Dict[str, Dict[str, Optional[str]]]:
+    """返回 symbol -> {market, exchange, description}，按 TTL 复用内存 / 磁盘快照"""
+    global _snapshot, _retry_after
+    with _lock:
+        ttl = snapshot_ttl()
+        if not refresh and not _snapshot:
+            _snapshot = _read_snapshot_file()
+        if not refresh and _snapshot:
+            if time.time() - _snapshot["fetched_at"] < ttl or time.time() < _retry_after:
+                return _snapshot["companies"]
+
+        try:
+            _snapshot = {"fetched_at": time.time(), "companies": fetch_company_list()}
+            _write_snapshot_file(_snapshot)
+        except Exception as e:
+            _retry_after = time.time() + MISS_REFRESH_SECONDS
+            if not _snapshot:
+                print(f"company_list 加载失败: {e}")
+                _snapshot = {"fetched_at": 0.0, "companies": {}}
+            else:
+                print(f"company_list 刷新失败，继续使用旧快照: {e}")
+        return _snapshot["companies"]
+
+
+def lookup_company(symbol: str) -> Optional[Dict[str, Optional[str]]]:
+    """按代码查询公司信息，不存在时返回 None"""
+    symbol = str(symbol).strip()
+    row = load_company_list().get(symbol)
+    now = time.time()
+    if row is None and now - _snapshot["fetched_at"] >= MISS_REFRESH_SECONDS and now >= _retry_after:
+        row = load_company_list(refresh=True).get(symbol)
+    return row
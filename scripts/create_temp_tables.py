@@ -3,9 +3,10 @@
 Create temp tables for market data import using Supabase Management API.
 """
 import os
-import httpx
 from dotenv import load_dotenv
 
+from supabase_clients import http_client
+
 load_dotenv()
 
 SUPABASE_URL = os.getenv("SUPABASE_URL")
@@ -29,7 +30,7 @@ def execute_sql(sql: str) -> list:
         "Authorization": f"Bearer {SUPABASE_ACCESS_TOKEN}",
         "Content-Type": "application/json",
     }
-    resp = httpx.post(endpoint, json={"query": sql}, headers=headers, timeout=60.0)
+    resp = http_client().post(endpoint, json={"query": sql}, headers=headers, timeout=60.0)
     if resp.status_code not in (200, 201):
         raise RuntimeError(f"SQL 执行失败: {resp.status_code} - {resp.text}")
     return resp.json()
@@ -1,7 +1,8 @@
 import os
 import datetime as dt
 import pandas as pd
-import akshare as ak
+
+from akshare_cache import ak, cache_mode_from_argv, configure_akshare_cache
 
 
 def parse_args(argv):
@@ -21,6 +22,9 @@ def parse_args(argv):
 
 def main():
     symbol, years = parse_args(os.sys.argv[1:])
+    cache_mode = cache_mode_from_argv(os.sys.argv[1:])
+    if cache_mode:
+        configure_akshare_cache(cache_mode)
     df = ak.stock_value_em(symbol=symbol)
     if df.empty:
         print("未获取到市值数据")
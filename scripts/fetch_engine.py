@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+"""基于 asyncio 的下载引擎（fetch_stock_data.py --engine=async）
+
+阻塞的 AKShare / Supabase 调用通过 asyncio.to_thread 执行，每个上游站点
+（东方财富、巨潮、新浪）各有一个信号量限制同时在途的请求数。
+任务按单次接口调用调度，不再有「数据集线程 × 季度线程」的嵌套线程池，
+因此可以同时处理很多股票而不会压垮单个数据源。
+
+  --host-limits=eastmoney=8,cninfo=4,sina=4   各站点并发上限
+  --workers=N                                  同时处理的股票数上限
+"""
+import time
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+import pandas as pd
+
+import mkt_cap_store
+from akshare_cache import ak
+from fetch_stock_data import (
+    DATASET_LABELS,
+    DATASETS,
+    REPORT_DATE_CANDIDATES,
+    STATEMENT_ENDPOINTS,
+    STATEMENT_TYPES,
+    batch_summary,
+    build_top10_from_main,
+    combine_holder_count,
+    dataset_is_current,
+    filter_holder_snapshot,
+    get_company_info_from_supabase,
+    get_stored_report_dates,
+    holder_count_quarter_ends,
+    load_holder_count_snapshot,
+    market_prefixed_symbol,
+    read_holder_count_snapshot,
+    save_dataset,
+    save_long_table,
+    update_market_cap_store,
+    with_required_cols,
+)
+from symbol_format_memo import record_success, symbol_attempts
+from trace_spans import span
+
+
+# AKShare 接口 -> 上游站点
+ENDPOINT_HOSTS = {
+    "stock_balance_sheet_by_report_em": "eastmoney",
+    "stock_profit_sheet_by_report_em": "eastmoney",
+    "stock_cash_flow_sheet_by_report_em": "eastmoney",
+    "stock_value_em": "eastmoney",
+    "stock_hold_num_cninfo": "cninfo",
+    "stock_main_stock_holder": "sina",
+}
+
+# 各站点同时在途的请求上限（supabase 用于公司信息 / 已入库报告期查询）
+DEFAULT_HOST_LIMITS = {
+    "eastmoney": 8,
+    "cninfo": 4,
+    "sina": 4,
+    "supabase": 8,
+}
+
+
+def parse_host_limits(text: str) -> Dict[str, int]:
+    """解析 "eastmoney=8,cninfo=4"，未指定的站点使用默认值"""
+    limits = dict(DEFAULT_HOST_LIMITS)
+    for part in (text or "").split(","):
+        if not part.strip():
+            continue
+        host, _, value = part.partition("=")
+        host = host.strip().lower()
+        if host not in limits:
+            raise ValueError(f"未知站点: {host}（可选 {', '.join(limits)}）")
+        limits[host] = max(1, int(value))
+    return limits
+
+
+class AsyncFetchEngine:
+    """持有各站点的信号量；所有阻塞调用都经过 call_blocking"""
+
+    def __init__(self, host_limits: Optional[Dict[str, int]] = None):
+        self.host_limits = dict(host_limits or DEFAULT_HOST_LIMITS)
+        self.semaphores = {host: asyncio.Semaphore(n) for host, n in self.host_limits.items()}
+        self.stats = {host: {"calls": 0, "active": 0, "peak": 0} for host in self.host_limits}
+        # 同一季度的全市场股东人数快照只加载一次，并在本次运行中复用
+        self._snapshots: Dict[str, asyncio.Future] = {}
+
+    async def call_blocking(self, host: str, fn, *args, **kwargs) -> Any:
+        async with self.semaphores[host]:
+            stats = self.stats[host]
+            stats["calls"] += 1
+            stats["active"] += 1
+            stats["peak"] = max(stats["peak"], stats["active"])
+            try:
+                return await asyncio.to_thread(fn, *args, **kwargs)
+            finally:
+                stats["active"] -= 1
+
+    async def call(self, fn_name: str, *args, **kwargs) -> Any:
+        return await self.call_blocking(ENDPOINT_HOSTS[fn_name], getattr(ak, fn_name), *args, **kwargs)
+
+    async def call_with_fallback(self, fn_name: str, symbol: str, market: Optional[str]) -> Any:
+        """与 fetch_with_fallback 相同：先用记忆中的代码格式，异常或空表时换另一种格式"""
+        attempts = symbol_attempts(fn_name, symbol, market_prefixed_symbol(symbol, market))
+        form, code = attempts[0]
+        try:
+            df = await self.call(fn_name, code)
+            if isinstance(df, pd.DataFrame) and not df.empty:
+                record_success(fn_name, form, 0)
+                return df
+        except Exception:
+            pass
+        form, code = attempts[1]
+        df = await self.call(fn_name, code)
+        if isinstance(df, pd.DataFrame) and not df.empty:
+            record_success(fn_name, form, 1)
+        return df
+
+    async def holder_snapshot(self, date_str: str) -> Optional[pd.DataFrame]:
+        if date_str not in self._snapshots:
+            self._snapshots[date_str] = asyncio.ensure_future(self._load_snapshot(date_str))
+        return await self._snapshots[date_str]
+
+    async def _load_snapshot(self, date_str: str) -> Optional[pd.DataFrame]:
+        try:
+            # 本地缓存命中时不占用巨潮的并发名额
+            df = await asyncio.to_thread(read_holder_count_snapshot, date_str)
+            if df is None:
+                df = await self.call_blocking("cninfo", load_holder_count_snapshot, date_str)
+            return df
+        except Exception:
+            return None
+
+    async def fetch_holder_count(self, symbol: str, years: int) -> pd.DataFrame:
+        snapshots = await asyncio.gather(*[self.holder_snapshot(d) for d in holder_count_quarter_ends(years)])
+        all_data = [f for f in (filter_holder_snapshot(df, symbol) for df in snapshots) if f is not None]
+        return combine_holder_count(all_data)
+
+    async def fetch_dataset(self, key: str, symbol: str, market: Optional[str], years: int) -> pd.DataFrame:
+        """fetch_stock_data.fetch_dataset 的异步版本"""
+        if key in STATEMENT_TYPES:
+            df = await self.call_with_fallback(STATEMENT_ENDPOINTS[key], symbol, market)
+            return with_required_cols(df, REPORT_DATE_CANDIDATES)
+        if key == "mkt_cap":
+            if not mkt_cap_store.store_is_fresh(symbol):
+                raw = await self.call("stock_value_em", symbol=symbol)
+                await asyncio.to_thread(update_market_cap_store, symbol, raw, years)
+            return await asyncio.to_thread(mkt_cap_store.read_window, symbol, years)
+        if key == "top10":
+            main_holders = await self.call_with_fallback("stock_main_stock_holder", symbol, market)
+            return build_top10_from_main(main_holders, symbol, market)
+        if key == "holder_count":
+            return await self.fetch_holder_count(symbol, years)
+        raise ValueError(f"未知数据集: {key}")
+
+
+async def _run_async(symbols: List[str], years: int, workers: int,
+                     company_infos: Dict[str, Dict[str, Optional[str]]],
+                     incremental: bool, fmt: str,
+                     host_limits: Optional[Dict[str, int]]) -> Dict[str, Any]:
+    start_time = time.time()
+    engine = AsyncFetchEngine(host_limits)
+    # asyncio.to_thread 使用默认线程池，需大于各站点并发之和
+    asyncio.get_running_loop().set_default_executor(
+        ThreadPoolExecutor(max_workers=sum(engine.host_limits.values()) + 4))
+    symbol_slots = asyncio.Semaphore(workers)
+
+    errors: Dict[str, List[str]] = {}
+    failed_symbols = []
+    skipped = 0
+    completed = 0
+
+    async def run_symbol(symbol: str) -> None:
+        nonlocal skipped, completed
+        async with symbol_slots:
+            symbol_errors = []
+            info = company_infos.get(symbol)
+            if info is None:
+                info = await engine.call_blocking("supabase", get_company_info_from_supabase, symbol)
+            market = info.get("market")
+            stored = None
+            if incremental:
+                stored = await engine.call_blocking("supabase", get_stored_report_dates, symbol)
+
+            async def run_dataset(key: str):
+                nonlocal skipped
+                try:
+                    if dataset_is_current(key, stored):
+                        skipped += 1
+                        return (key, pd.DataFrame())
+                    with span("download", symbol=symbol, dataset=key) as s:
+                        df = await engine.fetch_dataset(key, symbol, market, years)
+                        s["rows"] = len(df)
+                    df = await asyncio.to_thread(save_dataset, key, df, symbol, stored, fmt)
+                    if df is None:
+                        skipped += 1
+                        df = pd.DataFrame()
+                    return (key, df)
+                except Exception as e:
+                    symbol_errors.append(f"{DATASET_LABELS[key]}: {e}")
+                    return (key, pd.DataFrame())
+
+            results = dict(await asyncio.gather(*[run_dataset(key) for key, _ in DATASETS]))
+            try:
+                await asyncio.to_thread(save_long_table, results, symbol, years, incremental, fmt)
+            except Exception as e:
+                symbol_errors.append(f"长表: {e}")
+
+        completed += 1
+        if symbol_errors:
+            errors[symbol] = symbol_errors
+        if len(symbol_errors) >= len(DATASETS):
+            failed_symbols.append(symbol)
+        status = "✓" if not symbol_errors else f"! {len(symbol_errors)} 项失败"
+        print(f"  [{completed}/{len(symbols)}] {symbol} {status}", flush=True)
+
+    limits_text = ", ".join(f"{h}={n}" for h, n in engine.host_limits.items())
+    print(f"=" * 50)
+    print(f"异步下载 {len(symbols)} 只股票，同时处理 {workers} 只，站点并发: {limits_text}")
+    print(f"=" * 50)
+
+    await asyncio.gather(*[run_symbol(symbol) for symbol in symbols])
+
+    summary = batch_summary(symbols, time.time() - start_time, errors, failed_symbols,
+                            skipped if incremental else None)
+    for host, stats in engine.stats.items():
+        if stats["calls"]:
+            print(f"  {host}: {stats['calls']} 次调用，峰值并发 {stats['peak']}/{engine.host_limits[host]}")
+    summary["hosts"] = engine.stats
+    return summary
+
+
+def run_async(symbols: List[str], years: int, workers: int,
+              company_infos: Optional[Dict[str, Dict[str, Optional[str]]]] = None,
+              incremental: bool = False, fmt: str = "csv",
+              host_limits: Optional[Dict[str, int]] = None) -> Dict[str, Any]:
+    """异步引擎入口，输出与 run_batch 相同的文件和汇总"""
+    return asyncio.run(_run_async(symbols, years, max(1, workers), dict(company_infos or {}),
+                                  incremental, fmt, host_limits))
@@ -1,23 +1,44 @@
 #!/usr/bin/env python3
 import os
 import sys
+import time
+import threading
 import datetime as dt
-from typing import List, Dict, Optional
+from typing import Any, List, Dict, Optional
 from concurrent.futures import ThreadPoolExecutor, as_completed
 
+import numpy as np
 import pandas as pd
-import akshare as ak
+from pandas.api.types import is_object_dtype, is_string_dtype
 from dotenv import load_dotenv
-from supabase import create_client
+
+from akshare_cache import ak, cache_mode_from_argv, cache_stats, configure_akshare_cache
+from company_list_cache import load_company_list, lookup_company
+import mkt_cap_store
+from pipeline_io import artifact_path, format_from_argv, write_artifact
+from supabase_clients import supabase_client
+from symbol_format_memo import memo_stats, record_success, save_memo, symbol_attempts
+from symbol_manifest import load_manifest, update_manifest
+from trace_spans import configure_trace, span, trace_from_argv, trace_path
 
 
 META_COLS = ["数据源", "是否审计", "公告日期", "币种", "类型", "更新日期"]
 REPORT_COL = "报告日"
 
+# 股东人数全市场季度快照缓存（Parquet，按季度末日期命名）
+HOLDER_COUNT_CACHE_DIR = os.path.join("outputs", "cache", "holder_count")
+# 季度结束后 120 天（年报披露截止 4/30）视为数据已披露完毕，此后下载的快照不再变化
+HOLDER_COUNT_SETTLE_DAYS = 120
+
 
 def parse_args(argv: List[str]) -> Dict[str, str]:
     symbol = "000333"
     years = "10"
+    symbols_file = ""
+    universe = ""
+    workers = "16"
+    engine = "threads"
+    host_limits = ""
     for i, a in enumerate(argv):
         if a == "--symbol" and i + 1 < len(argv):
             symbol = argv[i + 1].strip()
@@ -27,7 +48,39 @@ def parse_args(argv: List[str]) -> Dict[str, str]:
             years = argv[i + 1].strip()
         if a.startswith("--years="):
             years = a.split("=", 1)[1].strip()
-    return {"symbol": symbol, "years": years}
+        if a == "--symbols-file" and i + 1 < len(argv):
+            symbols_file = argv[i + 1].strip()
+        if a.startswith("--symbols-file="):
+            symbols_file = a.split("=", 1)[1].strip()
+        if a == "--universe" and i + 1 < len(argv):
+            universe = argv[i + 1].strip().lower()
+        if a.startswith("--universe="):
+            universe = a.split("=", 1)[1].strip().lower()
+        if a == "--workers" and i + 1 < len(argv):
+            workers = argv[i + 1].strip()
+        if a.startswith("--workers="):
+            workers = a.split("=", 1)[1].strip()
+        if a == "--engine" and i + 1 < len(argv):
+            engine = argv[i + 1].strip().lower()
+        if a.startswith("--engine="):
+            engine = a.split("=", 1)[1].strip().lower()
+        if a == "--host-limits" and i + 1 < len(argv):
+            host_limits = argv[i + 1].strip()
+        if a.startswith("--host-limits="):
+            host_limits = a.split("=", 1)[1].strip()
+    return {
+        "symbol": symbol,
+        "years": years,
+        "symbols_file": symbols_file,
+        "universe": universe,
+        "workers": workers,
+        "engine": engine,
+        "host_limits": host_limits,
+        "incremental": "1" if "--incremental" in argv else "",
+        "cache_mode": cache_mode_from_argv(argv) or "",
+        "format": format_from_argv(argv),
+        "trace": trace_from_argv(argv) or "",
+    }
 
 
 def normalize_symbol(symbol: str) -> str:
@@ -52,47 +105,72 @@ def market_prefixed_symbol(symbol: str, market: Optional[str]) -> str:
     return f"SZ{symbol}"
 
 
+def exchange_to_market(exchange: Optional[str]) -> Optional[str]:
+    exchange = str(exchange or "").upper()
+    if exchange == "SSE":
+        return "SH"
+    if exchange == "SZSE":
+        return "SZ"
+    return None
+
+
 def get_company_info_from_supabase(symbol: str) -> Dict[str, Optional[str]]:
-    load_dotenv()
-    url = os.getenv("SUPABASE_URL")
-    key = os.getenv("SUPABASE_SERVICE_ROLE_KEY")
-    if not url or not key:
-        return {"market": None, "name": None}
-    try:
-        supabase = create_client(url, key)
-        resp = (
-            supabase.table("company_list")
-            .select("exchange,description")
-            .eq("symbol", symbol)
-            .limit(1)
-            .execute()
-        )
-        if not resp.data:
-            return {"market": None, "name": None}
-        exchange = str(resp.data[0].get("exchange") or "").upper()
-        name = resp.data[0].get("description")
-        if exchange == "SSE":
-            return {"market": "SH", "name": name}
-        if exchange == "SZSE":
-            return {"market": "SZ", "name": name}
-        return {"market": None, "name": name}
-    except Exception:
+    """从 company_list 本地快照解析交易所和公司名称（快照过期时整表刷新一次）"""
+    row = lookup_company(symbol)
+    if not row:
         return {"market": None, "name": None}
+    return {"market": exchange_to_market(row.get("exchange")), "name": row.get("description")}
+
+
+def load_cn_universe() -> Dict[str, Dict[str, Optional[str]]]:
+    """从 company_list 快照取出全部 A 股（SSE/SZSE），返回 symbol -> 公司信息"""
+    companies = load_company_list()
+    if not companies:
+        raise RuntimeError("company_list 为空（检查 SUPABASE_URL / SUPABASE_SERVICE_ROLE_KEY），无法加载 A 股列表")
+    universe = {}
+    for raw_symbol in sorted(companies):
+        row = companies[raw_symbol]
+        if row.get("market") != "cn" or str(row.get("exchange") or "").upper() not in ("SSE", "SZSE"):
+            continue
+        universe[normalize_symbol(raw_symbol)] = {
+            "market": exchange_to_market(row.get("exchange")),
+            "name": row.get("description"),
+        }
+    return universe
+
+
+def read_symbols_file(path: str) -> List[str]:
+    """读取股票列表文件：每行一个或逗号分隔，支持 # 注释，保持顺序去重"""
+    symbols = []
+    seen = set()
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.split("#", 1)[0]
+            for part in line.replace(",", " ").split():
+                symbol = normalize_symbol(part)
+                if symbol and symbol not in seen:
+                    seen.add(symbol)
+                    symbols.append(symbol)
+    return symbols
 
 
 def fetch_with_fallback(fetch_fn, symbol: str, market: Optional[str]):
+    """先用该接口记忆中的代码格式请求，异常或空表时改用另一种格式（6 位代码 / 带市场前缀）"""
+    fn_name = getattr(fetch_fn, "__name__", str(fetch_fn))
+    attempts = symbol_attempts(fn_name, symbol, market_prefixed_symbol(symbol, market))
+    form, code = attempts[0]
     try:
-        df = fetch_fn(symbol)
+        df = fetch_fn(code)
         if isinstance(df, pd.DataFrame) and not df.empty:
+            record_success(fn_name, form, 0)
             return df
     except Exception:
         pass
-    alt = market_prefixed_symbol(symbol, market)
-    try:
-        df = fetch_fn(alt)
-        return df
-    except Exception as err:
-        raise err
+    form, code = attempts[1]
+    df = fetch_fn(code)
+    if isinstance(df, pd.DataFrame) and not df.empty:
+        record_success(fn_name, form, 1)
+    return df
 
 
 def with_required_cols(df: pd.DataFrame, report_col_candidates: List[str]) -> pd.DataFrame:
@@ -162,29 +240,101 @@ def filter_by_years(df: pd.DataFrame, years: int = 10) -> pd.DataFrame:
     return df
 
 
-def save_financial_csv(df: pd.DataFrame, path: str, years: int = 10) -> None:
+def latest_quarter_end(today: Optional[dt.date] = None) -> str:
+    """今天之前（不含今天）最近的季度末日期 YYYYMMDD，即最新可能已披露的报告期"""
+    today = today or dt.date.today()
+    for year in (today.year, today.year - 1):
+        for md in ("1231", "0930", "0630", "0331"):
+            d = dt.datetime.strptime(f"{year}{md}", "%Y%m%d").date()
+            if d < today:
+                return d.strftime("%Y%m%d")
+    return f"{today.year - 1}1231"
+
+
+def get_stored_report_dates(symbol: str) -> Dict[str, str]:
+    """已入库的各报表最新报告期 {报表类型: YYYYMMDD}：优先本地清单，否则查询 company_financials_long"""
+    latest = load_manifest(symbol).get("financials_latest")
+    if latest:
+        return dict(latest)
+    load_dotenv()
+    url = os.getenv("SUPABASE_URL")
+    key = os.getenv("SUPABASE_SERVICE_ROLE_KEY")
+    if not url or not key:
+        return {}
+    latest = {}
+    try:
+        supabase = supabase_client(url, key)
+        for statement_type in STATEMENT_TYPES.values():
+            resp = (
+                supabase.table("company_financials_long")
+                .select("report_date")
+                .eq("symbol", symbol)
+                .eq("statement_type", statement_type)
+                .order("report_date", desc=True)
+                .limit(1)
+                .execute()
+            )
+            if resp.data:
+                latest[statement_type] = format_report_date(resp.data[0].get("report_date"))
+    except Exception:
+        return {}
+    return latest
+
+
+def only_new_periods(df: pd.DataFrame, latest: Optional[str]) -> pd.DataFrame:
+    """只保留报告期晚于 latest（YYYYMMDD）的行"""
+    if not latest or df.empty:
+        return df
+    report_dates = df[REPORT_COL].apply(format_report_date)
+    return df[report_dates.notna() & (report_dates > latest)]
+
+
+def save_financial_statement(df: pd.DataFrame, symbol: str, key: str, years: int = 10,
+                             fmt: str = "csv") -> str:
     df = filter_by_years(df, years)
     df[REPORT_COL] = df[REPORT_COL].apply(format_report_date)
-    df.to_csv(path, index=False)
+    return write_artifact(df, symbol, key, fmt)
+
+
+# 三大报表对应的 AKShare 接口（东方财富）
+STATEMENT_ENDPOINTS = {
+    "balance": "stock_balance_sheet_by_report_em",
+    "income": "stock_profit_sheet_by_report_em",
+    "cash_flow": "stock_cash_flow_sheet_by_report_em",
+}
+REPORT_DATE_CANDIDATES = ["报告期", "报告日期", "报告日", "REPORT_DATE"]
+
+
+def fetch_statement(key: str, symbol: str, market: Optional[str]) -> pd.DataFrame:
+    df = fetch_with_fallback(getattr(ak, STATEMENT_ENDPOINTS[key]), symbol, market)
+    return with_required_cols(df, REPORT_DATE_CANDIDATES)
 
 
 def fetch_balance_sheet(symbol: str, market: Optional[str]) -> pd.DataFrame:
-    df = fetch_with_fallback(ak.stock_balance_sheet_by_report_em, symbol, market)
-    return with_required_cols(df, ["报告期", "报告日期", "报告日", "REPORT_DATE"])
+    return fetch_statement("balance", symbol, market)
 
 
 def fetch_income_statement(symbol: str, market: Optional[str]) -> pd.DataFrame:
-    df = fetch_with_fallback(ak.stock_profit_sheet_by_report_em, symbol, market)
-    return with_required_cols(df, ["报告期", "报告日期", "报告日", "REPORT_DATE"])
+    return fetch_statement("income", symbol, market)
 
 
 def fetch_cash_flow(symbol: str, market: Optional[str]) -> pd.DataFrame:
-    df = fetch_with_fallback(ak.stock_cash_flow_sheet_by_report_em, symbol, market)
-    return with_required_cols(df, ["报告期", "报告日期", "报告日", "REPORT_DATE"])
+    return fetch_statement("cash_flow", symbol, market)
 
 
 def fetch_market_cap(symbol: str, years: int) -> pd.DataFrame:
-    df = ak.stock_value_em(symbol=symbol)
+    """日市值：新交易日追加到本地存储，返回存储中最近 years 年的数据"""
+    if not mkt_cap_store.store_is_fresh(symbol):
+        update_market_cap_store(symbol, ak.stock_value_em(symbol=symbol), years)
+    return mkt_cap_store.read_window(symbol, years)
+
+
+def update_market_cap_store(symbol: str, raw: pd.DataFrame, years: int) -> int:
+    """把接口返回的完整序列中晚于最后存储日期的行追加到存储，返回新增行数"""
+    return len(mkt_cap_store.append_store(symbol, process_market_cap(raw, years)))
+
+
+def process_market_cap(df: pd.DataFrame, years: int) -> pd.DataFrame:
     if df.empty:
         return df
     df = df.rename(columns={"数据日期": "date", "总市值": "total_mv"})
@@ -224,8 +374,74 @@ def build_top10_from_main(df: pd.DataFrame, symbol: str, market: Optional[str])
     return df[cols]
 
 
-def fetch_holder_count(symbol: str, years: int = 10) -> pd.DataFrame:
-    """从巨潮资讯获取股东人数集中度数据（并行加速版）"""
+_holder_snapshot_locks: Dict[str, threading.Lock] = {}
+_holder_snapshot_locks_guard = threading.Lock()
+
+
+def _holder_snapshot_lock(date_str: str) -> threading.Lock:
+    with _holder_snapshot_locks_guard:
+        if date_str not in _holder_snapshot_locks:
+            _holder_snapshot_locks[date_str] = threading.Lock()
+        return _holder_snapshot_locks[date_str]
+
+
+def holder_snapshot_is_final(date_str: str, fetched_on: dt.date) -> bool:
+    """快照是否在该季度披露截止之后下载（即不可变）"""
+    quarter_end = dt.datetime.strptime(date_str, "%Y%m%d").date()
+    return fetched_on >= quarter_end + dt.timedelta(days=HOLDER_COUNT_SETTLE_DAYS)
+
+
+def holder_snapshot_path(date_str: str) -> str:
+    return os.path.join(HOLDER_COUNT_CACHE_DIR, f"{date_str}.parquet")
+
+
+def read_holder_count_snapshot(date_str: str) -> Optional[pd.DataFrame]:
+    """读取可复用的本地季度快照；不存在、未披露完毕且不是今天下载的、或读取失败时返回 None"""
+    path = holder_snapshot_path(date_str)
+    if not os.path.exists(path):
+        return None
+    fetched_on = dt.date.fromtimestamp(os.path.getmtime(path))
+    if not (holder_snapshot_is_final(date_str, fetched_on) or fetched_on >= dt.date.today()):
+        return None
+    try:
+        return pd.read_parquet(path)
+    except Exception:
+        return None
+
+
+def load_holder_count_snapshot(date_str: str) -> pd.DataFrame:
+    """获取某季度末的全市场股东人数快照，优先读取本地 Parquet 缓存
+
+    已披露完毕的季度快照永久复用；仍在披露期内的季度每天最多重新下载一次。
+    同一季度的并发请求只会触发一次下载。
+    """
+    path = holder_snapshot_path(date_str)
+    with _holder_snapshot_lock(date_str):
+        df = read_holder_count_snapshot(date_str)
+        if df is not None:
+            return df
+
+        df = ak.stock_hold_num_cninfo(date=date_str)
+        if df is None:
+            df = pd.DataFrame()
+        try:
+            os.makedirs(HOLDER_COUNT_CACHE_DIR, exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            df.to_parquet(tmp_path, index=False)
+            os.replace(tmp_path, path)
+        except Exception:
+            pass
+        return df
+
+
+HOLDER_COUNT_COLUMNS = [
+    "证券代码", "证券简称", "变动日期", "本期股东人数", "上期股东人数",
+    "股东人数增幅", "本期人均持股数量", "上期人均持股数量", "人均持股数量增幅"
+]
+
+
+def holder_count_quarter_ends(years: int = 10) -> List[str]:
+    """需要查询的季度末日期（巨潮数据从 2017Q1 开始）"""
     quarter_ends = []
     today = dt.datetime.now()
     for y in range(years + 1):
@@ -234,206 +450,256 @@ def fetch_holder_count(symbol: str, years: int = 10) -> pd.DataFrame:
             date_str = f"{year}{q}"
             if int(date_str) >= 20170331 and int(date_str) <= int(today.strftime("%Y%m%d")):
                 quarter_ends.append(date_str)
-    
+    return quarter_ends
+
+
+def filter_holder_snapshot(df: Optional[pd.DataFrame], symbol: str) -> Optional[pd.DataFrame]:
+    """从全市场快照中取出单只股票的行，没有数据时返回 None"""
+    if df is None or df.empty:
+        return None
+    filtered = df[df["证券代码"] == symbol]
+    return filtered if not filtered.empty else None
+
+
+def combine_holder_count(all_data: List[pd.DataFrame]) -> pd.DataFrame:
+    if not all_data:
+        return pd.DataFrame(columns=HOLDER_COUNT_COLUMNS)
+    result = pd.concat(all_data, ignore_index=True)
+    result = result.drop_duplicates(subset=["证券代码", "变动日期"])
+    result = result.sort_values("变动日期")
+    return result
+
+
+def fetch_holder_count(symbol: str, years: int = 10, max_workers: int = 8) -> pd.DataFrame:
+    """从巨潮资讯获取股东人数集中度数据（并行加速版，季度快照本地缓存）"""
+    quarter_ends = holder_count_quarter_ends(years)
+
     def fetch_single_quarter(date_str: str):
         """获取单个季度的数据"""
         try:
-            df = ak.stock_hold_num_cninfo(date=date_str)
-            if df is not None and not df.empty:
-                filtered = df[df["证券代码"] == symbol]
-                if not filtered.empty:
-                    return filtered
+            return filter_holder_snapshot(load_holder_count_snapshot(date_str), symbol)
         except Exception:
-            pass
-        return None
-    
+            return None
+
     all_data = []
-    # 使用线程池并行获取数据，最多8个并发
-    with ThreadPoolExecutor(max_workers=8) as executor:
+    # 使用线程池并行获取数据，默认最多8个并发（批量模式下由全局并发上限控制）
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
         futures = {executor.submit(fetch_single_quarter, d): d for d in quarter_ends}
         for future in as_completed(futures):
             result = future.result()
             if result is not None:
                 all_data.append(result)
-    
-    if not all_data:
-        return pd.DataFrame(columns=[
-            "证券代码", "证券简称", "变动日期", "本期股东人数", "上期股东人数",
-            "股东人数增幅", "本期人均持股数量", "上期人均持股数量", "人均持股数量增幅"
-        ])
-    
-    result = pd.concat(all_data, ignore_index=True)
-    result = result.drop_duplicates(subset=["证券代码", "变动日期"])
-    result = result.sort_values("变动日期")
-    return result
+
+    return combine_holder_count(all_data)
+
+
+# 长表中不作为财务科目展开的字段（元数据/文本字段）
+LONG_EXCLUDE_COLS = set([REPORT_COL] + META_COLS + [
+    "SECUCODE", "SECURITY_CODE", "SECURITY_NAME_ABBR", "ORG_CODE", "ORG_TYPE",
+    "REPORT_TYPE_CODE", "DATE_TYPE_CODE", "REPORT_DATE_NAME", "SECURITY_TYPE_CODE",
+    "TRADE_MARKET_CODE", "CURRENCY", "STD_ITEM_CODE", "OPINION_TYPE",
+    "BZ", "MBI", "YEAR_TYPE",
+])
+LONG_COLUMNS = ["股票代码", "报告日", "报表类型", "财务科目", "数值"] + META_COLS
+# 字符串值去掉这些字符后须全为数字才保留（如 "1.5e-3"），否则视为文本跳过
+NUMERIC_STR_STRIP = r"[.\-eE]"
+
+
+def numeric_value_mask(df: pd.DataFrame) -> np.ndarray:
+    """返回与 df 同形状的布尔矩阵：非字符串值保留，字符串值仅保留形如数字的"""
+    keep = np.ones(df.shape, dtype=bool)
+    # 数值/日期等类型的列不可能包含字符串，只需检查 object / string 列
+    text_cols = [j for j, dtype in enumerate(df.dtypes) if is_object_dtype(dtype) or is_string_dtype(dtype)]
+    for j in text_cols:
+        col = df.iloc[:, j]
+        is_str = col.map(lambda v: isinstance(v, str), na_action="ignore").fillna(False).astype(bool)
+        if not is_str.any():
+            continue
+        digits = col[is_str].astype(str).str.replace(NUMERIC_STR_STRIP, "", regex=True).str.isdigit()
+        col_keep = pd.Series(True, index=col.index)
+        col_keep[is_str] = digits.astype(bool)
+        keep[:, j] = col_keep.to_numpy()
+    return keep
 
 
 def wide_to_long(df: pd.DataFrame, symbol: str, statement_type: str) -> pd.DataFrame:
-    # Exclude metadata columns that contain non-numeric data
-    exclude_cols = set([REPORT_COL] + META_COLS + [
-        "SECUCODE", "SECURITY_CODE", "SECURITY_NAME_ABBR", "ORG_CODE", "ORG_TYPE",
-        "REPORT_TYPE_CODE", "DATE_TYPE_CODE", "REPORT_DATE_NAME", "SECURITY_TYPE_CODE",
-        "TRADE_MARKET_CODE", "CURRENCY", "STD_ITEM_CODE", "OPINION_TYPE",
-        "BZ", "MBI", "YEAR_TYPE",
-    ])
-    data_cols = [c for c in df.columns if c not in exclude_cols]
-    rows = []
-    for _, row in df.iterrows():
-        report_date = row.get(REPORT_COL)
-        for col in data_cols:
-            val = row.get(col)
-            # Skip non-numeric values
-            if isinstance(val, str) and not val.replace('.', '').replace('-', '').replace('e', '').replace('E', '').isdigit():
-                continue
-            rows.append({
-                "股票代码": symbol,
-                "报告日": report_date,
-                "报表类型": statement_type,
-                "财务科目": col,
-                "数值": val,
-                "数据源": row.get("数据源"),
-                "是否审计": row.get("是否审计"),
-                "公告日期": row.get("公告日期"),
-                "币种": row.get("币种"),
-                "类型": row.get("类型"),
-                "更新日期": row.get("更新日期"),
-            })
-    return pd.DataFrame(rows)
+    """宽表（报告期 × 科目）转长表（每个报告期 × 科目一行）
+
+    列式实现：按行优先展开（等价于 stack，保持报告期内的科目顺序），
+    用布尔矩阵一次性过滤非数值文本，再按行号取报告日和元数据列。
+    """
+    # 按位置选列，避免重复列名被 df[cols] 展开
+    positions = [i for i, c in enumerate(df.columns) if c not in LONG_EXCLUDE_COLS]
+    if df.empty or not positions:
+        return pd.DataFrame(columns=LONG_COLUMNS)
+
+    data = df.iloc[:, positions]
+    data_cols = list(data.columns)
+    n_rows, n_cols = data.shape
+    keep = numeric_value_mask(data).ravel()
+    row_idx = np.repeat(np.arange(n_rows), n_cols)[keep]
+    col_idx = np.tile(np.arange(n_cols), n_rows)[keep]
+
+    def take(col: str) -> np.ndarray:
+        if col not in df.columns:
+            return np.full(len(row_idx), None, dtype=object)
+        return df[col].to_numpy(dtype=object)[row_idx]
+
+    long_df = pd.DataFrame({
+        "股票代码": symbol,
+        "报告日": take(REPORT_COL),
+        "报表类型": statement_type,
+        "财务科目": np.asarray(data_cols, dtype=object)[col_idx],
+        "数值": data.to_numpy(dtype=object).ravel()[keep],
+        **{col: take(col) for col in META_COLS},
+    }, columns=LONG_COLUMNS)
+    return long_df.infer_objects()
+
+
+# 数据集：key（即 pipeline_io 中的产物名） -> 中文名称
+DATASETS = [
+    ("balance", "资产负债表"),
+    ("income", "利润表"),
+    ("cash_flow", "现金流量表"),
+    ("mkt_cap", "市值历史"),
+    ("top10", "前十大股东"),
+    ("holder_count", "股东人数集中度"),
+]
+DATASET_LABELS = dict(DATASETS)
+STATEMENT_TYPES = {"balance": "资产负债表", "income": "利润表", "cash_flow": "现金流量表"}
+
+
+def dataset_is_current(key: str, stored: Optional[Dict[str, str]]) -> bool:
+    """增量模式下该财务报表是否已入库最新季度（无需下载）"""
+    if key not in STATEMENT_TYPES or stored is None:
+        return False
+    latest = stored.get(STATEMENT_TYPES[key])
+    return bool(latest and latest >= latest_quarter_end())
+
+
+def fetch_dataset(key: str, symbol: str, market: Optional[str], years: int,
+                  holder_workers: int = 8) -> pd.DataFrame:
+    """下载单个数据集并整理为待写出的 DataFrame（不写文件）"""
+    if key in STATEMENT_TYPES:
+        return fetch_statement(key, symbol, market)
+    if key == "mkt_cap":
+        return fetch_market_cap(symbol, years)
+    if key == "top10":
+        main_holders = fetch_main_stock_holder(symbol, market)
+        return build_top10_from_main(main_holders, symbol, market)
+    if key == "holder_count":
+        return fetch_holder_count(symbol, years, max_workers=holder_workers)
+    raise ValueError(f"未知数据集: {key}")
+
+
+def save_dataset(key: str, df: pd.DataFrame, symbol: str,
+                 stored: Optional[Dict[str, str]] = None,
+                 fmt: str = "csv") -> Optional[pd.DataFrame]:
+    """写出 fetch_dataset 的结果，返回用于合并长表的 DataFrame
+
+    stored 不为 None 时为增量模式：财务报表只返回晚于已入库报告期的行，
+    没有新报告期时返回 None（不写文件）。
+    """
+    if key in STATEMENT_TYPES:
+        if stored is not None:
+            new_df = only_new_periods(df, stored.get(STATEMENT_TYPES[key]))
+            if new_df.empty:
+                return None
+            save_financial_statement(df, symbol, key, fmt=fmt)
+            return new_df
+        save_financial_statement(df, symbol, key, fmt=fmt)
+    else:
+        write_artifact(df, symbol, key, fmt)
+    return df
 
 
-def main():
-    import time
+def download_dataset(key: str, symbol: str, market: Optional[str], years: int,
+                     holder_workers: int = 8,
+                     stored: Optional[Dict[str, str]] = None,
+                     fmt: str = "csv") -> Optional[pd.DataFrame]:
+    """下载单个数据集并写出该股票对应的文件，返回原始 DataFrame
+
+    增量模式下若已入库最新季度则连下载都跳过，返回 None。
+    """
+    if dataset_is_current(key, stored):
+        return None
+    with span("download", symbol=symbol, dataset=key) as s:
+        df = fetch_dataset(key, symbol, market, years, holder_workers)
+        s["rows"] = len(df)
+    return save_dataset(key, df, symbol, stored, fmt)
+
+
+def save_long_table(results: Dict[str, pd.DataFrame], symbol: str, years: int,
+                    incremental: bool = False, fmt: str = "csv") -> str:
+    """合并三大财务报表为长表并写出 CSV，返回文件路径
+
+    增量模式下长表只包含新报告期，清单中标记为 incremental，上传时不会先删除旧数据。
+    """
+    with span("long_table", symbol=symbol) as s:
+        combined = pd.concat([
+            wide_to_long(results.get("balance", pd.DataFrame()), symbol, "资产负债表"),
+            wide_to_long(results.get("income", pd.DataFrame()), symbol, "利润表"),
+            wide_to_long(results.get("cash_flow", pd.DataFrame()), symbol, "现金流量表"),
+        ], ignore_index=True)
+        combined = combined.rename(columns={"报告日": REPORT_COL})
+        combined = filter_by_years(combined, years)
+        combined = combined.rename(columns={REPORT_COL: "报告日"})
+        s["rows"] = len(combined)
+    combined_path = write_artifact(combined, symbol, "financials_long", fmt)
+    update_manifest(symbol, long_table="incremental" if incremental else "full")
+    return combined_path
+
+
+def run_single(symbol: str, years: int, incremental: bool = False, fmt: str = "csv") -> None:
     start_time = time.time()
-    
-    args = parse_args(sys.argv[1:])
-    symbol = normalize_symbol(args["symbol"])
-    years = int(args["years"])
+
     company_info = get_company_info_from_supabase(symbol)
     market = company_info.get("market")
     name = company_info.get("name")
+    stored = get_stored_report_dates(symbol) if incremental else None
 
-    os.makedirs("outputs", exist_ok=True)
-    
     print(f"=" * 50)
     print(f"开始并行下载 {symbol} ({name or '未知'}) 数据...")
     print(f"=" * 50)
 
-    # 定义所有下载任务
     results = {}
     errors = []
-    
-    def download_balance_sheet():
-        try:
-            t0 = time.time()
-            df = fetch_balance_sheet(symbol, market)
-            path = os.path.join("outputs", f"{symbol}_balance_sheet_10y.csv")
-            save_financial_csv(df, path)
-            print(f"  [✓] 资产负债表 ({time.time()-t0:.1f}s)", flush=True)
-            return ("balance", df, path)
-        except Exception as e:
-            errors.append(f"资产负债表: {e}")
-            return ("balance", pd.DataFrame(), None)
-    
-    def download_income_statement():
-        try:
-            t0 = time.time()
-            df = fetch_income_statement(symbol, market)
-            path = os.path.join("outputs", f"{symbol}_income_statement_10y.csv")
-            save_financial_csv(df, path)
-            print(f"  [✓] 利润表 ({time.time()-t0:.1f}s)", flush=True)
-            return ("income", df, path)
-        except Exception as e:
-            errors.append(f"利润表: {e}")
-            return ("income", pd.DataFrame(), None)
-    
-    def download_cash_flow():
-        try:
-            t0 = time.time()
-            df = fetch_cash_flow(symbol, market)
-            path = os.path.join("outputs", f"{symbol}_cash_flow_10y.csv")
-            save_financial_csv(df, path)
-            print(f"  [✓] 现金流量表 ({time.time()-t0:.1f}s)", flush=True)
-            return ("cash_flow", df, path)
-        except Exception as e:
-            errors.append(f"现金流量表: {e}")
-            return ("cash_flow", pd.DataFrame(), None)
-    
-    def download_mkt_cap():
-        try:
-            t0 = time.time()
-            df = fetch_market_cap(symbol, years)
-            path = os.path.join("outputs", f"{symbol}_mkt_cap_10y.csv")
-            df.to_csv(path, index=False)
-            print(f"  [✓] 市值历史 ({time.time()-t0:.1f}s)", flush=True)
-            return ("mkt_cap", df, path)
-        except Exception as e:
-            errors.append(f"市值历史: {e}")
-            return ("mkt_cap", pd.DataFrame(), None)
-    
-    def download_top10():
-        try:
-            t0 = time.time()
-            main_holders = fetch_main_stock_holder(symbol, market)
-            df = build_top10_from_main(main_holders, symbol, market)
-            path = os.path.join("outputs", f"{symbol}_top10_shareholders_10y.csv")
-            df.to_csv(path, index=False)
-            print(f"  [✓] 前十大股东 ({time.time()-t0:.1f}s)", flush=True)
-            return ("top10", df, path)
-        except Exception as e:
-            errors.append(f"前十大股东: {e}")
-            return ("top10", pd.DataFrame(), None)
-    
-    def download_holder_count():
+    paths = {}
+
+    def download(key: str):
+        label = DATASET_LABELS[key]
         try:
             t0 = time.time()
-            df = fetch_holder_count(symbol, years)
-            path = os.path.join("outputs", f"{symbol}_holder_count_concentration_10y.csv")
-            df.to_csv(path, index=False)
-            print(f"  [✓] 股东人数集中度 ({time.time()-t0:.1f}s)", flush=True)
-            return ("holder_count", df, path)
+            df = download_dataset(key, symbol, market, years, stored=stored, fmt=fmt)
+            if df is None:
+                print(f"  [=] {label} 无新报告期，跳过 ({time.time()-t0:.1f}s)", flush=True)
+                return (key, pd.DataFrame(), None)
+            print(f"  [✓] {label} ({time.time()-t0:.1f}s)", flush=True)
+            return (key, df, artifact_path(symbol, key, fmt))
         except Exception as e:
-            errors.append(f"股东人数集中度: {e}")
-            return ("holder_count", pd.DataFrame(), None)
-    
+            errors.append(f"{label}: {e}")
+            return (key, pd.DataFrame(), None)
+
     # 并行执行所有下载任务
     print("并行下载中...", flush=True)
-    download_tasks = [
-        download_balance_sheet,
-        download_income_statement,
-        download_cash_flow,
-        download_mkt_cap,
-        download_top10,
-        download_holder_count,
-    ]
-    
-    paths = {}
-    with ThreadPoolExecutor(max_workers=6) as executor:
-        futures = [executor.submit(task) for task in download_tasks]
+    with ThreadPoolExecutor(max_workers=len(DATASETS)) as executor:
+        futures = [executor.submit(download, key) for key, _ in DATASETS]
         for future in as_completed(futures):
             key, df, path = future.result()
             results[key] = df
             if path:
                 paths[key] = path
-    
+
     download_time = time.time() - start_time
     print(f"下载完成，耗时: {download_time:.1f}s", flush=True)
-    
+
     if errors:
         print(f"下载错误: {errors}")
-    
+
     # 合并财务报表为长表
     t0 = time.time()
     print("合并财务报表为长表...", end=" ", flush=True)
-    combined = pd.concat([
-        wide_to_long(results.get("balance", pd.DataFrame()), symbol, "资产负债表"),
-        wide_to_long(results.get("income", pd.DataFrame()), symbol, "利润表"),
-        wide_to_long(results.get("cash_flow", pd.DataFrame()), symbol, "现金流量表"),
-    ], ignore_index=True)
-    combined = combined.rename(columns={"报告日": REPORT_COL})
-    combined = filter_by_years(combined, years)
-    combined = combined.rename(columns={REPORT_COL: "报告日"})
-    combined_path = os.path.join("outputs", f"{symbol}_financials_10y_long_combined.csv")
-    combined.to_csv(combined_path, index=False)
+    combined_path = save_long_table(results, symbol, years, incremental, fmt)
     print(f"完成 ({time.time()-t0:.1f}s)")
 
     total_time = time.time() - start_time
@@ -446,5 +712,173 @@ def main():
     print(f"  - {combined_path}")
 
 
+def run_batch(symbols: List[str], years: int, workers: int,
+              company_infos: Optional[Dict[str, Dict[str, Optional[str]]]] = None,
+              incremental: bool = False, fmt: str = "csv") -> Dict[str, Any]:
+    """批量模式：所有 (股票 × 数据集) 任务共享一个全局线程池，并发数上限为 workers"""
+    start_time = time.time()
+    company_infos = dict(company_infos or {})
+    info_lock = threading.Lock()
+
+    def resolve_info(symbol: str) -> Dict[str, Optional[str]]:
+        with info_lock:
+            info = company_infos.get(symbol)
+        if info is None:
+            info = get_company_info_from_supabase(symbol)
+            with info_lock:
+                company_infos[symbol] = info
+        return info
+
+    stored_dates = {}
+
+    def resolve_stored(symbol: str) -> Optional[Dict[str, str]]:
+        if not incremental:
+            return None
+        with info_lock:
+            stored = stored_dates.get(symbol)
+        if stored is None:
+            stored = get_stored_report_dates(symbol)
+            with info_lock:
+                stored_dates[symbol] = stored
+        return stored
+
+    skipped = 0
+
+    def run_task(symbol: str, key: str):
+        nonlocal skipped
+        try:
+            market = resolve_info(symbol).get("market")
+            stored = resolve_stored(symbol) if key in STATEMENT_TYPES else None
+            # 批量模式下股东人数任务不再嵌套并发，保证全局并发上限
+            df = download_dataset(key, symbol, market, years, holder_workers=1,
+                                  stored=stored, fmt=fmt)
+            if df is None:
+                with info_lock:
+                    skipped += 1
+                df = pd.DataFrame()
+            return (symbol, key, df, None)
+        except Exception as e:
+            return (symbol, key, pd.DataFrame(), f"{DATASET_LABELS[key]}: {e}")
+
+    print(f"=" * 50)
+    print(f"批量下载 {len(symbols)} 只股票，{len(symbols) * len(DATASETS)} 个任务，全局并发 {workers}")
+    print(f"=" * 50)
+
+    pending = {symbol: len(DATASETS) for symbol in symbols}
+    results = {symbol: {} for symbol in symbols}
+    errors = {}
+    completed = 0
+    failed_symbols = []
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        # 按股票顺序提交，先到的股票先完成，长表可以尽早写出并释放内存
+        futures = [
+            executor.submit(run_task, symbol, key)
+            for symbol in symbols
+            for key, _ in DATASETS
+        ]
+        for future in as_completed(futures):
+            symbol, key, df, err = future.result()
+            results[symbol][key] = df
+            if err:
+                errors.setdefault(symbol, []).append(err)
+            pending[symbol] -= 1
+            if pending[symbol] > 0:
+                continue
+
+            try:
+                save_long_table(results.pop(symbol), symbol, years, incremental, fmt)
+            except Exception as e:
+                errors.setdefault(symbol, []).append(f"长表: {e}")
+            completed += 1
+            symbol_errors = errors.get(symbol, [])
+            if len(symbol_errors) >= len(DATASETS):
+                failed_symbols.append(symbol)
+            status = "✓" if not symbol_errors else f"! {len(symbol_errors)} 项失败"
+            print(f"  [{completed}/{len(symbols)}] {symbol} {status}", flush=True)
+
+    return batch_summary(symbols, time.time() - start_time, errors, failed_symbols,
+                         skipped if incremental else None)
+
+
+def batch_summary(symbols: List[str], elapsed: float, errors: Dict[str, List[str]],
+                  failed_symbols: List[str], skipped: Optional[int] = None) -> Dict[str, Any]:
+    """打印批量下载汇总，skipped 为增量模式下跳过的数据集数量"""
+    throughput = len(symbols) / (elapsed / 60) if elapsed > 0 else 0.0
+    partial = [s for s in errors if s not in failed_symbols]
+    print(f"=" * 50)
+    print(f"批量下载完成！总耗时: {elapsed:.1f}秒")
+    print(f"  股票总数: {len(symbols)}  成功: {len(symbols) - len(errors)}  "
+          f"部分失败: {len(partial)}  全部失败: {len(failed_symbols)}")
+    if skipped is not None:
+        print(f"  增量模式: {skipped} 个财务报表数据集无新报告期，已跳过")
+    print(f"  吞吐量: {throughput:.1f} 只/分钟")
+    print(f"=" * 50)
+    for symbol in errors:
+        print(f"  {symbol}: {errors[symbol]}")
+    return {
+        "symbols": len(symbols),
+        "elapsed": elapsed,
+        "symbols_per_minute": throughput,
+        "errors": errors,
+    }
+
+
+def main():
+    args = parse_args(sys.argv[1:])
+    years = int(args["years"])
+    os.makedirs("outputs", exist_ok=True)
+    if args["cache_mode"]:
+        configure_akshare_cache(args["cache_mode"])
+    if args["trace"]:
+        configure_trace(args["trace"])
+
+    if args["engine"] not in ("threads", "async"):
+        print(f"不支持的下载引擎: {args['engine']}（可选 threads, async）")
+        sys.exit(1)
+
+    if args["universe"] or args["symbols_file"] or args["engine"] == "async":
+        company_infos = {}
+        if args["universe"]:
+            if args["universe"] != "cn":
+                print(f"不支持的 universe: {args['universe']}（目前仅支持 cn）")
+                sys.exit(1)
+            company_infos = load_cn_universe()
+            symbols = list(company_infos.keys())
+        elif args["symbols_file"]:
+            symbols = read_symbols_file(args["symbols_file"])
+        else:
+            symbols = [normalize_symbol(args["symbol"])]
+        if not symbols:
+            print("股票列表为空")
+            sys.exit(1)
+        # 一次性从 company_list 快照解析全部股票的交易所，下载任务中不再逐只查询
+        for symbol in symbols:
+            if symbol not in company_infos:
+                company_infos[symbol] = get_company_info_from_supabase(symbol)
+        if args["engine"] == "async":
+            from fetch_engine import parse_host_limits, run_async
+            run_async(symbols, years, int(args["workers"]), company_infos,
+                      incremental=bool(args["incremental"]), fmt=args["format"],
+                      host_limits=parse_host_limits(args["host_limits"]))
+        else:
+            run_batch(symbols, years, max(1, int(args["workers"])), company_infos,
+                      incremental=bool(args["incremental"]), fmt=args["format"])
+    else:
+        run_single(normalize_symbol(args["symbol"]), years,
+                   incremental=bool(args["incremental"]), fmt=args["format"])
+
+    stats = cache_stats()
+    if stats["hits"] or stats["misses"]:
+        print(f"AKShare 缓存: 命中 {stats['hits']}，未命中 {stats['misses']}，写入 {stats['stored']}")
+
+    save_memo()
+    memo = memo_stats()
+    if memo["saved"] or memo["fallbacks"]:
+        print(f"代码格式记忆: 节省 {memo['saved']} 次请求，仍需回退 {memo['fallbacks']} 次")
+    if trace_path():
+        print(f"耗时追踪已写入: {trace_path()}（汇总: python scripts/trace_summary.py {trace_path()}）")
+
+
 if __name__ == "__main__":
     main()
@@ -2,10 +2,12 @@ import os
 import re
 import json
 import time
-import requests
 import datetime as dt
 from dotenv import load_dotenv
 
+from batch_uploader import upload_records
+from supabase_clients import http_client
+
 
 def parse_args(argv):
     symbol = "000333"
@@ -70,11 +72,12 @@ def fetch_news(symbol, months, max_pages=200, page_size=50):
             "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
             "Referer": f"https://so.eastmoney.com/News/s?keyword={symbol}",
         }
-        resp = requests.get(
+        resp = http_client().get(
             url,
             params={"cb": cb, "param": json.dumps(body, ensure_ascii=False)},
             headers=headers,
             timeout=30,
+            follow_redirects=True,
         )
         text = resp.text
         if resp.status_code != 200 or not text:
@@ -151,16 +154,16 @@ def insert_supabase(rows, supabase_url, supabase_key):
 
     url = f"{supabase_url}/rest/v1/cn_company_news"
     batch_size = 50
-    inserted = 0
 
-    for i in range(0, len(rows), batch_size):
-        batch = rows[i : i + batch_size]
-        resp = requests.post(url, headers=headers, json=batch, timeout=60)
-        if resp.status_code not in (200, 201):
-            print(f"批次 {i // batch_size + 1} 插入失败: {resp.status_code} {resp.text}")
-            continue
-        inserted += len(batch)
-        print(f"已提交 {inserted}/{len(rows)}")
+    def send(batch):
+        resp = http_client().post(url, headers=headers, json=batch, timeout=60)
+        resp.raise_for_status()
+
+    # 新闻正文较长，从 50 条一批开始，按请求体大小和延迟自动调整
+    result = upload_records(send, rows, "cn_company_news", batch_size=batch_size, min_batch=10)
+    inserted = result["uploaded"]
+    for err in result["errors"]:
+        print(f"批次插入失败: {err}")
 
     print(f"完成：提交 {inserted} 条")
 
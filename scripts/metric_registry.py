@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""声明式指标注册表：每个指标声明输入和公式，按依赖图只计算请求的指标
+
+  METRICS = MetricRegistry()
+  METRICS.clean(fill_zero, 'Revenue', 'COGS')                     # 原始科目的清洗口径
+  METRICS.add('Gross_Profit', lambda Revenue, COGS: Revenue - COGS)
+  METRICS.add('Gross_Margin', lambda Gross_Profit, Revenue: Gross_Profit / Revenue.replace(0, np.nan))
+  METRICS.add('Rev_YoY', lambda Revenue, *, yoy_periods: Revenue.pct_change(yoy_periods))
+
+  METRICS.evaluate(df, ['Gross_Margin'])          # 只算 Gross_Margin 及其依赖，返回这些列
+  METRICS.evaluate_all(df, yoy_periods=4)         # 全部指标：原始列替换为清洗后的值，指标按注册顺序追加
+
+公式的位置参数名即输入名：已注册的指标先按依赖顺序算出，其余取 df 中的原始列（不存在时为 NaN），
+有清洗口径的原始列先清洗再传入；仅限关键字的参数（如 yoy_periods）从 evaluate 的关键字参数传入。
+每次求值内每个指标只算一次，循环依赖在求值前报错。
+"""
+import inspect
+from typing import Any, Callable, Dict, Iterable, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+
+Formula = Callable[..., pd.Series]
+
+
+def fill_zero(series: pd.Series) -> pd.Series:
+    return series.fillna(0.0)
+
+
+def forward_fill(series: pd.Series) -> pd.Series:
+    return series.ffill()
+
+
+class Metric:
+    """一个指标：名称、输入（公式的位置参数名）、参数（仅限关键字参数名）、公式"""
+
+    def __init__(self, name: str, formula: Formula):
+        signature = inspect.signature(formula).parameters.values()
+        self.name = name
+        self.formula = formula
+        self.inputs: Tuple[str, ...] = tuple(
+            p.name for p in signature if p.kind in (p.POSITIONAL_ONLY, p.POSITIONAL_OR_KEYWORD))
+        self.params: Tuple[str, ...] = tuple(p.name for p in signature if p.kind == p.KEYWORD_ONLY)
+
+    def __repr__(self) -> str:
+        return f"Metric({self.name!r}, inputs={list(self.inputs)})"
+
+
+class MetricRegistry:
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+        self._cleaners: Dict[str, Callable[[pd.Series], pd.Series]] = {}
+
+    def add(self, name: str, formula: Formula) -> Metric:
+        if name in self._metrics:
+            raise ValueError(f"指标重复注册: {name}")
+        if name in self._cleaners:
+            raise ValueError(f"{name} 已登记为原始科目，不能再注册为指标")
+        metric = Metric(name, formula)
+        self._metrics[name] = metric
+        return metric
+
+    def clean(self, cleaner: Callable[[pd.Series], pd.Series], *columns: str) -> None:
+        """登记原始科目的清洗口径（空值填 0、向前填充等），作为输入传入公式前先清洗"""
+        for column in columns:
+            if column in self._metrics:
+                raise ValueError(f"{column} 已注册为指标，不能再登记清洗口径")
+            self._cleaners[column] = cleaner
+
+    def names(self) -> List[str]:
+        return list(self._metrics)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._metrics
+
+    def __getitem__(self, name: str) -> Metric:
+        return self._metrics[name]
+
+    def dependencies(self, names: Iterable[str]) -> List[str]:
+        """names 及其依赖的全部指标，按计算顺序（依赖在前）；不含原始科目"""
+        order: List[str] = []
+        state: Dict[str, int] = {}  # 1 = 正在展开，2 = 已展开
+        path: List[str] = []
+
+        def visit(name: str) -> None:
+            if name not in self._metrics or state.get(name) == 2:
+                return
+            if state.get(name) == 1:
+                cycle = path[path.index(name):] + [name]
+                raise ValueError(f"指标循环依赖: {' -> '.join(cycle)}")
+            state[name] = 1
+            path.append(name)
+            for dep in self._metrics[name].inputs:
+                visit(dep)
+            path.pop()
+            state[name] = 2
+            order.append(name)
+
+        for name in names:
+            visit(name)
+        return order
+
+    def _column(self, df: pd.DataFrame, name: str) -> pd.Series:
+        if name in df.columns:
+            series = df[name]
+        else:
+            series = pd.Series(np.nan, index=df.index, dtype=float)
+        cleaner = self._cleaners.get(name)
+        return cleaner(series) if cleaner else series
+
+    def _compute(self, df: pd.DataFrame, names: Iterable[str], params: Dict[str, Any]) -> Dict[str, pd.Series]:
+        values: Dict[str, pd.Series] = {}
+        for name in self.dependencies(names):
+            metric = self._metrics[name]
+            args = [values[i] if i in values else self._column(df, i) for i in metric.inputs]
+            missing = [p for p in metric.params if p not in params]
+            if missing:
+                raise KeyError(f"指标 {name} 需要参数: {', '.join(missing)}")
+            values[name] = metric.formula(*args, **{p: params[p] for p in metric.params})
+        return values
+
+    def evaluate(self, df: pd.DataFrame, names: Iterable[str], **params: Any) -> pd.DataFrame:
+        """只计算 names 及其依赖，返回按 names 顺序排列的这些列（原始科目为清洗后的值）"""
+        names = list(names)
+        unknown = [n for n in names if n not in self._metrics and n not in df.columns]
+        if unknown:
+            raise KeyError(f"未知指标: {', '.join(unknown)}")
+        values = self._compute(df, names, params)
+        return pd.DataFrame({n: values[n] if n in values else self._column(df, n) for n in names},
+                            index=df.index)
+
+    def evaluate_all(self, df: pd.DataFrame, **params: Any) -> pd.DataFrame:
+        """df 的原始列（有清洗口径的替换为清洗后的值）+ 全部指标：已有的列原位替换，其余按注册顺序追加"""
+        values = self._compute(df, self.names(), params)
+        out = df.copy()
+        for column in self._cleaners:
+            if column in out.columns:
+                out[column] = self._column(df, column)
+        appended = {}
+        for name in self._metrics:
+            if name in out.columns:
+                out[name] = values[name]
+            else:
+                appended[name] = values[name]
+        return pd.concat([out, pd.DataFrame(appended, index=df.index)], axis=1)
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""每只股票的日市值本地存储 outputs/store/mkt_cap/{symbol}.csv（只追加）
+
+stock_value_em 每次都返回完整的多年日序列；这里只把晚于最后存储日期的行追加到文件末尾，
+{symbol}_mkt_cap_10y 中间文件由存储按年限截取生成。
+存储在 RECHECK_HOURS 小时内检查过时，下载脚本直接使用存储、不再请求接口。
+"""
+import os
+import time
+import datetime as dt
+from typing import Optional
+
+import pandas as pd
+
+
+STORE_DIR = os.path.join("outputs", "store", "mkt_cap")
+COLUMNS = ["date", "mkt_cap_billion_cny"]
+# 日市值每天收盘后才更新，6 小时内重复运行无需再请求
+RECHECK_HOURS = 6
+
+
+def store_path(symbol: str) -> str:
+    return os.path.join(STORE_DIR, f"{symbol}.csv")
+
+
+def read_store(symbol: str) -> pd.DataFrame:
+    path = store_path(symbol)
+    if not os.path.exists(path):
+        return pd.DataFrame(columns=COLUMNS)
+    return pd.read_csv(path, dtype={"date": str})
+
+
+def last_stored_date(symbol: str) -> Optional[str]:
+    """最后存储日期 YYYY-MM-DD（日期按升序追加，只需读最后一行）"""
+    path = store_path(symbol)
+    if not os.path.exists(path):
+        return None
+    with open(path, "rb") as f:
+        f.seek(0, os.SEEK_END)
+        f.seek(max(0, f.tell() - 256))
+        lines = f.read().decode("utf-8", errors="ignore").strip().splitlines()
+    last = lines[-1].split(",")[0].strip() if lines else ""
+    return last if last and last != "date" else None
+
+
+def store_is_fresh(symbol: str) -> bool:
+    path = store_path(symbol)
+    return os.path.exists(path) and time.time() - os.path.getmtime(path) < RECHECK_HOURS * 3600
+
+
+def append_store(symbol: str, df: pd.DataFrame) -> pd.DataFrame:
+    """追加 df 中晚于最后存储日期的行，返回新增的行；无论是否有新行都刷新检查时间"""
+    os.makedirs(STORE_DIR, exist_ok=True)
+    path = store_path(symbol)
+    last = last_stored_date(symbol)
+    new_rows = df[COLUMNS] if not df.empty else pd.DataFrame(columns=COLUMNS)
+    if last:
+        new_rows = new_rows[new_rows["date"] > last]
+    new_rows = new_rows.sort_values("date")
+    if not new_rows.empty or not os.path.exists(path):
+        new_rows.to_csv(path, mode="a", header=not os.path.exists(path), index=False)
+    else:
+        os.utime(path)
+    return new_rows
+
+
+def read_window(symbol: str, years: int) -> pd.DataFrame:
+    """存储中最近 years 年的数据，列与 {symbol}_mkt_cap_10y 中间文件一致"""
+    df = read_store(symbol)
+    cutoff = (dt.datetime.now() - dt.timedelta(days=years * 365)).strftime("%Y-%m-%d")
+    return df[df["date"] >= cutoff].reset_index(drop=True)
@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+"""outputs/ 目录中间产物的读写（CSV 或 Parquet）
+
+下载、上传、指标计算脚本通过 --format=csv|parquet 选择格式，文件名为
+outputs/{symbol}_{后缀}.{csv|parquet}。
+
+Parquet 使用显式 schema：报告日/日期存为 date32，财务科目等重复度高的文本
+存为字典编码列，数值统一为 float64，读回时类型稳定、无需类型推断。
+"""
+import os
+from typing import Any, Dict, Optional
+
+import pandas as pd
+
+from trace_spans import span
+
+
+FORMATS = ("csv", "parquet")
+
+ARTIFACT_SUFFIXES = {
+    "balance": "balance_sheet_10y",
+    "income": "income_statement_10y",
+    "cash_flow": "cash_flow_10y",
+    "mkt_cap": "mkt_cap_10y",
+    "top10": "top10_shareholders_10y",
+    "holder_count": "holder_count_concentration_10y",
+    "financials_long": "financials_10y_long_combined",
+}
+
+# 显式 schema：(列名, 类型)。类型: string / dict（字典编码文本）/ date / float / int
+ARTIFACT_SCHEMAS = {
+    "financials_long": [
+        ("股票代码", "string"),
+        ("报告日", "date"),
+        ("报表类型", "dict"),
+        ("财务科目", "dict"),
+        ("数值", "float"),
+        ("数据源", "dict"),
+        ("是否审计", "dict"),
+        ("公告日期", "date"),
+        ("币种", "dict"),
+        ("类型", "dict"),
+        ("更新日期", "date"),
+    ],
+    "mkt_cap": [
+        ("date", "date"),
+        ("mkt_cap_billion_cny", "float"),
+    ],
+    "holder_count": [
+        ("证券代码", "string"),
+        ("证券简称", "string"),
+        ("变动日期", "date"),
+        ("本期股东人数", "float"),
+        ("上期股东人数", "float"),
+        ("股东人数增幅", "float"),
+        ("本期人均持股数量", "float"),
+        ("上期人均持股数量", "float"),
+        ("人均持股数量增幅", "float"),
+    ],
+    "top10": [
+        ("名次", "int"),
+        ("股东名称", "string"),
+        ("股份类型", "dict"),
+        ("持股数", "float"),
+        ("占总股本持股比例", "float"),
+        ("增减", "string"),
+        ("变动比率", "float"),
+        ("报告期", "string"),
+        ("股票代码", "string"),
+    ],
+}
+
+# 宽表（三大报表）列数不固定，只固定报告日类型，其余文本列存为 string
+WIDE_DATE_COLS = ["报告日", "公告日期", "更新日期"]
+
+
+def check_format(fmt: str) -> str:
+    fmt = (fmt or "csv").strip().lower()
+    if fmt not in FORMATS:
+        raise ValueError(f"不支持的输出格式: {fmt}（可选 {', '.join(FORMATS)}）")
+    return fmt
+
+
+def format_from_argv(argv) -> str:
+    fmt = "csv"
+    for i, a in enumerate(argv):
+        if a == "--format" and i + 1 < len(argv):
+            fmt = argv[i + 1]
+        if a.startswith("--format="):
+            fmt = a.split("=", 1)[1]
+    return check_format(fmt)
+
+
+def artifact_path(symbol: str, artifact: str, fmt: str = "csv", out_dir: str = "outputs") -> str:
+    ext = "parquet" if check_format(fmt) == "parquet" else "csv"
+    return os.path.join(out_dir, f"{symbol}_{ARTIFACT_SUFFIXES[artifact]}.{ext}")
+
+
+def _pa_type(kind: str):
+    import pyarrow as pa
+    return {
+        "string": pa.string(),
+        "dict": pa.dictionary(pa.int32(), pa.string()),
+        "date": pa.date32(),
+        "float": pa.float64(),
+        "int": pa.int64(),
+    }[kind]
+
+
+def _date_text(v: Any) -> Optional[str]:
+    if v is None or v != v:
+        return None
+    if isinstance(v, float) and v.is_integer():
+        v = int(v)
+    return str(v).strip()
+
+
+def to_dates(series: pd.Series) -> pd.Series:
+    """YYYYMMDD / YYYY-MM-DD / 带时间的字符串或数字统一转为日期，无法解析的为空
+
+    报告期取值很少，只解析去重后的值再映射回去。
+    """
+    text = series.astype(object).map(_date_text)
+    uniques = [v for v in text.unique() if v is not None]
+    parsed = pd.to_datetime(pd.Series(uniques, dtype=object), format="mixed", errors="coerce")
+    mapping = {v: (d.date() if not pd.isna(d) else None) for v, d in zip(uniques, parsed)}
+    return text.map(lambda v: mapping.get(v) if v is not None else None)
+
+
+def to_text(series: pd.Series) -> pd.Series:
+    """文本列：空字符串与缺失值统一为 None（与 CSV 读回的语义一致）"""
+    return series.map(lambda v: None if v is None or v != v or str(v) == "" else str(v))
+
+
+def conform(df: pd.DataFrame, artifact: str):
+    """按显式 schema 转换为 pyarrow.Table"""
+    import pyarrow as pa
+
+    schema = ARTIFACT_SCHEMAS[artifact]
+    df = df.copy()
+    if artifact == "financials_long" and "数值" in df.columns:
+        # 与上传时的规则一致：非数值文本（如日期字符串）直接丢弃，缺失值保留
+        numeric = pd.to_numeric(df["数值"], errors="coerce")
+        df = df[numeric.notna() | df["数值"].isna()]
+        df["数值"] = numeric[df.index]
+
+    columns = {}
+    for name, kind in schema:
+        col = df[name] if name in df.columns else pd.Series([None] * len(df), index=df.index, dtype=object)
+        if kind == "date":
+            values = to_dates(col)
+        elif kind == "float":
+            values = pd.to_numeric(col, errors="coerce").astype("float64")
+        elif kind == "int":
+            values = pd.to_numeric(col, errors="coerce").astype("Int64")
+        else:
+            values = to_text(col)
+        columns[name] = pa.array(values, type=_pa_type("string" if kind == "dict" else kind), from_pandas=True)
+    table = pa.table(columns)
+    return table.cast(pa.schema([(name, _pa_type(kind)) for name, kind in schema]))
+
+
+def conform_wide(df: pd.DataFrame):
+    """宽表：日期列转 date32，其余非数值列转 string，数值列保持原类型
+
+    重名列按 read_csv 的规则改名为 "列名.1"、"列名.2"…，与 CSV 读回的列名一致。
+    """
+    import pyarrow as pa
+    from pandas.api.types import is_bool_dtype, is_numeric_dtype
+
+    names = []
+    seen: Dict[str, int] = {}
+    for col in df.columns:
+        col = str(col)
+        n = seen.get(col, 0)
+        seen[col] = n + 1
+        names.append(col if n == 0 else f"{col}.{n}")
+
+    df = df.copy()
+    df.columns = names
+    for col in df.columns:
+        if col in WIDE_DATE_COLS:
+            df[col] = to_dates(df[col])
+        elif not (is_numeric_dtype(df[col]) or is_bool_dtype(df[col])):
+            df[col] = to_text(df[col])
+    return pa.Table.from_pandas(df, preserve_index=False)
+
+
+def write_artifact(df: pd.DataFrame, symbol: str, artifact: str, fmt: str = "csv") -> str:
+    """写出中间产物，返回文件路径"""
+    path = artifact_path(symbol, artifact, fmt)
+    with span("write", symbol=symbol, artifact=artifact, format=fmt, rows=len(df)) as s:
+        if check_format(fmt) == "csv":
+            df.to_csv(path, index=False)
+        else:
+            import pyarrow.parquet as pq
+            table = conform(df, artifact) if artifact in ARTIFACT_SCHEMAS else conform_wide(df)
+            pq.write_table(table, path)
+        s["bytes"] = os.path.getsize(path)
+    return path
+
+
+def read_artifact(symbol: str, artifact: str, fmt: str = "csv",
+                  csv_dtype: Optional[Dict[str, Any]] = None) -> pd.DataFrame:
+    """读取中间产物；CSV 仍按原方式推断类型，csv_dtype 用于强制文本列
+
+    浮点数按 round_trip 解析，读回的值与写出前完全一致（差异上传按内容哈希比较）。
+    """
+    path = artifact_path(symbol, artifact, fmt)
+    if check_format(fmt) == "csv":
+        return pd.read_csv(path, dtype=csv_dtype, float_precision="round_trip")
+    return pd.read_parquet(path)
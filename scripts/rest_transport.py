@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""PostgREST 批量写入的传输层：整批编码 + gzip 请求体
+
+  client = RestClient(url, key)                  # 读 / 删除仍走 client.table(...)（supabase-py）
+  client = supabase_clients.rest_client()        # 同上，按 (url, key) 缓存
+  client.write("company_financials_long", batch, "upsert", on_conflict="symbol,report_date,...")
+
+- 编码：安装了 orjson（可选：pip install orjson）时整批一次序列化，NaN/Inf 直接写成 null、
+  numpy 标量原生支持，不再逐值 clean_value；未安装时回退到 clean_record + json.dumps
+- 压缩：请求体超过 GZIP_MIN_BYTES 时以 Content-Encoding: gzip 发送。服务端不支持时
+  （415，或把压缩后的请求体当作无效 JSON 返回 PGRST102）自动关闭压缩并以原文重发该批，
+  之后本进程不再尝试；POSTGREST_GZIP=0 关闭，=1 总是压缩（不做回退）
+- 写入使用 Prefer: return=minimal，不回传写入的行
+- 连接：默认使用 supabase_clients 中进程共用的 httpx.Client（连接池 + keep-alive，支持时 HTTP/2）
+"""
+import os
+import gzip
+import json
+import math
+import threading
+from typing import Any, Dict, List, Optional
+
+import httpx
+import numpy as np
+
+try:
+    import orjson
+except ImportError:  # 可选依赖
+    orjson = None
+
+
+GZIP_MIN_BYTES = 8 * 1024
+GZIP_LEVEL = 5
+REQUEST_TIMEOUT = 60.0
+
+
+def clean_value(v):
+    """Clean values for JSON serialization - handle NaN, Inf, -Inf"""
+    if v is None:
+        return None
+    if isinstance(v, float):
+        if math.isnan(v) or math.isinf(v):
+            return None
+    if isinstance(v, (np.floating, np.integer)):
+        if np.isnan(v) or np.isinf(v):
+            return None
+        return float(v) if isinstance(v, np.floating) else int(v)
+    return v
+
+
+def clean_record(record: Dict[str, Any]) -> Dict[str, Any]:
+    """Clean all values in a record for JSON serialization"""
+    return {k: clean_value(v) for k, v in record.items()}
+
+
+def _orjson_default(v: Any) -> Any:
+    """orjson 不认识的类型：pandas 缺失值写成 null，时间写成 ISO 字符串，其余转字符串"""
+    if isinstance(v, np.generic):
+        return v.item()
+    if str(v) in ("<NA>", "NaT"):
+        return None
+    if hasattr(v, "isoformat"):
+        return v.isoformat()
+    return str(v)
+
+
+def encode_records(records: List[Dict[str, Any]]) -> bytes:
+    """把一批记录编码为 JSON 请求体（NaN / Inf -> null）"""
+    if orjson is not None:
+        return orjson.dumps(records, default=_orjson_default,
+                            option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)
+    return json.dumps([clean_record(r) for r in records], ensure_ascii=False, separators=(",", ":"),
+                      default=str).encode("utf-8")
+
+
+def unique_columns(records: List[Dict[str, Any]]) -> str:
+    """与 postgrest-py 一致：批量写入时用 columns 参数声明所有列，缺失的列写 null"""
+    columns = {}
+    for r in records:
+        for k in r:
+            columns[k] = None
+    return ",".join(f'"{k}"' for k in columns)
+
+
+def gzip_mode() -> str:
+    value = os.getenv("POSTGREST_GZIP", "auto").strip().lower()
+    if value in ("0", "false", "off", "no"):
+        return "off"
+    if value in ("1", "true", "on", "yes"):
+        return "on"
+    return "auto"
+
+
+# 进程内共用：任一客户端发现服务端不解压请求体后，其他客户端也不再尝试
+_gzip = {"mode": gzip_mode()}
+
+
+class RestClient:
+    """supabase 客户端 + 批量写入传输层（httpx 连接池在线程间、客户端间共用）"""
+
+    def __init__(self, url: str, key: str, client=None, http: Optional[httpx.Client] = None):
+        if client is None or http is None:
+            from supabase_clients import http_client, supabase_client
+            client = client if client is not None else supabase_client(url, key)
+            http = http if http is not None else http_client()
+        self.client = client
+        self.rest_url = f"{url.rstrip('/')}/rest/v1"
+        self.headers = {
+            "apikey": key,
+            "Authorization": f"Bearer {key}",
+            "Content-Type": "application/json",
+        }
+        self.http = http
+        self._lock = threading.Lock()
+        self.stats = {"requests": 0, "raw_bytes": 0, "wire_bytes": 0}
+
+    def table(self, name: str):
+        return self.client.table(name)
+
+    def _post(self, table: str, body: bytes, params: Dict[str, str], headers: Dict[str, str]) -> httpx.Response:
+        response = self.http.post(f"{self.rest_url}/{table}", content=body, params=params, headers=headers,
+                                  timeout=REQUEST_TIMEOUT)
+        with self._lock:
+            self.stats["requests"] += 1
+            self.stats["wire_bytes"] += len(body)
+        return response
+
+    def write(self, table: str, records: List[Dict[str, Any]], method: str = "insert",
+              on_conflict: Optional[str] = None) -> None:
+        """insert / upsert 一批记录，失败时抛出 httpx.HTTPStatusError（batch_uploader 据此判断是否重试）"""
+        body = encode_records(records)
+        with self._lock:
+            self.stats["raw_bytes"] += len(body)
+        params = {"columns": unique_columns(records)}
+        prefer = ["return=minimal"]
+        if method == "upsert":
+            prefer.append("resolution=merge-duplicates")
+            if on_conflict:
+                params["on_conflict"] = on_conflict
+        headers = {**self.headers, "Prefer": ",".join(prefer)}
+
+        mode = _gzip["mode"]
+        if mode != "off" and len(body) >= GZIP_MIN_BYTES:
+            response = self._post(table, gzip.compress(body, GZIP_LEVEL), params,
+                                   {**headers, "Content-Encoding": "gzip"})
+            rejected = response.status_code == 415 or (
+                response.status_code == 400 and "PGRST102" in response.text
+            )
+            if not (rejected and mode == "auto"):
+                response.raise_for_status()
+                return
+            _gzip["mode"] = "off"  # 服务端不解压请求体，本进程之后都发送原文
+        self._post(table, body, params, headers).raise_for_status()
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""按主键记录已上传行的内容哈希，用于差异上传
+
+outputs/manifest/row_hashes/{table}/{symbol}.json: {主键: 内容哈希}。
+上传时与本次记录逐行比较，只发送新增、内容变化的行，并删除本次不再出现的主键；
+全部写入成功后才保存新的哈希，失败时下次会重新比较（最多多写几行，不会漏写）。
+
+哈希只反映本地上传过的内容，数据库被其他途径修改后应跑一次全量上传（不加 --diff）重新同步。
+"""
+import os
+import json
+import hashlib
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+
+ROW_HASH_DIR = os.path.join("outputs", "manifest", "row_hashes")
+KEY_SEP = "|"
+
+
+def row_hash_path(table: str, symbol: str) -> str:
+    return os.path.join(ROW_HASH_DIR, table, f"{symbol}.json")
+
+
+def load_row_hashes(table: str, symbol: str) -> Optional[Dict[str, str]]:
+    """读取已上传行的哈希，从未记录过时返回 None（与空表区分）"""
+    path = row_hash_path(table, symbol)
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except Exception:
+        return None
+
+
+def save_row_hashes(table: str, symbol: str, hashes: Dict[str, str]) -> None:
+    path = row_hash_path(table, symbol)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(hashes, f, ensure_ascii=False, separators=(",", ":"))
+    os.replace(tmp_path, path)
+
+
+def clear_row_hashes(table: str, symbol: str) -> None:
+    """数据库中的行被整体删除后调用，避免之后按过期的哈希跳过上传"""
+    try:
+        os.remove(row_hash_path(table, symbol))
+    except FileNotFoundError:
+        pass
+
+
+def row_key(record: Dict[str, Any], key_fields: List[str]) -> str:
+    return KEY_SEP.join(str(record.get(k)) for k in key_fields)
+
+
+def content_hash(record: Dict[str, Any], key_fields: List[str]) -> str:
+    content = {k: v for k, v in record.items() if k not in key_fields}
+    text = json.dumps(content, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=8).hexdigest()
+
+
+def hash_records(records: Iterable[Dict[str, Any]], key_fields: List[str]) -> Dict[str, str]:
+    return {row_key(r, key_fields): content_hash(r, key_fields) for r in records}
+
+
+def diff_records(records: List[Dict[str, Any]], previous: Dict[str, str], key_fields: List[str],
+                 scope=None) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]], List[str], Dict[str, str]]:
+    """与上次上传的哈希比较，返回 (新增记录, 变化记录, 待删除主键, 合并后的哈希)
+
+    scope(主键) 为 True 的旧主键才会在本次缺失时被删除（例如只比较本次包含的报表类型），
+    为 None 时不删除任何行（增量数据只包含新报告期）。
+    """
+    # 同一主键出现多次时以最后一条为准（与按顺序 upsert 的结果一致）
+    latest = {row_key(r, key_fields): r for r in records}
+    hashes = dict(previous)
+    inserts, updates = [], []
+    for key, r in latest.items():
+        h = content_hash(r, key_fields)
+        old = previous.get(key)
+        if old is None:
+            inserts.append(r)
+        elif old != h:
+            updates.append(r)
+        hashes[key] = h
+    deletes = []
+    if scope is not None:
+        deletes = [key for key in previous if key not in latest and scope(key)]
+        for key in deletes:
+            hashes.pop(key, None)
+    return inserts, updates, deletes, hashes
@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+"""单只股票 下载 → 上传 一体化流水线（同一进程内，不经过中间文件）
+
+fetch_stock_data.py 写出 CSV、upload_stock_data.py 再读回解析，两步之间要整表落盘再读回。
+这里每个数据集下载完成后立即把 DataFrame 交给对应的上传任务：
+资产负债表下载完就开始上传，不必等股东人数（最慢的数据集）下载结束。
+
+用法:
+  python scripts/stock_pipeline.py --symbol=002508
+  python scripts/stock_pipeline.py --symbol=002508 --incremental
+  python scripts/stock_pipeline.py --symbol=002508 --save --format=parquet   # 同时写出中间文件供指标计算使用
+  python scripts/stock_pipeline.py --symbol=002508 --trace
+"""
+import os
+import sys
+import time
+import threading
+from typing import Any, Dict, List
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+from dotenv import load_dotenv
+
+from fetch_stock_data import (
+    DATASET_LABELS, DATASETS, STATEMENT_TYPES,
+    dataset_is_current, fetch_dataset, filter_by_years, get_company_info_from_supabase,
+    get_stored_report_dates, normalize_symbol, only_new_periods, save_dataset, save_long_table,
+    wide_to_long,
+)
+from pipeline_io import format_from_argv
+from supabase_clients import rest_client
+from symbol_format_memo import save_memo
+from symbol_manifest import load_manifest, update_manifest
+from trace_spans import configure_trace, span, trace_from_argv, trace_path
+from upload_stock_data import (
+    delete_financials, financials_records, format_upsert_counts, mkt_cap_records,
+    record_financials_latest, remember_financial_hashes, sharehold_records, top10_records,
+    upload_financial_records, upload_mkt_cap_records, upsert_records,
+)
+
+
+# 数据集 -> 目标表
+DATASET_TABLES = {
+    "balance": "company_financials_long",
+    "income": "company_financials_long",
+    "cash_flow": "company_financials_long",
+    "mkt_cap": "stock_valuation_history",
+    "top10": "cn_top10_sharehold",
+    "holder_count": "cn_sharehold_data",
+}
+
+
+def parse_args(argv: List[str]) -> Dict[str, str]:
+    symbol = "002508"
+    years = "10"
+    incremental = ""
+    save = ""
+    for i, a in enumerate(argv):
+        if a == "--symbol" and i + 1 < len(argv):
+            symbol = argv[i + 1].strip()
+        if a.startswith("--symbol="):
+            symbol = a.split("=", 1)[1].strip()
+        if a == "--years" and i + 1 < len(argv):
+            years = argv[i + 1].strip()
+        if a.startswith("--years="):
+            years = a.split("=", 1)[1].strip()
+        if a == "--incremental":
+            incremental = "1"
+        if a == "--save":
+            save = "1"
+    return {
+        "symbol": symbol,
+        "years": years,
+        "incremental": incremental,
+        "save": save,
+        "format": format_from_argv(argv),
+        "trace": trace_from_argv(argv) or "",
+    }
+
+
+class FinancialsUploader:
+    """三张财务报表各自上传到 company_financials_long
+
+    全量模式下第一张报表上传前删除一次旧数据（其余报表等待删除完成）；
+    三张报表全部上传成功后才更新清单中的最新报告期，保证下次增量下载的依据完整。
+    """
+
+    def __init__(self, client_factory, symbol: str, incremental: bool, manifest: Dict[str, Any]):
+        self.client_factory = client_factory
+        self.symbol = symbol
+        self.incremental = incremental
+        self.manifest = manifest
+        self._lock = threading.Lock()
+        self._deleted = incremental  # 增量模式只包含新报告期，不能先删除
+        self._deleted_ok = True
+        self._records: Dict[str, List[Dict[str, Any]]] = {}
+
+    def _ensure_deleted(self) -> None:
+        with self._lock:
+            if not self._deleted:
+                self._deleted_ok = delete_financials(self.client_factory(), self.symbol)
+                self._deleted = True
+
+    def upload(self, key: str, long_df: pd.DataFrame) -> int:
+        records = financials_records(long_df)
+        self._ensure_deleted()
+        uploaded = upload_financial_records(self.client_factory(), self.symbol, records)
+        with self._lock:
+            self._records[key] = records
+        return uploaded
+
+    def finish(self, expected: List[str]) -> bool:
+        """expected 中的报表都已上传时更新清单，返回是否更新"""
+        if any(key not in self._records for key in expected):
+            return False
+        records = [r for key in expected for r in self._records[key]]
+        previous = self.manifest.get("financials_latest") if self.incremental else None
+        record_financials_latest(self.symbol, records, previous)
+        if self._deleted_ok:
+            remember_financial_hashes(self.symbol, records, self.incremental)
+        update_manifest(self.symbol, long_table="incremental" if self.incremental else "full")
+        return True
+
+
+def run_pipeline(symbol: str, years: int = 10, incremental: bool = False,
+                 save: bool = False, fmt: str = "csv") -> Dict[str, Any]:
+    """下载并上传一只股票，返回 {"uploaded": {数据集: 条数}, "errors": [...], "elapsed": 秒}"""
+    load_dotenv()
+    url = os.getenv("SUPABASE_URL")
+    key = os.getenv("SUPABASE_SERVICE_ROLE_KEY")
+    if not url or not key:
+        raise RuntimeError("缺少 SUPABASE_URL / SUPABASE_SERVICE_ROLE_KEY")
+
+    # 所有上传任务共用一个客户端（同一个连接池，复用 TCP/TLS 连接）
+    def get_supabase():
+        return rest_client(url, key)
+
+    start_time = time.time()
+    os.makedirs("outputs", exist_ok=True)
+    symbol = normalize_symbol(symbol)
+    company_info = get_company_info_from_supabase(symbol)
+    market = company_info.get("market")
+    name = company_info.get("name")
+    stored = get_stored_report_dates(symbol) if incremental else None
+    manifest = load_manifest(symbol)
+    financials = FinancialsUploader(get_supabase, symbol, incremental, manifest)
+
+    print(f"=" * 50)
+    print(f"开始下载并上传 {symbol} ({name or '未知'}) 数据...")
+    print(f"=" * 50)
+
+    uploaded: Dict[str, int] = {}
+    errors: List[str] = []
+    results: Dict[str, pd.DataFrame] = {}
+    upload_futures = []
+
+    def upload(key: str, df: pd.DataFrame):
+        label = DATASET_LABELS[key]
+        table = DATASET_TABLES[key]
+        try:
+            t0 = time.time()
+            if key in STATEMENT_TYPES:
+                long_df = filter_by_years(wide_to_long(df, symbol, STATEMENT_TYPES[key]), years)
+                count = financials.upload(key, long_df)
+                print(f"  [↑] {label} → {table}: {count} 条 ({time.time()-t0:.1f}s)", flush=True)
+            elif key == "mkt_cap":
+                counts, skipped = upload_mkt_cap_records(get_supabase(), symbol, mkt_cap_records(df, symbol), manifest)
+                count = counts["inserted"] + counts["updated"]
+                print(f"  [↑] {label} → {table}: {format_upsert_counts(counts)}，跳过已上传 {skipped} 条 "
+                      f"({time.time()-t0:.1f}s)", flush=True)
+            else:
+                records = sharehold_records(df) if key == "holder_count" else top10_records(df)
+                counts = upsert_records(get_supabase(), symbol, table, records)
+                count = counts["inserted"] + counts["updated"]
+                print(f"  [↑] {label} → {table}: {format_upsert_counts(counts)} ({time.time()-t0:.1f}s)", flush=True)
+            if key not in STATEMENT_TYPES and counts["failed"]:
+                errors.append(f"{label} 上传: {counts['failed']} 条失败 - {counts['errors'][0][:80]}")
+            uploaded[key] = count
+        except Exception as e:
+            errors.append(f"{label} 上传: {e}")
+            print(f"  [✗] {label} 上传失败: {e}", flush=True)
+
+    with ThreadPoolExecutor(max_workers=len(DATASETS)) as upload_pool:
+
+        def download(key: str):
+            label = DATASET_LABELS[key]
+            try:
+                t0 = time.time()
+                if dataset_is_current(key, stored):
+                    print(f"  [=] {label} 无新报告期，跳过", flush=True)
+                    return
+                with span("download", symbol=symbol, dataset=key) as s:
+                    df = fetch_dataset(key, symbol, market, years)
+                    s["rows"] = len(df)
+                if save:
+                    df = save_dataset(key, df, symbol, stored, fmt)
+                elif stored is not None and key in STATEMENT_TYPES:
+                    df = only_new_periods(df, stored.get(STATEMENT_TYPES[key]))
+                if df is None or df.empty:
+                    print(f"  [=] {label} 无新数据 ({time.time()-t0:.1f}s)", flush=True)
+                    return
+                print(f"  [✓] {label} ({time.time()-t0:.1f}s)", flush=True)
+                results[key] = df
+                # 下载完成立即交给上传线程，不等待其他数据集
+                upload_futures.append(upload_pool.submit(upload, key, df))
+            except Exception as e:
+                errors.append(f"{label}: {e}")
+                print(f"  [✗] {label}: {e}", flush=True)
+
+        print("并行下载中（每个数据集下载完成后立即上传）...", flush=True)
+        with ThreadPoolExecutor(max_workers=len(DATASETS)) as fetch_pool:
+            list(fetch_pool.map(download, [key for key, _ in DATASETS]))
+        download_time = time.time() - start_time
+        print(f"下载完成，耗时: {download_time:.1f}s，等待剩余上传...", flush=True)
+        for future in upload_futures:
+            future.result()
+
+    # 增量模式下已入库最新季度的报表没有下载，不影响清单更新
+    expected = [k for k in STATEMENT_TYPES if k in results]
+    if expected and not financials.finish(expected):
+        print("财务报表未全部上传成功，保留清单中原有的最新报告期")
+    if save and expected:
+        save_long_table(results, symbol, years, incremental, fmt)
+
+    elapsed = time.time() - start_time
+    print(f"=" * 50)
+    print(f"全部完成！总耗时: {elapsed:.1f}秒")
+    print(f"=" * 50)
+    if errors:
+        print(f"错误: {errors}")
+    return {"uploaded": uploaded, "errors": errors, "elapsed": elapsed}
+
+
+def main():
+    args = parse_args(sys.argv[1:])
+    if args["trace"]:
+        configure_trace(args["trace"])
+    try:
+        result = run_pipeline(args["symbol"], int(args["years"]), incremental=bool(args["incremental"]),
+                              save=bool(args["save"]), fmt=args["format"])
+    except RuntimeError as e:
+        print(e)
+        sys.exit(1)
+    save_memo()
+    if trace_path():
+        print(f"耗时追踪已写入: {trace_path()}（汇总: python scripts/trace_summary.py {trace_path()}）")
+    if result["errors"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""进程内共用的 HTTP / Supabase 客户端：连接池 + keep-alive，支持时启用 HTTP/2
+
+  from supabase_clients import http_client, rest_client, supabase_client
+  supabase = supabase_client()          # supabase-py 客户端（读 / 删除 / 普通写入）
+  client = rest_client()                # rest_transport.RestClient（批量写入）
+  http_client().post(url, json=...)     # 直接调用 REST / RPC 接口
+
+所有客户端共用同一个 httpx.Client：批量任务在多个线程、多只股票之间复用 TCP/TLS 连接，
+不再每个线程 / 每个请求重新握手。安装了 h2 时启用 HTTP/2（多个请求复用一条连接），
+SUPABASE_HTTP2=0 关闭；未传 url / key 时从 .env 读取 SUPABASE_URL / SUPABASE_SERVICE_ROLE_KEY。
+"""
+import os
+import atexit
+import threading
+import importlib.util
+from typing import Any, Dict, Optional, Tuple
+
+import httpx
+from dotenv import load_dotenv
+
+
+HTTP_TIMEOUT = 60.0
+# 读超时沿用 supabase-py 的 postgrest_client_timeout（120s）：传入 httpx_client 后 postgrest 使用该客户端的超时，
+# 按股票删除长表、分页读取自然键等慢请求不能被缩短到 60s
+READ_TIMEOUT = 120.0
+MAX_CONNECTIONS = 32
+MAX_KEEPALIVE_CONNECTIONS = 16
+KEEPALIVE_EXPIRY = 60.0
+
+_lock = threading.Lock()
+_http: Dict[str, httpx.Client] = {}
+_clients: Dict[Tuple[str, str, str], Any] = {}
+
+
+def http2_enabled() -> bool:
+    if os.getenv("SUPABASE_HTTP2", "1").strip().lower() in ("0", "false", "off", "no"):
+        return False
+    return importlib.util.find_spec("h2") is not None
+
+
+def http_client() -> httpx.Client:
+    """进程内唯一的 httpx.Client（线程安全，连接池在所有线程间共用）"""
+    with _lock:
+        client = _http.get("default")
+        if client is None:
+            client = httpx.Client(
+                http2=http2_enabled(),
+                timeout=httpx.Timeout(HTTP_TIMEOUT, read=READ_TIMEOUT),
+                limits=httpx.Limits(
+                    max_connections=MAX_CONNECTIONS,
+                    max_keepalive_connections=MAX_KEEPALIVE_CONNECTIONS,
+                    keepalive_expiry=KEEPALIVE_EXPIRY,
+                ),
+            )
+            _http["default"] = client
+        return client
+
+
+def supabase_credentials(url: Optional[str] = None, key: Optional[str] = None) -> Tuple[str, str]:
+    """未传入时从 .env / 环境变量读取 SUPABASE_URL / SUPABASE_SERVICE_ROLE_KEY"""
+    if not url or not key:
+        load_dotenv()
+        url = url or os.getenv("SUPABASE_URL")
+        key = key or os.getenv("SUPABASE_SERVICE_ROLE_KEY")
+    if not url or not key:
+        raise RuntimeError("缺少 SUPABASE_URL / SUPABASE_SERVICE_ROLE_KEY")
+    return url, key
+
+
+def supabase_client(url: Optional[str] = None, key: Optional[str] = None):
+    """按 (url, key) 缓存的 supabase-py 客户端，底层使用共用的 httpx.Client"""
+    from supabase import ClientOptions, create_client
+
+    url, key = supabase_credentials(url, key)
+    http = http_client()
+    with _lock:
+        client = _clients.get(("supabase", url, key))
+        if client is None:
+            client = create_client(url, key, options=ClientOptions(httpx_client=http))
+            _clients[("supabase", url, key)] = client
+        return client
+
+
+def rest_client(url: Optional[str] = None, key: Optional[str] = None):
+    """按 (url, key) 缓存的 rest_transport.RestClient（supabase-py 客户端与批量写入共用连接池）"""
+    from rest_transport import RestClient
+
+    url, key = supabase_credentials(url, key)
+    supabase = supabase_client(url, key)
+    with _lock:
+        client = _clients.get(("rest", url, key))
+        if client is None:
+            client = RestClient(url, key, supabase, http=_http["default"])
+            _clients[("rest", url, key)] = client
+        return client
+
+
+def close_clients() -> None:
+    """关闭共用的连接池（进程退出时自动调用）"""
+    with _lock:
+        _clients.clear()
+        client = _http.pop("default", None)
+    if client is not None:
+        client.close()
+
+
+atexit.register(close_clients)
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""记住每个 AKShare 接口接受哪种股票代码格式，供 fetch_with_fallback 使用
+
+格式: "plain"（6 位代码，如 600519）或 "prefixed"（带市场前缀，如 SH600519）。
+默认先试 plain；某接口用 prefixed 成功后，之后的调用直接先试 prefixed，
+省去一次必然失败的请求。记录保存在 outputs/cache/symbol_format_memo.json，跨运行复用。
+"""
+import os
+import json
+import threading
+from typing import Dict, List, Tuple
+
+
+MEMO_PATH = os.path.join("outputs", "cache", "symbol_format_memo.json")
+FORMATS = ("plain", "prefixed")
+
+_lock = threading.Lock()
+_memo: Dict[str, str] = {}
+_loaded = False
+_dirty = False
+_stats = {"saved": 0, "fallbacks": 0}
+
+
+def _ensure_loaded() -> None:
+    global _loaded
+    if _loaded:
+        return
+    _loaded = True
+    try:
+        with open(MEMO_PATH, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        _memo.update({k: v for k, v in data.items() if v in FORMATS})
+    except Exception:
+        pass
+
+
+def symbol_attempts(fn_name: str, plain: str, prefixed: str) -> List[Tuple[str, str]]:
+    """按记忆的优先顺序返回 [(格式, 代码), ...]"""
+    with _lock:
+        _ensure_loaded()
+        preferred = _memo.get(fn_name, "plain")
+    attempts = [("plain", plain), ("prefixed", prefixed)]
+    return attempts if preferred == "plain" else attempts[::-1]
+
+
+def record_success(fn_name: str, form: str, attempt: int) -> None:
+    """记录某接口第 attempt 次（从 0 开始）尝试用 form 格式取到了数据"""
+    global _dirty
+    with _lock:
+        _ensure_loaded()
+        if attempt > 0:
+            _stats["fallbacks"] += 1
+        elif form != "plain":
+            # 没有记忆时会先白白请求一次 plain
+            _stats["saved"] += 1
+        if _memo.get(fn_name) != form:
+            _memo[fn_name] = form
+            _dirty = True
+
+
+def memo_stats() -> Dict[str, int]:
+    with _lock:
+        return dict(_stats)
+
+
+def save_memo() -> None:
+    """有变化时原子写回文件"""
+    global _dirty
+    with _lock:
+        if not _dirty:
+            return
+        try:
+            os.makedirs(os.path.dirname(MEMO_PATH), exist_ok=True)
+            tmp_path = f"{MEMO_PATH}.{os.getpid()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(_memo, f, ensure_ascii=False, indent=2, sort_keys=True)
+            os.replace(tmp_path, MEMO_PATH)
+            _dirty = False
+        except Exception:
+            pass
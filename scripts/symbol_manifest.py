@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+"""每只股票的本地清单 outputs/manifest/{symbol}.json，记录增量下载/上传所需的状态
+
+字段:
+  financials_latest: {报表类型: 已入库的最新报告期 YYYYMMDD}，由上传脚本在成功后更新
+  long_table: 最近一次写出的长表是 "full"（全量）还是 "incremental"（仅新报告期）
+  mkt_cap_uploaded_through: 已上传到 stock_valuation_history 的最后交易日 YYYY-MM-DD
+
+差异上传使用的逐行哈希单独保存在 outputs/manifest/row_hashes/ 下（见 row_hashes.py）。
+"""
+import os
+import json
+import threading
+from typing import Any, Dict
+
+
+MANIFEST_DIR = os.path.join("outputs", "manifest")
+
+_lock = threading.Lock()
+
+
+def manifest_path(symbol: str) -> str:
+    return os.path.join(MANIFEST_DIR, f"{symbol}.json")
+
+
+def load_manifest(symbol: str) -> Dict[str, Any]:
+    path = manifest_path(symbol)
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except Exception:
+        return {}
+
+
+def update_manifest(symbol: str, **fields: Any) -> Dict[str, Any]:
+    """合并写入字段（原子替换文件），返回更新后的清单"""
+    with _lock:
+        manifest = load_manifest(symbol)
+        manifest.update(fields)
+        os.makedirs(MANIFEST_DIR, exist_ok=True)
+        path = manifest_path(symbol)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, path)
+        return manifest
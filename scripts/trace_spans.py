@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""下载 / 上传各阶段的耗时记录（span），写入 JSONL 追踪文件
+
+每个 span 一行 JSON：
+  {"run": 运行 ID, "stage": 阶段, "symbol": ..., "rows": ..., "bytes": ...,
+   "start": 开始时间戳, "duration_ms": 耗时, "status": "ok"/"error", ...附加字段}
+
+阶段: akshare（单次接口调用，附 endpoint）、download（单个数据集）、long_table（合并长表）、
+write（写中间文件）、load（上传前读取）、delete、upload_batch（单批上传，附 table、attempt）。
+
+默认关闭。--trace 写入 outputs/trace/spans.jsonl，--trace=路径 或环境变量
+PIPELINE_TRACE=路径 指定文件；PIPELINE_RUN_ID 可让下载和上传共用一个运行 ID。
+汇总: python scripts/trace_summary.py outputs/trace/spans.jsonl
+"""
+import os
+import json
+import time
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional
+
+
+DEFAULT_TRACE_PATH = os.path.join("outputs", "trace", "spans.jsonl")
+
+_config = {
+    "path": os.getenv("PIPELINE_TRACE", "").strip() or None,
+    "run": os.getenv("PIPELINE_RUN_ID", "").strip() or time.strftime("%Y%m%d-%H%M%S") + f"-{os.getpid()}",
+}
+_write_lock = threading.Lock()
+
+
+def configure_trace(path: Optional[str] = None, run_id: Optional[str] = None) -> None:
+    if path is not None:
+        _config["path"] = path or None
+    if run_id:
+        _config["run"] = run_id
+
+
+def trace_from_argv(argv) -> Optional[str]:
+    """解析 --trace / --trace=路径，未指定时返回 None（沿用环境变量）"""
+    for a in argv:
+        if a == "--trace":
+            return DEFAULT_TRACE_PATH
+        if a.startswith("--trace="):
+            return a.split("=", 1)[1].strip() or DEFAULT_TRACE_PATH
+    return None
+
+
+def tracing_enabled() -> bool:
+    return _config["path"] is not None
+
+
+def trace_path() -> Optional[str]:
+    return _config["path"]
+
+
+def record_span(record: Dict[str, Any]) -> None:
+    path = _config["path"]
+    if path is None:
+        return
+    line = json.dumps({"run": _config["run"], **record}, ensure_ascii=False, default=str) + "\n"
+    try:
+        with _write_lock:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            # 追加模式单次写入整行，多个进程写同一文件也不会交错
+            with open(path, "a", encoding="utf-8") as f:
+                f.write(line)
+    except Exception:
+        pass
+
+
+@contextmanager
+def span(stage: str, **attrs: Any) -> Iterator[Dict[str, Any]]:
+    """记录一个阶段的耗时；在 with 块内可以设置 s["rows"]、s["bytes"] 等字段
+
+    未开启追踪时只返回一个普通 dict，几乎没有开销。异常会记录为 status=error 后继续抛出。
+    """
+    s: Dict[str, Any] = dict(attrs)
+    if _config["path"] is None:
+        yield s
+        return
+    start = time.time()
+    t0 = time.perf_counter()
+    status = "ok"
+    try:
+        yield s
+    except BaseException as e:
+        status = "error"
+        s["error"] = str(e)[:200]
+        raise
+    finally:
+        record_span({
+            "stage": stage,
+            **s,
+            "start": round(start, 3),
+            "duration_ms": round((time.perf_counter() - t0) * 1000, 2),
+            "status": status,
+        })
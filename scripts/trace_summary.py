@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""汇总 trace_spans 写出的 JSONL 追踪文件：各阶段次数、总耗时、p50/p95/最大耗时
+
+用法:
+  python scripts/trace_summary.py outputs/trace/spans.jsonl
+  python scripts/trace_summary.py outputs/trace/spans.jsonl --run=20260101-020000-123
+  python scripts/trace_summary.py outputs/trace/spans.jsonl --all-runs
+
+默认只统计文件中最后一次运行；akshare 阶段按接口（endpoint）拆分，
+download 按数据集、write 按产物、upload_batch 按表拆分，按总耗时降序排列。
+"""
+import sys
+import json
+from typing import Any, Dict, List
+
+import pandas as pd
+
+
+# 各阶段用于拆分统计的字段
+DETAIL_FIELDS = {
+    "akshare": "endpoint",
+    "download": "dataset",
+    "write": "artifact",
+    "load": "dataset",
+    "delete": "table",
+    "upload_batch": "table",
+}
+
+
+def read_spans(path: str) -> List[Dict[str, Any]]:
+    spans = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                spans.append(json.loads(line))
+            except json.JSONDecodeError:
+                continue  # 进程被中断时最后一行可能不完整
+    return spans
+
+
+def summarize(spans: List[Dict[str, Any]]) -> pd.DataFrame:
+    if not spans:
+        return pd.DataFrame()
+    df = pd.DataFrame(spans)
+    for col in ["rows", "bytes"]:
+        if col not in df.columns:
+            df[col] = None
+        df[col] = pd.to_numeric(df[col], errors="coerce")
+    if "status" not in df.columns:
+        df["status"] = "ok"
+
+    def stage_key(row) -> str:
+        field = DETAIL_FIELDS.get(row["stage"])
+        detail = row.get(field) if field else None
+        return f"{row['stage']}:{detail}" if isinstance(detail, str) and detail else row["stage"]
+
+    df["key"] = df.apply(stage_key, axis=1)
+    grouped = df.groupby("key")
+    summary = pd.DataFrame({
+        "count": grouped.size(),
+        "errors": grouped["status"].apply(lambda s: int((s != "ok").sum())),
+        "total_s": grouped["duration_ms"].sum() / 1000,
+        "p50_ms": grouped["duration_ms"].quantile(0.5),
+        "p95_ms": grouped["duration_ms"].quantile(0.95),
+        "max_ms": grouped["duration_ms"].max(),
+        "rows": grouped["rows"].sum(min_count=1).round().astype("Int64"),
+        "mb": grouped["bytes"].sum(min_count=1) / 1e6,
+    })
+    return summary.sort_values("total_s", ascending=False)
+
+
+def main():
+    paths = [a for a in sys.argv[1:] if not a.startswith("--")]
+    if not paths:
+        print(__doc__)
+        sys.exit(1)
+    run = None
+    all_runs = "--all-runs" in sys.argv
+    for a in sys.argv[1:]:
+        if a.startswith("--run="):
+            run = a.split("=", 1)[1].strip()
+
+    spans = []
+    for path in paths:
+        spans.extend(read_spans(path))
+    if not spans:
+        print("追踪文件中没有记录")
+        sys.exit(1)
+
+    if run is None and not all_runs:
+        run = spans[-1].get("run")
+    if run is not None:
+        spans = [s for s in spans if s.get("run") == run]
+
+    summary = summarize(spans)
+    print(f"=" * 50)
+    print(f"运行: {run if run is not None else '全部'}  span 数: {len(spans)}")
+    print(f"=" * 50)
+    print(summary.to_string(float_format="{:,.1f}".format, na_rep="-"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""上传断点日志：记录已提交的批次，中断后 --resume 跳过已写入的部分
+
+outputs/manifest/upload_journal.sqlite 中每行是一个已提交的批次 (表, 股票, 批次哈希, 行数)。
+记录按固定 1000 行切分为日志批次（与自适应的请求批次无关），哈希只取决于批次内容，
+同样的输入在重跑时得到同样的批次，已提交的直接跳过；日志批次内的行全部写入成功后才记录。
+
+不加 --resume 的上传开始前清除该股票的记录（全量上传会先删除旧数据，旧记录不再可信）；
+四张表全部写入成功后也清除，日志中有记录即表示上次上传中断，--resume 才跳过删除。
+"""
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+
+JOURNAL_PATH = os.path.join("outputs", "manifest", "upload_journal.sqlite")
+JOURNAL_UNIT_ROWS = 1000
+
+
+def resume_from_argv(argv) -> bool:
+    return "--resume" in argv
+
+
+class UploadJournal:
+    """SQLite 断点日志（同一进程内多线程共用一个连接，写入加锁）"""
+
+    unit_rows = JOURNAL_UNIT_ROWS
+
+    def __init__(self, path: str = JOURNAL_PATH):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.execute("pragma journal_mode=wal")
+        self._conn.execute(
+            "create table if not exists committed_batches ("
+            " tbl text not null, symbol text not null, batch_hash text not null,"
+            " rows integer not null, committed_at real not null,"
+            " primary key (tbl, symbol, batch_hash))"
+        )
+
+    @staticmethod
+    def batch_hash(records: List[Dict[str, Any]]) -> str:
+        text = json.dumps(records, ensure_ascii=False, sort_keys=True, default=str)
+        return hashlib.blake2b(text.encode("utf-8"), digest_size=16).hexdigest()
+
+    def committed(self, table: str, symbol: str) -> Set[str]:
+        with self._lock:
+            rows = self._conn.execute(
+                "select batch_hash from committed_batches where tbl = ? and symbol = ?", (table, symbol)
+            ).fetchall()
+        return {r[0] for r in rows}
+
+    def has_entries(self, table: str, symbol: str) -> bool:
+        with self._lock:
+            row = self._conn.execute(
+                "select 1 from committed_batches where tbl = ? and symbol = ? limit 1", (table, symbol)
+            ).fetchone()
+        return row is not None
+
+    def record(self, table: str, symbol: str, batch_hash: str, rows: int) -> None:
+        with self._lock:
+            self._conn.execute(
+                "insert or replace into committed_batches values (?, ?, ?, ?, ?)",
+                (table, symbol, batch_hash, rows, time.time()),
+            )
+
+    def clear(self, symbols: Iterable[str], table: Optional[str] = None) -> None:
+        """清除这些股票的记录（table 为 None 时清除所有表）"""
+        with self._lock:
+            for symbol in symbols:
+                if table is None:
+                    self._conn.execute("delete from committed_batches where symbol = ?", (symbol,))
+                else:
+                    self._conn.execute(
+                        "delete from committed_batches where tbl = ? and symbol = ?", (table, symbol)
+                    )
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
@@ -2,22 +2,57 @@
 import os
 import sys
 import time
-from typing import List, Dict, Any
+import threading
+from typing import List, Dict, Any, Optional, Tuple, Union
 from concurrent.futures import ThreadPoolExecutor, as_completed
 
+import numpy as np
 import pandas as pd
 from dotenv import load_dotenv
-from supabase import create_client
+
+from batch_uploader import table_sender, upload_records, upload_table
+from pipeline_io import format_from_argv, read_artifact
+from rest_transport import clean_record
+from row_hashes import (
+    KEY_SEP, clear_row_hashes, diff_records, hash_records, load_row_hashes, row_key, save_row_hashes,
+)
+from supabase_clients import rest_client
+from symbol_manifest import load_manifest, update_manifest
+from trace_spans import configure_trace, span, trace_from_argv, trace_path
+from upload_journal import UploadJournal, resume_from_argv
 
 
 def parse_args(argv: List[str]) -> Dict[str, str]:
     symbol = "000333"
+    symbols_file = ""
+    chunk = str(SYMBOL_CHUNK)
+    diff = ""
+    backend = "rest"
     for i, a in enumerate(argv):
         if a == "--symbol" and i + 1 < len(argv):
             symbol = argv[i + 1].strip()
         if a.startswith("--symbol="):
             symbol = a.split("=", 1)[1].strip()
-    return {"symbol": symbol}
+        if a == "--symbols-file" and i + 1 < len(argv):
+            symbols_file = argv[i + 1].strip()
+        if a.startswith("--symbols-file="):
+            symbols_file = a.split("=", 1)[1].strip()
+        if a.startswith("--chunk="):
+            chunk = a.split("=", 1)[1].strip()
+        if a == "--diff":
+            diff = "1"
+        if a.startswith("--backend="):
+            backend = a.split("=", 1)[1].strip().lower()
+    return {
+        "resume": resume_from_argv(argv),
+        "symbol": symbol,
+        "symbols_file": symbols_file,
+        "chunk": chunk,
+        "format": format_from_argv(argv),
+        "trace": trace_from_argv(argv) or "",
+        "diff": diff,
+        "backend": backend,
+    }
 
 
 def normalize_symbol(symbol: str) -> str:
@@ -32,31 +67,6 @@ def normalize_symbol(symbol: str) -> str:
     return s
 
 
-def chunked(items: List[Dict[str, Any]], size: int = 500) -> List[List[Dict[str, Any]]]:
-    return [items[i:i + size] for i in range(0, len(items), size)]
-
-
-def clean_value(v):
-    """Clean values for JSON serialization - handle NaN, Inf, -Inf"""
-    import math
-    import numpy as np
-    if v is None:
-        return None
-    if isinstance(v, float):
-        if math.isnan(v) or math.isinf(v):
-            return None
-    if isinstance(v, (np.floating, np.integer)):
-        if np.isnan(v) or np.isinf(v):
-            return None
-        return float(v) if isinstance(v, np.floating) else int(v)
-    return v
-
-
-def clean_record(record: Dict[str, Any]) -> Dict[str, Any]:
-    """Clean all values in a record for JSON serialization"""
-    return {k: clean_value(v) for k, v in record.items()}
-
-
 def ensure_columns(df: pd.DataFrame, required: List[str], name: str):
     missing = [c for c in required if c not in df.columns]
     if missing:
@@ -91,126 +101,558 @@ def is_numeric_value(val) -> bool:
     return False
 
 
-def load_financials(symbol: str) -> List[Dict[str, Any]]:
-    path = os.path.join("outputs", f"{symbol}_financials_10y_long_combined.csv")
-    df = pd.read_csv(path, dtype={"股票代码": str})  # 强制读取为字符串
+def latest_report_dates(records: List[Dict[str, Any]]) -> Dict[str, str]:
+    """各报表类型的最新报告期 {报表类型: YYYYMMDD}"""
+    latest = {}
+    for r in records:
+        report_date = r.get("report_date")
+        statement_type = r.get("statement_type")
+        if not report_date or not statement_type:
+            continue
+        d = str(report_date).replace("-", "")
+        if d > latest.get(statement_type, ""):
+            latest[statement_type] = d
+    return latest
+
+
+def format_report_dates(series: pd.Series) -> pd.Series:
+    """列式 format_report_date：只对去重后的值做解析，再映射回整列
+
+    8 位数字直接切片；其余值一次性交给 pd.to_datetime，无法解析的保留原文本。
+    """
+    text = series.astype(object).where(series.notna(), None)
+    uniques = [v for v in pd.unique(text) if v is not None]
+    stripped = pd.Series([str(v).strip() for v in uniques], dtype=object)
+    eight_digits = stripped.str.fullmatch(r"\d{8}")
+    formatted = stripped.str[:4] + "-" + stripped.str[4:6] + "-" + stripped.str[6:]
+    rest = ~eight_digits
+    if rest.any():
+        parsed = pd.to_datetime(stripped[rest], format="mixed", errors="coerce")
+        formatted[rest] = parsed.dt.strftime("%Y-%m-%d").where(parsed.notna(), stripped[rest])
+    mapping = dict(zip(uniques, formatted))
+    return text.map(lambda v: mapping.get(v) if v is not None else None)
+
+
+def column(df: pd.DataFrame, name: str) -> pd.Series:
+    """等价于逐行 row.get(name)：缺失列返回全 None，缺失值统一为 None"""
+    if name not in df.columns:
+        return pd.Series([None] * len(df), index=df.index, dtype=object)
+    col = df[name].astype(object)
+    return col.where(col.notna(), None)
+
+
+def normalize_codes(values: pd.Series, strip_prefix: bool = False) -> pd.Series:
+    """股票代码列：去空白、可选去除 SZ/SH/SS 前缀，纯数字补齐 6 位"""
+    raw = values.astype(object)
+    text = raw.where(raw.notna(), "nan").astype(str).str.strip()
+    if strip_prefix:
+        prefixed = text.str.upper().str.startswith(("SZ", "SH", "SS"))
+        text = text.where(~prefixed, text.str[2:])
+    return text.where(~text.str.isdigit(), text.str.zfill(6)).astype(object)
+
+
+def numeric_mask(series: pd.Series) -> pd.Series:
+    """列式 is_numeric_value：缺失值和可转换为数值的值为 True
+
+    pd.to_numeric 无法转换的少量非缺失值再逐个按 is_numeric_value 判断，保证规则一致。
+    """
+    numeric = pd.to_numeric(series, errors="coerce")
+    mask = numeric.notna() | series.isna()
+    undecided = ~mask
+    if undecided.any():
+        mask[undecided] = series[undecided].map(is_numeric_value).astype(bool)
+    return mask
+
+
+def load_financials(symbol: str, fmt: str = "csv") -> List[Dict[str, Any]]:
+    df = read_artifact(symbol, "financials_long", fmt, csv_dtype={"股票代码": str})  # 强制读取为字符串
+    return financials_records(df)
+
+
+def financials_records(df: pd.DataFrame) -> List[Dict[str, Any]]:
+    """财务长表 -> company_financials_long 记录"""
     ensure_columns(df, ["股票代码", "报告日", "报表类型", "财务科目", "数值"], "财务长表")
 
-    df["report_date"] = df["报告日"].apply(format_report_date)
-    df["announcement_date"] = df.get("公告日期", None).apply(format_report_date) if "公告日期" in df.columns else None
-
-    records = []
-    skipped = 0
-    for _, row in df.iterrows():
-        # 跳过非数值类型的 value（如 SECUCODE, SECURITY_NAME_ABBR 等字段）
-        val = row.get("数值")
-        if not is_numeric_value(val):
-            skipped += 1
-            continue
-        
-        # 确保股票代码格式化为 6 位（补前导零）
-        raw_symbol = str(row.get("股票代码", "")).strip()
-        formatted_symbol = raw_symbol.zfill(6) if raw_symbol.isdigit() else raw_symbol
-        records.append({
-            "symbol": formatted_symbol,
-            "report_date": row.get("report_date"),
-            "statement_type": row.get("报表类型"),
-            "account": row.get("财务科目"),
-            "value": float(val) if pd.notna(val) and val != "" else None,
-            "data_source": row.get("数据源"),
-            "is_audited": row.get("是否审计"),
-            "announcement_date": row.get("announcement_date"),
-            "currency": row.get("币种"),
-            "report_type": row.get("类型"),
-            "updated_at": format_report_date(row.get("更新日期")),
-        })
+    # 跳过非数值类型的 value（如 SECUCODE, SECURITY_NAME_ABBR 等字段）
+    keep = numeric_mask(df["数值"])
+    skipped = int((~keep).sum())
+    df = df[keep]
+
+    # 数字字符串按 float() 转换（pd.to_numeric 的快速解析在末位可能有舍入差异）
+    raw = df["数值"].astype(object)
+    values = raw.where(raw.notna() & (raw != ""), np.nan).astype(float)
+    records = pd.DataFrame({
+        "symbol": normalize_codes(df["股票代码"]),
+        "report_date": format_report_dates(df["报告日"]),
+        "statement_type": column(df, "报表类型"),
+        "account": column(df, "财务科目"),
+        "value": values.astype(object).where(values.notna(), None),
+        "data_source": column(df, "数据源"),
+        "is_audited": column(df, "是否审计"),
+        "announcement_date": format_report_dates(column(df, "公告日期")),
+        "currency": column(df, "币种"),
+        "report_type": column(df, "类型"),
+        "updated_at": format_report_dates(column(df, "更新日期")),
+    }).to_dict("records")
     if skipped > 0:
         print(f"  跳过 {skipped} 条非数值记录")
     return records
 
 
-def load_mkt_cap(symbol: str) -> List[Dict[str, Any]]:
-    path = os.path.join("outputs", f"{symbol}_mkt_cap_10y.csv")
-    df = pd.read_csv(path)
+def load_mkt_cap(symbol: str, fmt: str = "csv") -> List[Dict[str, Any]]:
+    return mkt_cap_records(read_artifact(symbol, "mkt_cap", fmt), symbol)
+
+
+def mkt_cap_records(df: pd.DataFrame, symbol: str) -> List[Dict[str, Any]]:
+    """市值历史 -> stock_valuation_history 记录"""
     ensure_columns(df, ["date", "mkt_cap_billion_cny"], "市值历史")
 
-    records = []
-    for _, row in df.iterrows():
-        date = format_report_date(row.get("date"))
-        mkt_cap = row.get("mkt_cap_billion_cny")
-        if pd.isna(mkt_cap):
-            mkt_cap = None
-        records.append({
-            "id": f"{symbol}_{date}",
-            "symbol": symbol,
-            "date": date,
-            "Market_cap": mkt_cap,
-            "unit": "bn",
-            "currency": "cny",
-        })
-    return records
+    dates = format_report_dates(df["date"])
+    return pd.DataFrame({
+        "id": [f"{symbol}_{d}" for d in dates],
+        "symbol": symbol,
+        "date": dates,
+        "Market_cap": column(df, "mkt_cap_billion_cny"),
+        "unit": "bn",
+        "currency": "cny",
+    }, index=df.index).to_dict("records")
 
 
-def load_sharehold(symbol: str) -> List[Dict[str, Any]]:
-    path = os.path.join("outputs", f"{symbol}_holder_count_concentration_10y.csv")
-    df = pd.read_csv(path, dtype={"证券代码": str})  # 强制读取为字符串
+def load_sharehold(symbol: str, fmt: str = "csv") -> List[Dict[str, Any]]:
+    df = read_artifact(symbol, "holder_count", fmt, csv_dtype={"证券代码": str})  # 强制读取为字符串
+    return sharehold_records(df)
+
+
+def sharehold_records(df: pd.DataFrame) -> List[Dict[str, Any]]:
+    """股东人数集中度 -> cn_sharehold_data 记录"""
     ensure_columns(df, ["证券代码", "变动日期", "本期股东人数"], "股东集中度")
 
-    records = []
-    for _, row in df.iterrows():
-        raw_symbol = str(row.get("证券代码", "")).strip()
-        formatted_symbol = raw_symbol.zfill(6) if raw_symbol.isdigit() else raw_symbol
-        records.append({
-            "symbol": formatted_symbol,
-            "name": row.get("证券简称"),
-            "report_date": format_report_date(row.get("变动日期")),
-            "current_holder_count": row.get("本期股东人数") if pd.notna(row.get("本期股东人数")) else None,
-            "previous_holder_count": row.get("上期股东人数") if pd.notna(row.get("上期股东人数")) else None,
-            "holder_count_change_pct": row.get("股东人数增幅") if pd.notna(row.get("股东人数增幅")) else None,
-            "current_avg_shares": row.get("本期人均持股数量") if pd.notna(row.get("本期人均持股数量")) else None,
-            "previous_avg_shares": row.get("上期人均持股数量") if pd.notna(row.get("上期人均持股数量")) else None,
-            "avg_shares_change_pct": row.get("人均持股数量增幅") if pd.notna(row.get("人均持股数量增幅")) else None,
-            "report_period": row.get("报告期"),
-        })
-    return records
+    return pd.DataFrame({
+        "symbol": normalize_codes(df["证券代码"]),
+        "name": column(df, "证券简称"),
+        "report_date": format_report_dates(df["变动日期"]),
+        "current_holder_count": column(df, "本期股东人数"),
+        "previous_holder_count": column(df, "上期股东人数"),
+        "holder_count_change_pct": column(df, "股东人数增幅"),
+        "current_avg_shares": column(df, "本期人均持股数量"),
+        "previous_avg_shares": column(df, "上期人均持股数量"),
+        "avg_shares_change_pct": column(df, "人均持股数量增幅"),
+        "report_period": column(df, "报告期"),
+    }).to_dict("records")
+
 
+def load_top10(symbol: str, fmt: str = "csv") -> List[Dict[str, Any]]:
+    df = read_artifact(symbol, "top10", fmt, csv_dtype={"股票代码": str})  # 强制读取为字符串
+    return top10_records(df)
 
-def load_top10(symbol: str) -> List[Dict[str, Any]]:
-    path = os.path.join("outputs", f"{symbol}_top10_shareholders_10y.csv")
-    df = pd.read_csv(path, dtype={"股票代码": str})  # 强制读取为字符串
+
+def top10_records(df: pd.DataFrame) -> List[Dict[str, Any]]:
+    """前十大股东 -> cn_top10_sharehold 记录"""
     ensure_columns(df, ["名次", "股东名称", "报告期"], "前十大股东")
 
-    records = []
-    for _, row in df.iterrows():
-        # 跳过 rank 为空的记录（数据库要求非空）
-        if pd.isna(row.get("名次")):
-            continue
-        
-        # 处理 symbol：去除 SZ/SH 前缀并补齐 6 位
-        raw_symbol = str(row.get("股票代码", "")).strip() or row.get("symbol", "")
-        # 去除 SZ/SH/SS 前缀
-        if raw_symbol.upper().startswith(("SZ", "SH", "SS")):
-            raw_symbol = raw_symbol[2:]
-        formatted_symbol = raw_symbol.zfill(6) if raw_symbol.isdigit() else raw_symbol
-        
-        records.append({
-            "symbol": formatted_symbol,
-            "report_date": row.get("报告期"),
-            "rank": int(row.get("名次")),
-            "shareholder_name": row.get("股东名称"),
-            "share_type": row.get("股份类型"),
-            "shares_held": int(row.get("持股数")) if pd.notna(row.get("持股数")) else None,
-            "holding_ratio": row.get("占总股本持股比例") if pd.notna(row.get("占总股本持股比例")) else None,
-            "change_amount": row.get("增减"),
-            "change_ratio": row.get("变动比率") if pd.notna(row.get("变动比率")) else None,
-        })
-    return records
+    # 跳过 rank 为空的记录（数据库要求非空）
+    df = df[df["名次"].notna()]
+
+    # 处理 symbol：股票代码为空时使用 symbol 列，去除 SZ/SH/SS 前缀并补齐 6 位
+    symbols = column(df, "股票代码").fillna("").astype(str).str.strip()
+    if "symbol" in df.columns:
+        symbols = symbols.where(symbols != "", df["symbol"])
+    symbols = normalize_codes(symbols, strip_prefix=True)
+
+    shares = pd.to_numeric(column(df, "持股数"), errors="coerce")
+    return pd.DataFrame({
+        "symbol": symbols,
+        "report_date": column(df, "报告期"),
+        "rank": df["名次"].astype(float).astype(int),
+        "shareholder_name": column(df, "股东名称"),
+        "share_type": column(df, "股份类型"),
+        "shares_held": np.trunc(shares).astype("Int64").astype(object).where(shares.notna(), None),
+        "holding_ratio": column(df, "占总股本持股比例"),
+        "change_amount": column(df, "增减"),
+        "change_ratio": column(df, "变动比率"),
+    }).to_dict("records")
+
+
+BATCH_SIZE = 1000  # 初始批次大小，之后按实际延迟和请求体大小自动调整
+
+
+FINANCIALS_TABLE = "company_financials_long"
+# 差异上传的主键（哈希文件按股票分开保存，不含 symbol）
+FINANCIALS_KEY = ["report_date", "statement_type", "account"]
+FINANCIALS_UPSERT_KEY = ["symbol"] + FINANCIALS_KEY
+DELETE_CHUNK = 200  # in_ 过滤条件放在 URL 中，限制单次删除的科目数
+# 多股票上传（--symbols-file）每组的股票数：组内各表的记录合并成满批上传，旧数据一次 in_ 删除
+SYMBOL_CHUNK = 20
+
+# 各表的自然键：重复上传时按自然键更新已有行
+NATURAL_KEYS = {
+    "stock_valuation_history": ["symbol", "date"],
+    "cn_sharehold_data": ["symbol", "report_date"],
+    "cn_top10_sharehold": ["symbol", "report_date", "rank"],
+}
+# public 下的这两张表是 stock_analysis 底表的视图，视图不能 ON CONFLICT；
+# 其 INSTEAD OF INSERT 触发器按底表的自然键唯一约束 ON CONFLICT DO UPDATE，insert 即 upsert
+VIEW_TABLES = {"cn_sharehold_data", "cn_top10_sharehold"}
+KEY_PAGE_SIZE = 1000  # PostgREST 默认单次最多返回 1000 行
+
+
+def delete_financials(client, symbol: str) -> bool:
+    """删除该股票在 company_financials_long 中的全部旧数据（全量长表上传前调用），返回是否成功"""
+    # 无论删除是否成功，本地哈希都不再代表数据库中的内容
+    clear_row_hashes(FINANCIALS_TABLE, symbol)
+    try:
+        with span("delete", symbol=symbol, table=FINANCIALS_TABLE):
+            client.table(FINANCIALS_TABLE).delete().eq("symbol", symbol).execute()
+        print("  - company_financials_long: 删除完成")
+        return True
+    except Exception as e:
+        print(f"  - company_financials_long: 删除失败 - {str(e)[:50]}")
+        return False
+
+
+def chunk_label(symbols: List[str]) -> str:
+    """一组股票在追踪和断点日志中的名称"""
+    return symbols[0] if len(symbols) == 1 else f"{symbols[0]}..{symbols[-1]}"
+
+
+def delete_financials_chunk(client, symbols: List[str]) -> List[str]:
+    """一次 in_ 删除一组股票的旧长表数据，返回删除成功的股票；整组删除失败（如语句超时）时逐只重试"""
+    if not symbols:
+        return []
+    for symbol in symbols:
+        clear_row_hashes(FINANCIALS_TABLE, symbol)
+    try:
+        with span("delete", symbol=chunk_label(symbols), table=FINANCIALS_TABLE, symbols=len(symbols)):
+            client.table(FINANCIALS_TABLE).delete().in_("symbol", symbols).execute()
+        return list(symbols)
+    except Exception as e:
+        print(f"  - company_financials_long: 整组删除失败，逐只删除 - {str(e)[:50]}")
+    return [symbol for symbol in symbols if delete_financials(client, symbol)]
+
+
+def delete_financial_keys(client, symbol: str, keys: List[str]) -> int:
+    """按主键删除行：同一报告期、报表类型的科目合并为一次 in_ 删除"""
+    groups: Dict[Tuple[str, str], List[str]] = {}
+    for key in keys:
+        report_date, statement_type, account = key.split(KEY_SEP, 2)
+        groups.setdefault((report_date, statement_type), []).append(account)
+    deleted = 0
+    for (report_date, statement_type), accounts in groups.items():
+        for i in range(0, len(accounts), DELETE_CHUNK):
+            chunk = accounts[i:i + DELETE_CHUNK]
+            with span("delete", symbol=symbol, table=FINANCIALS_TABLE, rows=len(chunk)):
+                client.table(FINANCIALS_TABLE).delete().eq("symbol", symbol).eq("report_date", report_date) \
+                    .eq("statement_type", statement_type).in_("account", chunk).execute()
+            deleted += len(chunk)
+    return deleted
+
+
+def upload_financial_records(client, symbol: str, records: List[Dict[str, Any]],
+                             journal: Optional[UploadJournal] = None) -> int:
+    """自适应并发 upsert 长表，有失败批次时抛出 RuntimeError；传入 journal 时跳过已提交的批次"""
+    # 多个批次并发写入，同一主键只保留最后一条（与按顺序 upsert 的结果一致）
+    latest = {row_key(r, FINANCIALS_UPSERT_KEY): r for r in records}
+    result = upload_table(client, FINANCIALS_TABLE, list(latest.values()), method="upsert",
+                          on_conflict=",".join(FINANCIALS_UPSERT_KEY), batch_size=BATCH_SIZE, symbol=symbol,
+                          journal=journal)
+    return result["uploaded"] + result["skipped"]
+
+
+def record_financials_latest(symbol: str, records: List[Dict[str, Any]],
+                             previous: Optional[Dict[str, str]] = None) -> None:
+    """记录已入库的最新报告期，供下次增量下载使用；previous 为增量上传前已入库的报告期"""
+    latest = dict(previous or {})
+    for statement_type, d in latest_report_dates(records).items():
+        if d > latest.get(statement_type, ""):
+            latest[statement_type] = d
+    update_manifest(symbol, financials_latest=latest)
+
+
+def upload_financials_diff(client, symbol: str, records: List[Dict[str, Any]],
+                           previous: Dict[str, str], incremental: bool = False,
+                           journal: Optional[UploadJournal] = None) -> Dict[str, int]:
+    """差异上传：只发送新增和内容变化的行，删除本次报表中不再出现的主键
+
+    只比较本次包含的报表类型（某张报表下载失败时不会删除它的旧数据）；
+    增量长表只包含新报告期，不删除任何行。全部成功后保存新的哈希。
+    """
+    cleaned = [clean_record(r) for r in records]
+    statement_types = {r.get("statement_type") for r in cleaned}
+    scope = None if incremental else (lambda key: key.split(KEY_SEP, 2)[1] in statement_types)
+    inserts, updates, deletes, hashes = diff_records(cleaned, previous, FINANCIALS_KEY, scope)
+    upload_financial_records(client, symbol, inserts + updates, journal)
+    delete_financial_keys(client, symbol, deletes)
+    save_row_hashes(FINANCIALS_TABLE, symbol, hashes)
+    return {
+        "inserted": len(inserts),
+        "updated": len(updates),
+        "deleted": len(deletes),
+        "unchanged": len({row_key(r, FINANCIALS_KEY) for r in cleaned}) - len(inserts) - len(updates),
+    }
+
+
+def remember_financial_hashes(symbol: str, records: List[Dict[str, Any]], incremental: bool = False) -> None:
+    """非差异上传成功后记录哈希，供之后的 --diff 使用
+
+    全量上传（先删除）后哈希即为本次记录；增量上传只能合并到已有的哈希，没有时不记录。
+    """
+    save_financial_hashes(symbol, hash_records((clean_record(r) for r in records), FINANCIALS_KEY), incremental)
+
+
+def save_financial_hashes(symbol: str, hashes: Dict[str, str], incremental: bool = False) -> None:
+    if incremental:
+        previous = load_row_hashes(FINANCIALS_TABLE, symbol)
+        if previous is None:
+            return
+        previous.update(hashes)
+        hashes = previous
+    save_row_hashes(FINANCIALS_TABLE, symbol, hashes)
+
+
+def pending_mkt_cap_records(records: List[Dict[str, Any]], manifest: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """清单中记录的已上传日期之后的新交易日"""
+    uploaded_through = manifest.get("mkt_cap_uploaded_through") or ""
+    return [r for r in records if (r.get("date") or "") > uploaded_through]
+
+
+def mark_mkt_cap_uploaded(symbol: str, new_records: List[Dict[str, Any]], manifest: Dict[str, Any]) -> None:
+    """新交易日全部写入成功后推进清单中的已上传日期"""
+    if new_records:
+        uploaded_through = manifest.get("mkt_cap_uploaded_through") or ""
+        latest = max((r["date"] for r in new_records if r.get("date")), default=uploaded_through)
+        update_manifest(symbol, mkt_cap_uploaded_through=latest)
+
+
+def upload_mkt_cap_records(client, symbol: str, records: List[Dict[str, Any]],
+                           manifest: Dict[str, Any],
+                           journal: Optional[UploadJournal] = None) -> Tuple[Dict[str, Any], int]:
+    """只上传清单中记录的已上传日期之后的新交易日，返回 (upsert_records 的统计, 跳过条数)"""
+    new_records = pending_mkt_cap_records(records, manifest)
+    counts = upsert_records(client, symbol, "stock_valuation_history", new_records, journal)
+    if not counts["failed"]:
+        mark_mkt_cap_uploaded(symbol, new_records, manifest)
+    return counts, len(records) - len(new_records)
+
+
+def existing_keys(client, table: str, symbol: Union[str, List[str]], key_fields: List[str]) -> set:
+    """分页读取该股票（或一组股票）已入库行的自然键，用于区分新增和更新"""
+    keys = set()
+    start = 0
+    while True:
+        query = client.table(table).select(",".join(key_fields))
+        query = query.eq("symbol", symbol) if isinstance(symbol, str) else query.in_("symbol", list(symbol))
+        for field in key_fields:
+            query = query.order(field)
+        rows = query.range(start, start + KEY_PAGE_SIZE - 1).execute().data or []
+        keys.update(row_key(r, key_fields) for r in rows)
+        if len(rows) < KEY_PAGE_SIZE:
+            return keys
+        start += KEY_PAGE_SIZE
+
+
+def upsert_records(client, symbol: Union[str, List[str]], table: str, records: List[Dict[str, Any]],
+                   journal: Optional[UploadJournal] = None) -> Dict[str, Any]:
+    """按表的自然键 upsert，返回 {"inserted", "updated", "skipped", "failed", "errors"}
+
+    写入前读取已入库的自然键，按成功写入的批次统计新增 / 更新；
+    同一自然键只保留最后一条（同一批内重复会让 ON CONFLICT 报错）。
+    symbol 为一组股票时合并成满批上传，断点日志按 chunk_label 记录。
+    """
+    key_fields = NATURAL_KEYS[table]
+    latest = {row_key(r, key_fields): r for r in records}
+    if not latest:
+        return {"inserted": 0, "updated": 0, "skipped": 0, "failed": 0, "errors": []}
+    existing = existing_keys(client, table, symbol, key_fields)
+    counts = {"inserted": 0, "updated": 0}
+    lock = threading.Lock()
+
+    def count_batch(batch):
+        updated = sum(1 for r in batch if row_key(r, key_fields) in existing)
+        with lock:
+            counts["updated"] += updated
+            counts["inserted"] += len(batch) - updated
+
+    if table in VIEW_TABLES:
+        send = table_sender(client, table, "insert")
+    else:
+        send = table_sender(client, table, "upsert", on_conflict=",".join(key_fields))
+    label = symbol if isinstance(symbol, str) else chunk_label(symbol)
+    result = upload_records(send, list(latest.values()), table, batch_size=BATCH_SIZE, symbol=label,
+                            on_batch=count_batch, journal=journal)
+    return {**counts, "skipped": result["skipped"], "failed": result["failed"], "errors": result["errors"]}
+
+
+def format_upsert_counts(counts: Dict[str, Any]) -> str:
+    text = f"新增 {counts['inserted']}，更新 {counts['updated']} 条"
+    if counts.get("skipped"):
+        text += f"，断点续传跳过 {counts['skipped']} 条"
+    if counts["failed"]:
+        text += f"，失败 {counts['failed']} 条（{counts['errors'][0][:80]}）"
+    return text
+
+
+LOADERS = {
+    "financials": load_financials,
+    "mkt_caps": load_mkt_cap,
+    "sharehold": load_sharehold,
+    "top10": load_top10,
+}
+
+
+def load_symbols_data(symbols: List[str], fmt: str, errors: List[str]) -> Dict[str, Dict[str, List[Dict[str, Any]]]]:
+    """并行读取一组股票的中间文件，返回 {数据集: {股票: 记录}}；读取失败的记入 errors"""
+    data: Dict[str, Dict[str, List[Dict[str, Any]]]] = {name: {} for name in LOADERS}
+
+    def load(symbol, name):
+        with span("load", symbol=symbol, dataset=name, format=fmt) as s:
+            result = LOADERS[name](symbol, fmt)
+            s["rows"] = len(result)
+        return result
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        futures = {executor.submit(load, symbol, name): (symbol, name) for symbol in symbols for name in LOADERS}
+        for future in as_completed(futures):
+            symbol, name = futures[future]
+            try:
+                data[name][symbol] = future.result()
+            except Exception as e:
+                errors.append(f"{symbol} {name}: {str(e)[:80]}")
+    return data
+
+
+def upload_symbol_chunk(client, symbols: List[str], fmt: str, journal: UploadJournal,
+                        resume: bool = False) -> Dict[str, Any]:
+    """上传一组股票：各表的记录按股票顺序合并后满批并发写入，全量长表的旧数据一次 in_ 删除
+
+    清单（最新报告期、市值已上传日期）和行哈希仍按股票分别更新；断点日志按 chunk_label 记录，
+    同一分组、同样的内容在 --resume 时跳过已提交的批次。
+    """
+    errors: List[str] = []
+    data = load_symbols_data(symbols, fmt, errors)
+    label = chunk_label(symbols)
+    manifests = {symbol: load_manifest(symbol) for symbol in symbols}
+    financials = {symbol: records for symbol, records in data["financials"].items() if records}
+
+    resuming = resume and journal.has_entries(FINANCIALS_TABLE, label)
+    if not resume:
+        journal.clear([label])
+    incremental = {symbol for symbol in financials if manifests[symbol].get("long_table") == "incremental"}
+    replace = [symbol for symbol in symbols if symbol in financials and symbol not in incremental]
+    # 增量长表只包含新报告期，不删除；续传时上次已删除
+    deleted = set(replace) if resuming else set(delete_financials_chunk(client, replace))
+
+    def merged(name: str, per_symbol: Optional[Dict[str, List[Dict[str, Any]]]] = None) -> List[Dict[str, Any]]:
+        per_symbol = data[name] if per_symbol is None else per_symbol
+        return [r for symbol in symbols for r in per_symbol.get(symbol, [])]
+
+    def upload_financials():
+        uploaded = upload_financial_records(client, label, merged("financials", financials), journal)
+        for symbol, records in financials.items():
+            is_incremental = symbol in incremental
+            if is_incremental or symbol in deleted:
+                remember_financial_hashes(symbol, records, is_incremental)
+            previous = manifests[symbol].get("financials_latest") if is_incremental else None
+            record_financials_latest(symbol, records, previous)
+        return ("financials", uploaded)
+
+    def upload_mkt_caps():
+        pending = {symbol: pending_mkt_cap_records(records, manifests[symbol])
+                   for symbol, records in data["mkt_caps"].items()}
+        counts = upsert_records(client, symbols, "stock_valuation_history", merged("mkt_caps", pending), journal)
+        if not counts["failed"]:
+            for symbol, new_records in pending.items():
+                mark_mkt_cap_uploaded(symbol, new_records, manifests[symbol])
+        return ("mkt_caps", counts)
+
+    def upload_holders(name: str, table: str):
+        return (name, upsert_records(client, symbols, table, merged(name), journal))
+
+    results: Dict[str, Any] = {}
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        futures = [
+            executor.submit(upload_financials),
+            executor.submit(upload_mkt_caps),
+            executor.submit(upload_holders, "sharehold", "cn_sharehold_data"),
+            executor.submit(upload_holders, "top10", "cn_top10_sharehold"),
+        ]
+        for future in as_completed(futures):
+            try:
+                name, result = future.result()
+            except Exception as e:
+                errors.append(str(e)[:200])
+                continue
+            if isinstance(result, dict):
+                errors.extend(f"{label} {name}: {err}" for err in result["errors"])
+            results[name] = result
+    # 四张表全部写入成功后清除断点日志：之后的 --resume 不再跳过删除，只有中断的上传才续传
+    if not errors:
+        journal.clear([label])
+    return {"results": results, "deleted": len(deleted) if not resuming else 0, "resumed": resuming,
+            "errors": errors}
+
+
+def upload_many(args: Dict[str, Any], client) -> None:
+    """--symbols-file：按 --chunk 分组上传多只股票（REST 后端）"""
+    from fetch_stock_data import read_symbols_file
+
+    if args["backend"] == "copy":
+        print("多只股票的 COPY 上传请使用: python scripts/pg_copy_loader.py --symbols-file=...")
+        sys.exit(1)
+    if args["diff"]:
+        print("多股票上传不支持 --diff，按全量上传并记录哈希")
+    symbols = read_symbols_file(args["symbols_file"])
+    chunk_size = max(1, int(args["chunk"]))
+
+    print(f"=" * 50)
+    print(f"开始上传 {len(symbols)} 只股票，每组 {chunk_size} 只（各表合并成满批，旧数据按组删除）")
+    print(f"=" * 50)
+
+    start_time = time.time()
+    journal = UploadJournal()
+    errors: List[str] = []
+    total_rows = 0
+    for i in range(0, len(symbols), chunk_size):
+        chunk = symbols[i:i + chunk_size]
+        t0 = time.time()
+        summary = upload_symbol_chunk(client, chunk, args["format"], journal, args["resume"])
+        results = summary["results"]
+        parts = []
+        if "financials" in results:
+            parts.append(f"长表 {results['financials']} 条")
+            total_rows += results["financials"]
+        for name, label in (("mkt_caps", "市值"), ("sharehold", "股东人数"), ("top10", "前十大股东")):
+            if name in results:
+                parts.append(f"{label} {format_upsert_counts(results[name])}")
+                total_rows += results[name]["inserted"] + results[name]["updated"]
+        deleted = "续传跳过删除" if summary["resumed"] else f"删除 {summary['deleted']} 只的旧长表"
+        mark = "✗" if summary["errors"] else "✓"
+        print(f"  [{mark}] {i + len(chunk)}/{len(symbols)} {chunk_label(chunk)}: {deleted}；"
+              f"{'；'.join(parts)} ({time.time() - t0:.1f}s)", flush=True)
+        errors.extend(summary["errors"])
+    journal.close()
+
+    total_time = time.time() - start_time
+    print(f"=" * 50)
+    print(f"上传完成！共写入 {total_rows} 行，耗时: {total_time:.1f}秒")
+    print(f"=" * 50)
+    if errors:
+        print(f"错误 {len(errors)} 个: {errors[:10]}")
+    if trace_path():
+        print(f"耗时追踪已写入: {trace_path()}")
 
 
 def main():
     start_time = time.time()
     args = parse_args(sys.argv[1:])
     symbol = normalize_symbol(args["symbol"])
+    fmt = args["format"]
+    if args["trace"]:
+        configure_trace(args["trace"])
+
+    if args["backend"] not in ("rest", "copy"):
+        print(f"不支持的上传后端: {args['backend']}（可选 rest, copy）")
+        sys.exit(1)
+    copy_backend = args["backend"] == "copy"
 
     load_dotenv()
     url = os.getenv("SUPABASE_URL")
@@ -218,19 +660,25 @@ def main():
     if not url or not key:
         print("缺少 SUPABASE_URL / SUPABASE_SERVICE_ROLE_KEY")
         sys.exit(1)
-    
+
+    if args["symbols_file"]:
+        upload_many(args, rest_client(url, key))
+        return
+
     print(f"=" * 50)
     print(f"开始上传 {symbol} 数据...")
     print(f"=" * 50)
 
-    # 并行加载所有 CSV 文件
-    print("并行加载 CSV 文件...", flush=True)
+    # 并行加载所有中间文件
+    print(f"并行加载 {fmt.upper()} 文件...", flush=True)
     data = {}
     
     def load_data(name, loader):
         try:
             t0 = time.time()
-            result = loader(symbol)
+            with span("load", symbol=symbol, dataset=name, format=fmt) as s:
+                result = loader(symbol, fmt)
+                s["rows"] = len(result)
             print(f"  [✓] {name}: {len(result)} 条 ({time.time()-t0:.1f}s)", flush=True)
             return (name, result)
         except Exception as e:
@@ -253,82 +701,92 @@ def main():
     load_time = time.time() - start_time
     print(f"加载完成，耗时: {load_time:.1f}s", flush=True)
 
-    # 创建 Supabase 客户端（每个线程需要自己的客户端）
+    # 所有上传线程共用一个客户端（同一个连接池，复用 TCP/TLS 连接）
     def get_supabase():
-        return create_client(url, key)
-
-    # 删除旧数据
-    print(f"删除 {symbol} 的旧数据...")
-    supabase = get_supabase()
-    try:
-        supabase.table("company_financials_long").delete().eq("symbol", symbol).execute()
-        print("  - company_financials_long: 删除完成")
-    except Exception as e:
-        print(f"  - company_financials_long: 删除失败 - {str(e)[:50]}")
+        return rest_client(url, key)
+
+    # 断点日志：续传时跳过已提交的批次，否则清除该股票的旧记录重新开始
+    journal = UploadJournal()
+    resuming = args["resume"] and journal.has_entries(FINANCIALS_TABLE, symbol)
+    if not args["resume"]:
+        journal.clear([symbol])
+
+    # 删除旧数据（增量长表只包含新报告期，不能先删除）
+    manifest = load_manifest(symbol)
+    incremental = manifest.get("long_table") == "incremental"
+    previous_hashes = load_row_hashes(FINANCIALS_TABLE, symbol) if args["diff"] and not copy_backend else None
+    if args["diff"] and copy_backend:
+        print("COPY 后端整表合并写入，忽略 --diff")
+    elif args["diff"] and previous_hashes is None:
+        print("差异上传：本地没有已上传行的哈希，本次按全量上传并记录哈希")
+    deleted_ok = True
+    if incremental:
+        print(f"增量长表：跳过删除 {symbol} 的旧数据")
+    elif copy_backend:
+        print(f"COPY 后端：在合并事务内删除 {symbol} 的旧数据")
+    elif previous_hashes is not None:
+        print(f"差异上传：按行哈希比较，跳过删除 {symbol} 的旧数据")
+    elif resuming:
+        print(f"断点续传：上次已删除 {symbol} 的旧数据并提交了部分批次，跳过删除")
+    else:
+        print(f"删除 {symbol} 的旧数据...")
+        deleted_ok = delete_financials(get_supabase(), symbol)
 
     # 并行上传到 4 个表
     print("并行上传到 Supabase...", flush=True)
     upload_results = {}
-    BATCH_SIZE = 1000  # 增大批次大小
-    
+    failed_tables: List[str] = []
+
     def upload_financials():
         t0 = time.time()
-        client = get_supabase()
         records = data.get("financials", [])
-        uploaded = 0
-        for batch in chunked(records, BATCH_SIZE):
-            cleaned_batch = [clean_record(r) for r in batch]
-            client.table("company_financials_long").upsert(
-                cleaned_batch, on_conflict="symbol,report_date,statement_type,account"
-            ).execute()
-            uploaded += len(batch)
-        print(f"  [✓] company_financials_long: {uploaded} 条 ({time.time()-t0:.1f}s)", flush=True)
+        if copy_backend:
+            from pg_copy_loader import connect, copy_symbol_financials
+            with connect() as conn:
+                stats = copy_symbol_financials(conn, symbol, records)
+            print(f"  [✓] company_financials_long (COPY): 合并 {stats['merged']} 条，"
+                  f"删除旧数据 {stats['deleted']} 条 ({time.time()-t0:.1f}s)", flush=True)
+            return ("financials", stats["merged"])
+        if previous_hashes is not None:
+            counts = upload_financials_diff(get_supabase(), symbol, records, previous_hashes, incremental, journal)
+            uploaded = counts["inserted"] + counts["updated"]
+            written = uploaded + counts["deleted"]
+            print(f"  [✓] company_financials_long: 新增 {counts['inserted']}，更新 {counts['updated']}，"
+                  f"删除 {counts['deleted']}，未变 {counts['unchanged']}"
+                  f"（写入 {written} 行，全量为 {len(records)} 行）({time.time()-t0:.1f}s)", flush=True)
+        else:
+            uploaded = upload_financial_records(get_supabase(), symbol, records, journal)
+            if deleted_ok:
+                remember_financial_hashes(symbol, records, incremental)
+            print(f"  [✓] company_financials_long: {uploaded} 条 ({time.time()-t0:.1f}s)", flush=True)
+        record_financials_latest(symbol, records, manifest.get("financials_latest") if incremental else None)
         return ("financials", uploaded)
     
     def upload_mkt_caps():
         t0 = time.time()
-        client = get_supabase()
-        records = data.get("mkt_caps", [])
-        uploaded = 0
-        for batch in chunked(records, BATCH_SIZE):
-            cleaned_batch = [clean_record(r) for r in batch]
-            try:
-                client.table("stock_valuation_history").insert(cleaned_batch).execute()
-                uploaded += len(batch)
-            except Exception:
-                pass  # 跳过重复记录
-        print(f"  [✓] stock_valuation_history: {uploaded} 条 ({time.time()-t0:.1f}s)", flush=True)
-        return ("mkt_caps", uploaded)
+        counts, skipped = upload_mkt_cap_records(get_supabase(), symbol, data.get("mkt_caps", []), manifest,
+                                                  journal)
+        if counts["failed"]:
+            failed_tables.append("stock_valuation_history")
+        print(f"  [✓] stock_valuation_history: {format_upsert_counts(counts)}，跳过已上传 {skipped} 条 "
+              f"({time.time()-t0:.1f}s)", flush=True)
+        return ("mkt_caps", counts["inserted"] + counts["updated"])
     
     def upload_sharehold():
         t0 = time.time()
-        client = get_supabase()
-        records = data.get("sharehold", [])
-        uploaded = 0
-        for batch in chunked(records, BATCH_SIZE):
-            cleaned_batch = [clean_record(r) for r in batch]
-            try:
-                client.table("cn_sharehold_data").insert(cleaned_batch).execute()
-                uploaded += len(batch)
-            except Exception:
-                pass  # 跳过重复记录
-        print(f"  [✓] cn_sharehold_data: {uploaded} 条 ({time.time()-t0:.1f}s)", flush=True)
-        return ("sharehold", uploaded)
+        counts = upsert_records(get_supabase(), symbol, "cn_sharehold_data", data.get("sharehold", []), journal)
+        if counts["failed"]:
+            failed_tables.append("cn_sharehold_data")
+        print(f"  [✓] cn_sharehold_data: {format_upsert_counts(counts)} ({time.time()-t0:.1f}s)", flush=True)
+        return ("sharehold", counts["inserted"] + counts["updated"])
     
     def upload_top10():
         t0 = time.time()
-        client = get_supabase()
-        records = data.get("top10", [])
-        uploaded = 0
-        for batch in chunked(records, BATCH_SIZE):
-            cleaned_batch = [clean_record(r) for r in batch]
-            try:
-                client.table("cn_top10_sharehold").insert(cleaned_batch).execute()
-                uploaded += len(batch)
-            except Exception:
-                pass  # 跳过重复记录
-        print(f"  [✓] cn_top10_sharehold: {uploaded} 条 ({time.time()-t0:.1f}s)", flush=True)
-        return ("top10", uploaded)
+        counts = upsert_records(get_supabase(), symbol, "cn_top10_sharehold", data.get("top10", []), journal)
+        if counts["failed"]:
+            failed_tables.append("cn_top10_sharehold")
+        print(f"  [✓] cn_top10_sharehold: {format_upsert_counts(counts)} ({time.time()-t0:.1f}s)", flush=True)
+        return ("top10", counts["inserted"] + counts["updated"])
     
     upload_tasks = [upload_financials, upload_mkt_caps, upload_sharehold, upload_top10]
     
@@ -338,10 +796,19 @@ def main():
             name, count = future.result()
             upload_results[name] = count
 
+    # 四张表全部写入成功后清除断点日志：之后的 --resume 不再跳过删除，只有中断的上传才续传
+    if failed_tables:
+        print(f"部分批次写入失败（{', '.join(failed_tables)}），保留断点日志，可用 --resume 续传")
+    else:
+        journal.clear([symbol])
+    journal.close()
+
     total_time = time.time() - start_time
     print(f"=" * 50)
     print(f"上传完成！总耗时: {total_time:.1f}秒")
     print(f"=" * 50)
+    if trace_path():
+        print(f"耗时追踪已写入: {trace_path()}")
 
 
 if __name__ == "__main__":
@@ -3,32 +3,14 @@ import os
 import sys
 import pandas as pd
 from dotenv import load_dotenv
-from supabase import create_client
-import math
-import numpy as np
+
+from supabase_clients import rest_client
+from upload_stock_data import format_upsert_counts, upsert_records
 
 load_dotenv()
 url = os.getenv('SUPABASE_URL')
 key = os.getenv('SUPABASE_SERVICE_ROLE_KEY')
-supabase = create_client(url, key)
-
-def clean_value(v):
-    if v is None:
-        return None
-    if isinstance(v, float):
-        if math.isnan(v) or math.isinf(v):
-            return None
-    if isinstance(v, (np.floating, np.integer)):
-        if np.isnan(v) or np.isinf(v):
-            return None
-        return float(v) if isinstance(v, np.floating) else int(v)
-    return v
-
-def clean_record(record):
-    return {k: clean_value(v) for k, v in record.items()}
-
-def chunked(items, size=500):
-    return [items[i:i + size] for i in range(0, len(items), size)]
+supabase = rest_client(url, key)
 
 def load_top10(symbol):
     path = os.path.join('outputs', f'{symbol}_top10_shareholders_10y.csv')
@@ -70,17 +52,9 @@ for symbol in symbols:
         continue
     print(f'  加载 {len(records)} 条记录', flush=True)
     
-    uploaded = 0
-    for batch in chunked(records, 500):
-        cleaned_batch = [clean_record(r) for r in batch]
-        try:
-            supabase.table('cn_top10_sharehold').insert(cleaned_batch).execute()
-            uploaded += len(batch)
-        except Exception as e:
-            err_str = str(e)[:100]
-            if 'duplicate' not in err_str.lower():
-                print(f'  错误: {err_str}', flush=True)
+    # 按 (symbol, report_date, rank) upsert，重复运行时更新已有行
+    counts = upsert_records(supabase, symbol, 'cn_top10_sharehold', records)
     
-    print(f'  上传完成: {uploaded} 条', flush=True)
+    print(f'  上传完成: {format_upsert_counts(counts)}', flush=True)
 
 print('全部完成!', flush=True)
@@ -0,0 +1,21 @@
+-- stock_valuation_history 按自然键 (symbol, date) upsert
+-- import_valuation_history.py 早期以顺序编号作为 id，upload_stock_data.py 以 {symbol}_{date} 作为 id，
+-- 同一股票同一日期可能已有两行：保留最新写入的一行后再加唯一约束
+-- （cn_sharehold_data、cn_top10_sharehold 的底表建表时已有 UNIQUE，公共视图的 INSERT 触发器按自然键更新）
+
+DELETE FROM public.stock_valuation_history
+WHERE id IN (
+    SELECT id FROM (
+        SELECT id, row_number() OVER (
+            PARTITION BY symbol, date ORDER BY created_at DESC NULLS LAST, id DESC
+        ) AS rn
+        FROM public.stock_valuation_history
+    ) ranked
+    WHERE rn > 1
+);
+
+ALTER TABLE public.stock_valuation_history
+    ADD CONSTRAINT stock_valuation_history_symbol_date_key UNIQUE (symbol, date);
+
+COMMENT ON CONSTRAINT stock_valuation_history_symbol_date_key ON public.stock_valuation_history
+    IS '自然键：同一股票同一交易日只有一条市值记录（upsert on_conflict=symbol,date）';